@@ -0,0 +1,215 @@
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import urldefrag
+
+import redis
+
+# Semua key frontier diawali ini: frontier:{job_id}:{queue|leases|seen|pages|meta|final}
+FRONTIER_PREFIX = "frontier:"
+JOBS_KEY = f"{FRONTIER_PREFIX}jobs"
+
+DEFAULT_VISIBILITY_TIMEOUT = 120  # detik sebelum lease dianggap mati
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Enqueue hanya kalau belum pernah dilihat dan kuota pages belum habis.
+_ENQUEUE_LUA = """
+local seen, queue = KEYS[1], KEYS[2]
+local max_pages = tonumber(ARGV[3])
+if redis.call('SCARD', seen) >= max_pages then
+    return 0
+end
+if redis.call('SADD', seen, ARGV[1]) == 1 then
+    redis.call('RPUSH', queue, ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Kembalikan lease yang expired ke queue, lalu pop satu item dan lease-kan.
+_LEASE_LUA = """
+local queue, leases, failed = KEYS[1], KEYS[2], KEYS[3]
+local now = tonumber(ARGV[1])
+local expires_at = tonumber(ARGV[2])
+local max_attempts = tonumber(ARGV[3])
+local expired = redis.call('ZRANGEBYSCORE', leases, '-inf', now)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', leases, member)
+    local item = cjson.decode(member)
+    if tonumber(item['attempts']) >= max_attempts then
+        redis.call('RPUSH', failed, member)
+    else
+        redis.call('LPUSH', queue, member)
+    end
+end
+local raw = redis.call('LPOP', queue)
+if not raw then
+    return nil
+end
+local item = cjson.decode(raw)
+item['attempts'] = tonumber(item['attempts']) + 1
+local leased = cjson.encode(item)
+redis.call('ZADD', leases, expires_at, leased)
+return leased
+"""
+
+# Ack hanya kalau lease masih dipegang: lease yang sudah expired (dan di-lease ulang
+# oleh worker lain) tidak boleh menambah page entry kedua.
+_ACK_LUA = """
+local leases, pages = KEYS[1], KEYS[2]
+if redis.call('ZREM', leases, ARGV[1]) == 0 then
+    return 0
+end
+if ARGV[2] ~= '' then
+    redis.call('RPUSH', pages, ARGV[2])
+end
+return 1
+"""
+
+
+def normalize_url(url: str) -> str:
+    return urldefrag(url)[0].rstrip("/") or url
+
+
+class RedisFrontier:
+    """Shared crawl frontier di Redis dengan lease + visibility timeout.
+
+    Worker memanggil ``lease()`` untuk mengambil URL; item yang tidak di-``ack()``
+    sebelum ``visibility_timeout`` habis otomatis kembali ke queue pada lease berikutnya.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        job_id: str,
+        visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.client = client
+        self.job_id = job_id
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._enqueue = client.register_script(_ENQUEUE_LUA)
+        self._lease = client.register_script(_LEASE_LUA)
+        self._ack = client.register_script(_ACK_LUA)
+
+    # ----- keys -----
+    def _key(self, name: str) -> str:
+        return f"{FRONTIER_PREFIX}{self.job_id}:{name}"
+
+    @property
+    def meta_key(self) -> str:
+        return self._key("meta")
+
+    # ----- job lifecycle -----
+    @classmethod
+    def create_job(
+        cls,
+        client: redis.Redis,
+        url: str,
+        depth: int,
+        pages: int,
+        **kwargs: Any,
+    ) -> "RedisFrontier":
+        frontier = cls(client, str(uuid.uuid4()), **kwargs)
+        client.hset(
+            frontier.meta_key,
+            mapping={
+                "site": url,
+                "max_depth": depth,
+                "max_pages": pages,
+                "status": "running",
+                "created_at": int(time.time()),
+            },
+        )
+        client.sadd(JOBS_KEY, frontier.job_id)
+        frontier.push(url, 0)
+        return frontier
+
+    def meta(self) -> Dict[str, str]:
+        raw = self.client.hgetall(self.meta_key)
+        return {k.decode(): v.decode() for k, v in raw.items()}
+
+    def push(self, url: str, depth: int) -> bool:
+        meta = self.meta()
+        if depth > int(meta.get("max_depth", 0)):
+            return False
+        url = normalize_url(url)
+        item = json.dumps({"url": url, "depth": depth, "attempts": 0})
+        added = self._enqueue(
+            keys=[self._key("seen"), self._key("queue")],
+            args=[url, item, int(meta.get("max_pages", 0))],
+        )
+        return bool(added)
+
+    def lease(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        raw = self._lease(
+            keys=[self._key("queue"), self._key("leases"), self._key("failed")],
+            args=[now, now + self.visibility_timeout, self.max_attempts],
+        )
+        if raw is None:
+            return None
+        item = json.loads(raw)
+        item["_raw"] = raw
+        return item
+
+    def extend(self, item: Dict[str, Any]) -> None:
+        """Perpanjang lease untuk halaman yang prosesnya lama (heartbeat)."""
+        self.client.zadd(
+            self._key("leases"),
+            {item["_raw"]: time.time() + self.visibility_timeout},
+            xx=True,
+        )
+
+    def ack(self, item: Dict[str, Any], entry: Optional[Dict[str, Any]] = None) -> bool:
+        """Selesaikan lease dan simpan entry-nya; False kalau lease sudah hilang (expired)."""
+        acked = self._ack(
+            keys=[self._key("leases"), self._key("pages")],
+            args=[item["_raw"], json.dumps(entry) if entry is not None else ""],
+        )
+        return bool(acked)
+
+    def is_drained(self) -> bool:
+        pipe = self.client.pipeline()
+        pipe.llen(self._key("queue"))
+        pipe.zcard(self._key("leases"))
+        queued, leased = pipe.execute()
+        return queued == 0 and leased == 0
+
+    def page_entries(self) -> List[Dict[str, Any]]:
+        return [json.loads(p) for p in self.client.lrange(self._key("pages"), 0, -1)]
+
+    def claim_finalize(self) -> bool:
+        """Hanya satu worker (coordinator) yang boleh membuat final summary."""
+        return bool(self.client.set(self._key("final_lock"), 1, nx=True))
+
+    def finish(self, final_summary: Dict[str, Any]) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self._key("final"), json.dumps(final_summary))
+        pipe.hset(self.meta_key, "status", "done")
+        pipe.srem(JOBS_KEY, self.job_id)
+        pipe.execute()
+
+    def status(self) -> Dict[str, Any]:
+        pipe = self.client.pipeline()
+        pipe.llen(self._key("queue"))
+        pipe.zcard(self._key("leases"))
+        pipe.llen(self._key("pages"))
+        pipe.llen(self._key("failed"))
+        pipe.get(self._key("final"))
+        queued, leased, done, failed, final = pipe.execute()
+        return {
+            "job_id": self.job_id,
+            **self.meta(),
+            "queued": queued,
+            "leased": leased,
+            "done": done,
+            "failed": failed,
+            "final_summary": json.loads(final) if final else None,
+        }
+
+
+def active_jobs(client: redis.Redis) -> List[str]:
+    return sorted(j.decode() for j in client.smembers(JOBS_KEY))
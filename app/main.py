@@ -2,6 +2,7 @@ import asyncio
 import os
 import requests
 import json
+import time
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
 from crawl4ai.deep_crawling import BFSDeepCrawlStrategy
@@ -9,14 +10,27 @@ from bs4 import BeautifulSoup
 from fastapi import FastAPI, Query
 from fastapi.responses import JSONResponse
 
+from app import metrics, tracing
+from rnd.token_budget import approx_tokens, estimate_cost, fit_to_prompt, truncate_to_budget
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise RuntimeError("GEMINI_API_KEY not found")
 
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+# GEMINI_BASE_URL bisa diarahkan ke fake server (lihat bench/fake_gemini.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_URL = f"{GEMINI_BASE_URL}/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+
+# Token budget (lihat rnd/token_budget.py); harga USD per token untuk estimasi biaya
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_PRICING = {"input": 0.10 / 1_000_000, "output": 0.40 / 1_000_000}
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "2000"))
+FINAL_TOKEN_BUDGET = int(os.getenv("FINAL_TOKEN_BUDGET", "30000"))
+EXPECTED_OUTPUT_TOKENS = 400
 
 app = FastAPI(title="Crawl + Gemini Summarizer")
+metrics.install(app)
 
 
 def clean_html(html_content: str) -> str:
@@ -26,26 +40,35 @@ def clean_html(html_content: str) -> str:
     text = soup.get_text()
     lines = (line.strip() for line in text.splitlines())
     chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    return ' '.join(chunk for chunk in chunks if chunk)[:5000]
+    text = ' '.join(chunk for chunk in chunks if chunk)
+    return truncate_to_budget(text, PAGE_TOKEN_BUDGET, GEMINI_MODEL)
 
 
 def gemini_request(prompt: str) -> str:
+    metrics.record_estimated_cost(
+        estimate_cost(approx_tokens(prompt), EXPECTED_OUTPUT_TOKENS, GEMINI_PRICING)
+    )
     payload = {
         "contents": [{
             "parts": [{"text": prompt}]
         }]
     }
     try:
-        response = requests.post(
-            GEMINI_URL,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(payload),
-            timeout=60
-        )
+        with tracing.stage("gemini"):
+            response = requests.post(
+                GEMINI_URL,
+                headers={"Content-Type": "application/json"},
+                data=json.dumps(payload),
+                timeout=60
+            )
         if response.status_code == 200:
-            return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+            body = response.json()
+            metrics.record_gemini_usage(body)
+            return body["candidates"][0]["content"]["parts"][0]["text"]
+        metrics.record_error(f"gemini_http_{response.status_code}")
         return f"Error: {response.status_code}, {response.text}"
     except Exception as e:
+        metrics.record_error(f"gemini_{type(e).__name__}")
         return f"Error: {str(e)}"
 
 
@@ -56,30 +79,43 @@ async def crawl_and_analyze(url: str, depth: int, pages: int):
             include_external=False,
             max_pages=pages
         ),
+        stream=True,  # proses tiap page begitu selesai di-fetch
         verbose=True
     )
 
     async with AsyncWebCrawler() as crawler:
-        results = await crawler.arun(url=url, config=config)
-
         all_summaries = []
 
-        for i, page in enumerate(results, 1):
+        # Dengan stream=True crawl berjalan di dalam iterator: yang terukur adalah waktu menunggu
+        # halaman berikutnya (fetch + antrean deep crawl), bukan durasi fetch satu halaman
+        fetch_started = time.time_ns()
+        async for page in await crawler.arun(url=url, config=config):
+            tracing.record_stage("fetch_wait", fetch_started, url=page.url)
+            tracing.record_fetch(page)
             if hasattr(page, 'html') and page.html:
-                clean_content = clean_html(page.html)
-                summary = gemini_request(
-                    f"Summarize this web page from {page.url}: {clean_content}"
-                )
+                with tracing.span("page", url=page.url):
+                    with tracing.stage("clean_html"):
+                        clean_content = clean_html(page.html)
+                    summary = gemini_request(
+                        f"Summarize this web page from {page.url}: {clean_content}"
+                    )
                 all_summaries.append({
                     "url": page.url,
                     "summary": summary
                 })
+                metrics.record_pages()
+            fetch_started = time.time_ns()
 
         # Combine all summaries into one
-        combined_text = "\n\n".join([s["summary"] for s in all_summaries])
-        final_summary = gemini_request(
-            f"Create a concise overall summary of these page summaries:\n\n{combined_text}"
+        final_prompt = "Create a concise overall summary of these page summaries:\n\n"
+        combined_text = fit_to_prompt(
+            final_prompt,
+            "\n\n".join([s["summary"] for s in all_summaries]),
+            FINAL_TOKEN_BUDGET,
+            GEMINI_MODEL,
         )
+        with tracing.span("final"):
+            final_summary = gemini_request(final_prompt + combined_text)
 
         return {
             "pages": all_summaries,
@@ -91,10 +127,15 @@ async def crawl_and_analyze(url: str, depth: int, pages: int):
 async def crawl(
     url: str = Query(..., description="Target URL untuk crawling"),
     depth: int = Query(2, description="Maximum depth untuk crawling"),
-    pages: int = Query(5, description="Maximum number of pages untuk crawling")
+    pages: int = Query(5, description="Maximum number of pages untuk crawling"),
+    trace: bool = Query(False, description="Sertakan section timings per stage/page")
 ):
     try:
-        result = await crawl_and_analyze(url, depth, pages)
+        with metrics.crawl_in_flight(), tracing.maybe_trace(trace, "crawl", url=url) as tracer:
+            result = await crawl_and_analyze(url, depth, pages)
+        if tracer is not None:
+            result["timings"] = tracer.timings()
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
+        metrics.record_error(type(e).__name__)
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import os
 import requests
 import json
@@ -22,6 +23,10 @@ from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 
 from sentence_transformers import SentenceTransformer
 
+from app import metrics, tracing
+from rnd.token_budget import approx_tokens, estimate_cost, fit_to_prompt, truncate_to_budget
+from app.frontier import RedisFrontier
+
 # ========= ENV & CLIENTS =========
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -36,17 +41,30 @@ EMBED_MODEL_NAME = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
 embedder = SentenceTransformer(EMBED_MODEL_NAME)
 EMBED_DIM = embedder.get_sentence_embedding_dimension()
 
-# Gemini API URL
+# Gemini API URL (GEMINI_BASE_URL bisa diarahkan ke fake server, lihat bench/fake_gemini.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
 GEMINI_URL = (
-    f"https://generativelanguage.googleapis.com/v1beta/models/"
+    f"{GEMINI_BASE_URL}/v1beta/models/"
     f"gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
 )
 
+# Token budget (lihat rnd/token_budget.py); harga USD per token untuk estimasi biaya
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_PRICING = {"input": 0.10 / 1_000_000, "output": 0.40 / 1_000_000}
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "2000"))
+FINAL_TOKEN_BUDGET = int(os.getenv("FINAL_TOKEN_BUDGET", "30000"))
+EXPECTED_OUTPUT_TOKENS = 400
+
+# Ringkasan per halaman di-cache di Redis per (model, isi halaman bersih); 0 = tanpa cache
+SUMMARY_CACHE_PREFIX = "summary:"
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
 # Redis index
 INDEX_NAME = "idx:pages"
 KEY_PREFIX = "doc:"  # semua key JSON akan diawali ini
 
 app = FastAPI(title="Crawl + Gemini + Redis VectorDB (RAG)")
+metrics.install(app)
 
 # ========= UTILS =========
 def clean_html(html_content: str) -> str:
@@ -56,28 +74,38 @@ def clean_html(html_content: str) -> str:
     text = soup.get_text(separator=" ")
     lines = (line.strip() for line in text.splitlines())
     chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    return " ".join(chunk for chunk in chunks if chunk)[:5000]
+    text = " ".join(chunk for chunk in chunks if chunk)
+    return truncate_to_budget(text, PAGE_TOKEN_BUDGET, GEMINI_MODEL)
 
 
 def gemini_request(prompt: str) -> str:
+    metrics.record_estimated_cost(
+        estimate_cost(approx_tokens(prompt), EXPECTED_OUTPUT_TOKENS, GEMINI_PRICING)
+    )
     payload = {"contents": [{"parts": [{"text": prompt}]}]}  # simple text prompt
     try:
-        resp = requests.post(
-            GEMINI_URL,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(payload),
-            timeout=60,
-        )
+        with tracing.stage("gemini"):
+            resp = requests.post(
+                GEMINI_URL,
+                headers={"Content-Type": "application/json"},
+                data=json.dumps(payload),
+                timeout=60,
+            )
         if resp.status_code == 200:
-            return resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+            body = resp.json()
+            metrics.record_gemini_usage(body)
+            return body["candidates"][0]["content"]["parts"][0]["text"]
+        metrics.record_error(f"gemini_http_{resp.status_code}")
         return f"Error: {resp.status_code}, {resp.text}"
     except Exception as e:
+        metrics.record_error(f"gemini_{type(e).__name__}")
         return f"Error: {str(e)}"
 
 
 def embed_text(text: str) -> np.ndarray:
     # returns float32 vector
-    v = embedder.encode(text, normalize_embeddings=True)
+    with tracing.stage("embed"):
+        v = embedder.encode(text, normalize_embeddings=True)
     if not isinstance(v, np.ndarray):
         v = np.array(v)
     return v.astype(np.float32)
@@ -177,10 +205,15 @@ def save_doc_to_redis(
 # Versi HASH yang konsisten untuk VECTOR indexing (direkomendasikan)
 HASH_INDEX = "idx:pages_hash"
 HASH_PREFIX = "hdoc:"
+_hash_index_ready = False  # FT.INFO cukup sekali per proses
 
 def ensure_hash_index():
+    global _hash_index_ready
+    if _hash_index_ready:
+        return
     try:
         redis_client.ft(HASH_INDEX).info()
+        _hash_index_ready = True
         return
     except Exception:
         pass
@@ -207,6 +240,7 @@ def ensure_hash_index():
 
     definition = IndexDefinition(prefix=[HASH_PREFIX], index_type=IndexType.HASH)
     redis_client.ft(HASH_INDEX).create_index(schema, definition=definition)
+    _hash_index_ready = True
 
 
 def save_doc_hash(
@@ -220,18 +254,19 @@ def save_doc_hash(
     key = f"{HASH_PREFIX}{doc_id}"
     vec = embed_text(summary)
 
-    redis_client.hset(
-        key,
-        mapping={
-            "id": doc_id,
-            "site": site,
-            "url": url or "",
-            "kind": kind,
-            "summary": summary,
-            "created_at": int(time.time()),
-            "vector": to_bytes(vec),
-        },
-    )
+    with tracing.stage("redis_write"):
+        redis_client.hset(
+            key,
+            mapping={
+                "id": doc_id,
+                "site": site,
+                "url": url or "",
+                "kind": kind,
+                "summary": summary,
+                "created_at": int(time.time()),
+                "vector": to_bytes(vec),
+            },
+        )
     return doc_id
 
 
@@ -250,7 +285,8 @@ def semantic_search(
         "id", "site", "url", "kind", "summary", "created_at", "score"
     ).sort_by("score").paging(0, top_k).dialect(2)
 
-    res = redis_client.ft(HASH_INDEX).search(q, query_params={"vec": to_bytes(qvec)})
+    with tracing.stage("knn"):
+        res = redis_client.ft(HASH_INDEX).search(q, query_params={"vec": to_bytes(qvec)})
 
     hits = []
     for doc in res.docs:
@@ -269,6 +305,46 @@ def semantic_search(
 
 
 # ========= CRAWL PIPELINE =========
+def cached_summary(url: str, clean_content: str) -> str:
+    """Ringkasan Gemini untuk isi halaman ini, dari Redis kalau isi yang sama sudah pernah diringkas."""
+    key = SUMMARY_CACHE_PREFIX + hashlib.sha256(f"{GEMINI_MODEL}\x1f{clean_content}".encode("utf-8")).hexdigest()
+    if SUMMARY_CACHE_TTL:
+        cached = redis_client.get(key)
+        if cached is not None:
+            metrics.record_cache_hit("redis_summary")
+            return cached.decode("utf-8")
+    summary = gemini_request(f"Summarize this web page from {url}:\n\n{clean_content}")
+    if SUMMARY_CACHE_TTL and not summary.startswith("Error:"):
+        redis_client.set(key, summary, ex=SUMMARY_CACHE_TTL)
+    return summary
+
+
+def analyze_page(site: str, url: str, html: str) -> Dict[str, Any]:
+    """Clean, summarize dan simpan satu halaman; return entry untuk response."""
+    with tracing.span("page", url=url):
+        with tracing.stage("clean_html"):
+            clean_content = clean_html(html)
+        summary = cached_summary(url, clean_content)
+        doc_id = save_doc_hash(site=site, url=url, kind="page", summary=summary)
+    metrics.record_pages()
+    return {"uuid": doc_id, "url": url, "summary": summary}
+
+
+def summarize_site(site: str, page_entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Final summary dari seluruh page, disimpan sebagai kind="final"."""
+    final_prompt = "Create a concise overall summary of these page summaries:\n\n"
+    combined_text = fit_to_prompt(
+        final_prompt,
+        "\n\n".join([p["summary"] for p in page_entries]),
+        FINAL_TOKEN_BUDGET,
+        GEMINI_MODEL,
+    )
+    with tracing.span("final"):
+        final_summary = gemini_request(final_prompt + combined_text)
+        final_uuid = save_doc_hash(site=site, url=None, kind="final", summary=final_summary)
+    return {"uuid": final_uuid, "summary": final_summary}
+
+
 async def crawl_and_analyze(url: str, depth: int, pages: int):
     ensure_hash_index()
 
@@ -281,36 +357,25 @@ async def crawl_and_analyze(url: str, depth: int, pages: int):
             include_external=False,
             max_pages=pages,
         ),
+        stream=True,  # proses tiap page begitu selesai di-fetch
         verbose=True,
     )
 
     async with AsyncWebCrawler() as crawler:
-        results = await crawler.arun(url=url, config=config)
-
         page_entries = []
-        for i, page in enumerate(results, 1):
+        # Dengan stream=True crawl berjalan di dalam iterator: yang terukur adalah waktu menunggu
+        # halaman berikutnya (fetch + antrean deep crawl), bukan durasi fetch satu halaman
+        fetch_started = time.time_ns()
+        async for page in await crawler.arun(url=url, config=config):
+            tracing.record_stage("fetch_wait", fetch_started, url=page.url)
+            tracing.record_fetch(page)
             if hasattr(page, "html") and page.html:
-                clean_content = clean_html(page.html)
-                summary = gemini_request(
-                    f"Summarize this web page from {page.url}:\n\n{clean_content}"
-                )
-
-                doc_id = save_doc_hash(site=site, url=page.url, kind="page", summary=summary)
-
-                page_entries.append(
-                    {"uuid": doc_id, "url": page.url, "summary": summary}
-                )
-
-        # Final summary dari seluruh page
-        combined_text = "\n\n".join([p["summary"] for p in page_entries])
-        final_summary = gemini_request(
-            "Create a concise overall summary of these page summaries:\n\n" + combined_text
-        )
-        final_uuid = save_doc_hash(site=site, url=None, kind="final", summary=final_summary)
+                page_entries.append(analyze_page(site, page.url, page.html))
+            fetch_started = time.time_ns()
 
         return {
             "pages": page_entries,
-            "final_summary": {"uuid": final_uuid, "summary": final_summary},
+            "final_summary": summarize_site(site, page_entries),
         }
 
 
@@ -320,11 +385,48 @@ async def crawl(
     url: str = Query(..., description="Target URL untuk crawling"),
     depth: int = Query(2, description="Maximum depth untuk crawling"),
     pages: int = Query(5, description="Maximum number of pages untuk crawling"),
+    trace: bool = Query(False, description="Sertakan section timings per stage/page"),
 ):
     try:
-        result = await crawl_and_analyze(url, depth, pages)
+        with metrics.crawl_in_flight(), tracing.maybe_trace(trace, "crawl", url=url) as tracer:
+            result = await crawl_and_analyze(url, depth, pages)
+        if tracer is not None:
+            result["timings"] = tracer.timings()
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
+        metrics.record_error(type(e).__name__)
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
+
+
+@app.get("/crawl/distributed")
+def crawl_distributed(
+    url: str = Query(..., description="Target URL untuk crawling"),
+    depth: int = Query(2, description="Maximum depth untuk crawling"),
+    pages: int = Query(5, description="Maximum number of pages untuk crawling"),
+):
+    """
+    Masukkan job ke shared Redis frontier; dikerjakan oleh `python -m app.worker`.
+    """
+    try:
+        ensure_hash_index()
+        frontier = RedisFrontier.create_job(redis_client, url, depth, pages)
+        return JSONResponse(
+            content={"success": True, "job_id": frontier.job_id}, status_code=202
+        )
+    except Exception as e:
+        metrics.record_error(type(e).__name__)
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
+
+
+@app.get("/crawl/jobs/{job_id}")
+def crawl_job_status(job_id: str):
+    try:
+        status = RedisFrontier(redis_client, job_id).status()
+        if "site" not in status:
+            return JSONResponse(content={"success": False, "error": "job not found"}, status_code=404)
+        return JSONResponse(content={"success": True, **status}, status_code=200)
+    except Exception as e:
+        metrics.record_error(type(e).__name__)
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
 
 
@@ -339,6 +441,7 @@ def search(
         hits = semantic_search(q, top_k=k, site=site)
         return JSONResponse(content={"success": True, "results": hits}, status_code=200)
     except Exception as e:
+        metrics.record_error(type(e).__name__)
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
 
 
@@ -373,4 +476,5 @@ def chat(
             content={"success": True, "answer": answer, "sources": hits}, status_code=200
         )
     except Exception as e:
+        metrics.record_error(type(e).__name__)
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
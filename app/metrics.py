@@ -0,0 +1,132 @@
+"""
+Prometheus metrics untuk /crawl, /search dan /chat.
+
+Set METRICS_ENABLED=0 (atau tanpa prometheus_client terpasang) untuk mematikan
+instrumentasi: semua helper di bawah menjadi no-op tanpa alokasi.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+except ImportError:  # prometheus_client opsional
+    generate_latest = None
+
+METRICS_ENABLED = generate_latest is not None and os.getenv("METRICS_ENABLED", "1") != "0"
+
+# fetch/fetch_wait: beberapa detik (Chromium); clean/embed/redis: milidetik
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+if METRICS_ENABLED:
+    STAGE_LATENCY = Histogram(
+        "crawler_stage_seconds",
+        "Latency per pipeline stage",
+        ["stage"],
+        buckets=STAGE_BUCKETS,
+    )
+    PAGES = Counter("crawler_pages_total", "Pages fetched and summarized")
+    TOKENS = Counter("crawler_llm_tokens_total", "Gemini tokens", ["direction"])
+    ERRORS = Counter("crawler_errors_total", "Errors by type", ["type"])
+    CACHE_HITS = Counter("crawler_cache_hits_total", "Cache hits", ["cache"])
+    ESTIMATED_COST = Counter(
+        "crawler_llm_estimated_cost_dollars_total", "Gemini cost estimated before sending"
+    )
+    CRAWLS_IN_FLIGHT = Gauge("crawler_crawls_in_flight", "Crawls currently running")
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stage_timer(stage: str):
+    """`with stage_timer("fetch"): ...` -> observe ke histogram crawler_stage_seconds."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return STAGE_LATENCY.labels(stage).time()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def record_pages(n: int = 1) -> None:
+    if METRICS_ENABLED:
+        PAGES.inc(n)
+
+
+def record_tokens(input_tokens: int, output_tokens: int) -> None:
+    if METRICS_ENABLED:
+        TOKENS.labels("in").inc(input_tokens)
+        TOKENS.labels("out").inc(output_tokens)
+
+
+def record_error(error_type: str) -> None:
+    if METRICS_ENABLED:
+        ERRORS.labels(error_type).inc()
+
+
+def record_cache_hit(cache: str) -> None:
+    if METRICS_ENABLED:
+        CACHE_HITS.labels(cache).inc()
+
+
+def record_estimated_cost(dollars: float) -> None:
+    if METRICS_ENABLED:
+        ESTIMATED_COST.inc(dollars)
+
+
+@contextmanager
+def crawl_in_flight():
+    if not METRICS_ENABLED:
+        yield
+        return
+    CRAWLS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        CRAWLS_IN_FLIGHT.dec()
+
+
+def record_gemini_usage(response_json: dict) -> None:
+    """Ambil usageMetadata dari response generateContent."""
+    if not METRICS_ENABLED:
+        return
+    usage = response_json.get("usageMetadata") or {}
+    record_tokens(usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
+
+
+def metrics_endpoint(request):
+    from fastapi.responses import PlainTextResponse, Response
+
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def install(app) -> None:
+    """Daftarkan GET /metrics pada FastAPI app."""
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+
+
+def serve(port: int) -> bool:
+    """/metrics di HTTP server sendiri (proses tanpa FastAPI, mis. app/worker.py); False kalau nonaktif."""
+    if not METRICS_ENABLED:
+        return False
+    from prometheus_client import start_http_server
+
+    start_http_server(port)
+    return True
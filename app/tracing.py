@@ -0,0 +1,312 @@
+"""
+Opt-in per-request tracing untuk /crawl (`trace=true`).
+
+Tracer aktif disimpan di ContextVar, jadi fungsi pipeline (clean_html, gemini_request,
+embed_text, save_doc_hash) cukup memakai `stage(...)` tanpa mengubah signature.
+Tanpa tracer aktif, `stage` hanya meneruskan ke histogram Prometheus.
+
+Span bisa diekspor dalam format OTLP/JSON ke file (TRACE_EXPORT_FILE, satu
+trace per baris) atau ke collector lokal (OTEL_EXPORTER_OTLP_ENDPOINT). Ekspor
+berjalan di thread latar lewat antrean, jadi handler async tidak menunggu I/O file
+atau HTTP; kalau antrean penuh trace dibuang (crawler_errors_total{type="trace_export_dropped"}).
+"""
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app import metrics
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-deepcrawling")
+EXPORT_QUEUE_SIZE = 256  # trace yang menunggu diekspor
+
+# nama stage Prometheus -> nama di section `timings`
+STAGE_NAMES = {
+    "fetch": "fetch",
+    "fetch_wait": "fetch_wait",
+    "clean_html": "clean",
+    "gemini": "summarize",
+    "embed": "embed",
+    "redis_write": "store",
+    "knn": "knn",
+}
+
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("current_tracer", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.root = Span(name, None, attributes)
+        self.spans.append(self.root)
+
+    @contextmanager
+    def activate(self):
+        tracer_token = _current_tracer.set(self)
+        span_token = _current_span.set(self.root)
+        try:
+            yield self
+        finally:
+            self.root.end_ns = time.time_ns()
+            _current_span.reset(span_token)
+            _current_tracer.reset(tracer_token)
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        parent = _current_span.get() or self.root
+        span = Span(name, parent.span_id, attributes)
+        self.spans.append(span)
+        return span
+
+    # ----- timings -----
+    def _leaves(self) -> List[Span]:
+        parents = {s.parent_id for s in self.spans}
+        return [s for s in self.spans if s.span_id not in parents and s is not self.root]
+
+    def critical_path(self) -> List[Span]:
+        """Rantai leaf span terpanjang di mana tiap span mulai setelah span sebelumnya selesai."""
+        leaves = sorted(self._leaves(), key=lambda s: s.start_ns)
+        best: List[float] = []
+        prev: List[int] = []
+        for i, span in enumerate(leaves):
+            best.append(span.duration_ms)
+            prev.append(-1)
+            for j in range(i):
+                if leaves[j].end_ns <= span.start_ns and best[j] + span.duration_ms > best[i]:
+                    best[i] = best[j] + span.duration_ms
+                    prev[i] = j
+        if not leaves:
+            return []
+        i = max(range(len(leaves)), key=best.__getitem__)
+        path = []
+        while i != -1:
+            path.append(leaves[i])
+            i = prev[i]
+        return path[::-1]
+
+    def _url_of(self, span: Span, by_id: Dict[str, Span]) -> Optional[str]:
+        group = by_id.get(span.parent_id)
+        return span.attributes.get("url") or (group.attributes.get("url") if group else None)
+
+    def timings(self) -> Dict[str, Any]:
+        by_id = {s.span_id: s for s in self.spans}
+        pages: Dict[str, Dict[str, Any]] = {}
+        final: Dict[str, float] = {}
+        totals: Dict[str, float] = {}
+
+        for span in self._leaves():
+            stage = STAGE_NAMES.get(span.name, span.name)
+            totals[stage] = totals.get(stage, 0.0) + span.duration_ms
+            group = by_id.get(span.parent_id)
+            url = self._url_of(span, by_id)
+            if group is not None and group.name == "final":
+                final[f"{stage}_ms"] = final.get(f"{stage}_ms", 0.0) + span.duration_ms
+            elif url:
+                entry = pages.setdefault(url, {"url": url})
+                entry[f"{stage}_ms"] = entry.get(f"{stage}_ms", 0.0) + span.duration_ms
+
+        path = self.critical_path()
+        return {
+            "trace_id": self.trace_id,
+            "wall_ms": round(self.root.duration_ms, 2),
+            "critical_path_ms": round(sum(s.duration_ms for s in path), 2),
+            "critical_path": [
+                {"stage": STAGE_NAMES.get(s.name, s.name), "url": self._url_of(s, by_id), "ms": round(s.duration_ms, 2)}
+                for s in path
+            ],
+            "totals_ms": {k: round(v, 2) for k, v in totals.items()},
+            "pages": [{k: round(v, 2) if isinstance(v, float) else v for k, v in p.items()} for p in pages.values()],
+            "final": {k: round(v, 2) for k, v in final.items()},
+        }
+
+    # ----- export -----
+    def to_otlp(self) -> Dict[str, Any]:
+        def attrs(d: Dict[str, Any]) -> List[Dict[str, Any]]:
+            out = []
+            for key, value in d.items():
+                if value is None:
+                    continue
+                if isinstance(value, bool):
+                    out.append({"key": key, "value": {"boolValue": value}})
+                elif isinstance(value, int):
+                    out.append({"key": key, "value": {"intValue": str(value)}})
+                elif isinstance(value, float):
+                    out.append({"key": key, "value": {"doubleValue": value}})
+                else:
+                    out.append({"key": key, "value": {"stringValue": str(value)}})
+            return out
+
+        spans = [
+            {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id or "",
+                "name": s.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": attrs(s.attributes),
+            }
+            for s in self.spans
+        ]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attrs({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+            }]
+        }
+
+    def export(self) -> None:
+        """Antrekan ke TRACE_EXPORT_FILE dan/atau OTEL_EXPORTER_OTLP_ENDPOINT kalau di-set (tidak blocking)."""
+        path = os.getenv("TRACE_EXPORT_FILE")
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if not path and not endpoint:
+            return
+        try:
+            _export_queue().put_nowait((self.to_otlp(), path, endpoint))
+        except queue.Full:
+            metrics.record_error("trace_export_dropped")
+
+
+def _send(payload: Dict[str, Any], path: Optional[str], endpoint: Optional[str]) -> None:
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+    if endpoint:
+        requests.post(
+            endpoint.rstrip("/") + "/v1/traces",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(payload),
+            timeout=5,
+        )
+
+
+def _export_worker(pending: "queue.Queue") -> None:
+    while True:
+        payload, path, endpoint = pending.get()
+        try:
+            _send(payload, path, endpoint)
+        except Exception as e:
+            metrics.record_error(f"trace_export_{type(e).__name__}")
+        finally:
+            pending.task_done()
+
+
+_pending: Optional["queue.Queue"] = None
+_pending_lock = threading.Lock()
+
+
+def _export_queue() -> "queue.Queue":
+    """Antrean ekspor; thread pengirimnya dibuat saat trace pertama diekspor."""
+    global _pending
+    with _pending_lock:
+        if _pending is None:
+            _pending = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+            threading.Thread(target=_export_worker, args=(_pending,), name="trace-export", daemon=True).start()
+        return _pending
+
+
+def flush_exports() -> None:
+    """Tunggu sampai semua trace yang diantrekan selesai diekspor (tes, shutdown)."""
+    if _pending is not None:
+        _pending.join()
+
+
+@contextmanager
+def maybe_trace(enabled: bool, name: str, **attributes: Any):
+    """`with maybe_trace(trace, "crawl") as tracer:` -> Tracer aktif atau None."""
+    if not enabled:
+        yield None
+        return
+    tracer = Tracer(name, **attributes)
+    with tracer.activate():
+        yield tracer
+    tracer.export()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Span pengelompokan (mis. satu page); no-op tanpa tracer aktif."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    s = tracer.start_span(name, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+@contextmanager
+def stage(name: str, **attributes: Any):
+    """Satu stage pipeline: selalu ke histogram Prometheus, plus span kalau tracing aktif."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        with metrics.stage_timer(name):
+            yield
+        return
+    s = tracer.start_span(name, **attributes)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        s.end_ns = time.time_ns()
+        metrics.observe_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name: str, started_ns: int, ended_ns: Optional[int] = None, **attributes: Any) -> None:
+    """Stage yang waktunya diukur manual (mis. menunggu page berikutnya dari stream)."""
+    ended_ns = ended_ns if ended_ns is not None else time.time_ns()
+    metrics.observe_stage(name, (ended_ns - started_ns) / 1e9)
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        s = tracer.start_span(name, **attributes)
+        s.start_ns = started_ns
+        s.end_ns = ended_ns
+
+
+def _epoch_ns(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):  # datetime
+        value = value.timestamp()
+    return int(float(value) * 1e9)
+
+
+def record_fetch(page: Any) -> None:
+    """
+    Durasi fetch satu halaman dari crawl stream: crawl4ai (>= 0.5) mencatat start/end tiap
+    task di `result.dispatch_result`. Tanpa data itu tidak ada yang dicatat.
+    """
+    dispatch = getattr(page, "dispatch_result", None)
+    started_ns = _epoch_ns(getattr(dispatch, "start_time", None))
+    ended_ns = _epoch_ns(getattr(dispatch, "end_time", None))
+    if started_ns is not None and ended_ns is not None and ended_ns >= started_ns:
+        record_stage("fetch", started_ns, ended_ns, url=getattr(page, "url", None))
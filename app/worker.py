@@ -0,0 +1,163 @@
+"""
+Distributed crawl worker.
+
+Setiap worker mengambil URL dari shared Redis frontier (lihat app/frontier.py),
+lalu fetch, clean, summarize dan simpan halaman itu sendiri. Worker yang pertama
+melihat frontier sebuah job kosong menjadi coordinator dan membuat final summary.
+
+Jalankan beberapa proses di satu mesin (dari root repo):
+
+    python -m app.worker --processes 4
+    python -m app.worker --url https://example.com --depth 2 --pages 20 --processes 4
+
+Dengan --metrics-port N setiap process menyajikan Prometheus /metrics sendiri di
+port N + i (worker-0 di N, worker-1 di N + 1, ...); scrape semua port itu.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from typing import Optional
+
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+
+from app import metrics
+from app.frontier import RedisFrontier, active_jobs
+from app.mainred import analyze_page, ensure_hash_index, redis_client, summarize_site
+
+logger = logging.getLogger("crawl-worker")
+
+
+def internal_links(result) -> list:
+    links = getattr(result, "links", None) or {}
+    return [l["href"] for l in links.get("internal", []) if l.get("href")]
+
+
+async def process_item(crawler: AsyncWebCrawler, frontier: RedisFrontier, item: dict) -> None:
+    site = frontier.meta()["site"]
+    with metrics.stage_timer("fetch"):
+        result = await crawler.arun(url=item["url"], config=CrawlerRunConfig())
+    if not (getattr(result, "success", False) and result.html):
+        # Tanpa ack: lease akan expired dan URL dicoba lagi sampai max_attempts.
+        logger.warning("fetch failed for %s", item["url"])
+        return
+
+    for link in internal_links(result):
+        frontier.push(link, item["depth"] + 1)
+
+    frontier.extend(item)
+    entry = await asyncio.to_thread(analyze_page, site, result.url or item["url"], result.html)
+    if not frontier.ack(item, entry):
+        logger.warning("lease for %s expired before ack, result dropped", item["url"])
+
+
+def finalize(frontier: RedisFrontier) -> None:
+    """Coordinator step: final summary dibuat sekali saat frontier kosong."""
+    if not frontier.claim_finalize():
+        return
+    meta = frontier.meta()
+    final_summary = summarize_site(meta["site"], frontier.page_entries())
+    frontier.finish(final_summary)
+    logger.info("job %s finished", frontier.job_id)
+
+
+async def run_worker(
+    job_id: Optional[str] = None,
+    visibility_timeout: int = 120,
+    poll_interval: float = 1.0,
+    exit_when_idle: bool = False,
+) -> None:
+    ensure_hash_index()
+    async with AsyncWebCrawler() as crawler:
+        while True:
+            job_ids = [job_id] if job_id else active_jobs(redis_client)
+            worked = False
+            for jid in job_ids:
+                frontier = RedisFrontier(redis_client, jid, visibility_timeout=visibility_timeout)
+                item = frontier.lease()
+                if item is not None:
+                    worked = True
+                    try:
+                        await process_item(crawler, frontier, item)
+                    except Exception as e:
+                        logger.exception("error processing %s: %s", item["url"], e)
+                elif frontier.is_drained():
+                    await asyncio.to_thread(finalize, frontier)
+
+            if job_id and RedisFrontier(redis_client, job_id).meta().get("status") == "done":
+                return
+            if not worked:
+                if exit_when_idle and not active_jobs(redis_client):
+                    return
+                await asyncio.sleep(poll_interval)
+
+
+def _worker_main(
+    job_id: Optional[str],
+    visibility_timeout: int,
+    exit_when_idle: bool,
+    metrics_port: Optional[int] = None,
+) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(processName)s %(message)s")
+    if metrics_port is not None:
+        if metrics.serve(metrics_port):
+            logger.info("metrics on :%d/metrics", metrics_port)
+        else:
+            logger.warning("prometheus_client not installed, --metrics-port ignored")
+    asyncio.run(
+        run_worker(job_id, visibility_timeout=visibility_timeout, exit_when_idle=exit_when_idle)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distributed crawl worker (Redis frontier)")
+    parser.add_argument("--processes", type=int, default=1, help="Jumlah worker process")
+    parser.add_argument("--url", help="Buat job baru untuk URL ini lalu tunggu sampai selesai")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--job", help="Hanya kerjakan job ini")
+    parser.add_argument("--visibility-timeout", type=int, default=120)
+    parser.add_argument("--exit-when-idle", action="store_true")
+    parser.add_argument(
+        "--metrics-port", type=int, help="Port /metrics untuk worker-0; worker-i memakai port + i"
+    )
+    args = parser.parse_args()
+
+    job_id = args.job
+    if args.url:
+        job_id = RedisFrontier.create_job(
+            redis_client, args.url, args.depth, args.pages,
+            visibility_timeout=args.visibility_timeout,
+        ).job_id
+        print(f"job_id: {job_id}")
+
+    started = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(
+            target=_worker_main,
+            args=(
+                job_id,
+                args.visibility_timeout,
+                args.exit_when_idle,
+                None if args.metrics_port is None else args.metrics_port + i,
+            ),
+            name=f"worker-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    if job_id:
+        status = RedisFrontier(redis_client, job_id).status()
+        status["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        print(json.dumps(status, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Fake Gemini generateContent server with configurable latency and error rate.
+
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port>. The response
+mirrors the REST shape the app reads: candidates[0].content.parts[0].text plus
+usageMetadata token counts (approximated as words * 1.3).
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _approx_tokens(text: str) -> int:
+    return int(len(text.split()) * 1.3) + 1
+
+
+class FakeGemini:
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        summary_words: int = 60,
+        seed: int = 11,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.summary_words = summary_words
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _roll(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter))
+            r = self.rng.random()
+            if r < self.error_rate:
+                self.stats["errors"] += 1
+                return delay, 500
+            if r < self.error_rate + self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return delay, 429
+            return delay, 200
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                prompt = " ".join(
+                    part.get("text", "")
+                    for content in payload.get("contents", [])
+                    for part in content.get("parts", [])
+                )
+                delay, status = fake._roll()
+                time.sleep(delay)
+                if status != 200:
+                    body = {"error": {"code": status, "message": "fake failure"}}
+                else:
+                    text = " ".join(prompt.split()[: fake.summary_words]) or "empty"
+                    body = {
+                        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}],
+                        "usageMetadata": {
+                            "promptTokenCount": _approx_tokens(prompt),
+                            "candidatesTokenCount": _approx_tokens(text),
+                        },
+                    }
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake Gemini server")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeGemini(latency=args.latency, error_rate=args.error_rate) as fake:
+        print(f"GEMINI_BASE_URL={fake.base_url}")
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,285 @@
+"""
+Fake OpenAI-compatible server: chat completions plus the Batch API.
+
+Point the OpenAI client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+(or base_url=fake.base_url). Implemented endpoints:
+
+- POST /v1/chat/completions        JSON listings for the listing-like lines of the prompt
+- POST /v1/files                   multipart upload (purpose=batch)
+- GET  /v1/files/{id}/content
+- POST /v1/batches                 runs the uploaded JSONL after `batch_delay` seconds
+- GET  /v1/batches/{id}
+
+Listings are derived from the prompt (one per Markdown list item or table row,
+every requested field filled with the line's text), so extraction output can be
+checked against the fixture pages. Usage is approximated as words * 1.3.
+
+With `max_parallel` the server behaves like a local inference server (LM Studio,
+llama.cpp): at most that many requests are processed at once (the rest wait
+server-side), and each one slows down by `parallel_slowdown` per other request
+in its batch, so throughput grows sub-linearly with concurrency.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_LISTING_LINE = re.compile(r"^\s*(?:[*+-]|\d+\.|\|)\s*(.+)$")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+
+
+def _approx_tokens(text: str) -> int:
+    return int(len(text.split()) * 1.3) + 1
+
+
+def _requested_fields(body: dict):
+    """Field names from a json_schema response_format, or from the '"field": "type"' lines of the prompt."""
+    response_format = body.get("response_format") or {}
+    schema = (response_format.get("json_schema") or {}).get("schema") or {}
+    listing = (schema.get("properties", {}).get("listings", {}).get("items") or {})
+    if "$ref" in listing:
+        listing = schema.get("$defs", {}).get(listing["$ref"].rsplit("/", 1)[-1], {})
+    if listing.get("properties"):
+        return list(listing["properties"])
+    system = " ".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system")
+    return [f for f in re.findall(r'"(\w+)":\s*"\w+"', system) if f != "listings"] or ["text"]
+
+
+def fake_listings(body: dict, max_listings: int) -> dict:
+    user = " ".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user")
+    fields = _requested_fields(body)
+    listings = []
+    for line in user.splitlines():
+        match = _LISTING_LINE.match(line)
+        if not match or set(match.group(1)) <= set("-| "):
+            continue
+        text = _LINK.sub(r"\1", match.group(1)).strip(" |")
+        listings.append({field: text[:80] for field in fields})
+        if len(listings) >= max_listings:
+            break
+    return {"listings": listings}
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        batch_delay: float = 1.0,
+        max_listings: int = 100,
+        max_parallel: int = 0,
+        parallel_slowdown: float = 0.0,
+        seed: int = 13,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.batch_delay = batch_delay
+        self.max_listings = max_listings
+        self.parallel_slowdown = parallel_slowdown
+        self.slots = threading.BoundedSemaphore(max_parallel) if max_parallel else None
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        self.stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0, "batches": 0, "batch_requests": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _completion(self, body: dict) -> dict:
+        content = json.dumps(fake_listings(body, self.max_listings))
+        prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {
+                "prompt_tokens": _approx_tokens(prompt),
+                "completion_tokens": _approx_tokens(content),
+                "total_tokens": _approx_tokens(prompt) + _approx_tokens(content),
+            },
+        }
+
+    def _chat(self, body: dict):
+        if self.slots is not None:
+            self.slots.acquire()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter))
+            delay *= 1 + self.parallel_slowdown * (self.stats["in_flight"] - 1)
+            failed = self.rng.random() < self.error_rate
+        try:
+            time.sleep(delay)
+            if failed:
+                with self.lock:
+                    self.stats["errors"] += 1
+                return 500, {"error": {"message": "fake failure", "type": "server_error"}}
+            return 200, self._completion(body)
+        finally:
+            with self.lock:
+                self.stats["in_flight"] -= 1
+            if self.slots is not None:
+                self.slots.release()
+
+    def _store_file(self, content: bytes, purpose: str, filename: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        record = {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = (record, content)
+        return record
+
+    def _batch_view(self, batch_id: str) -> dict:
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_delay:
+                self._run_batch(batch)
+            return dict(batch)
+
+    def _run_batch(self, batch: dict) -> None:
+        """Execute a due batch (called with the lock held)."""
+        _, content = self.files[batch["input_file_id"]]
+        lines = []
+        for raw in content.decode("utf-8").splitlines():
+            if not raw.strip():
+                continue
+            request = json.loads(raw)
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": self._completion(request["body"])},
+                "error": None,
+            }))
+        output_id = f"file-{uuid.uuid4().hex[:16]}"
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        self.files[output_id] = ({"id": output_id, "object": "file", "bytes": len(data), "purpose": "batch_output",
+                                  "filename": "batch_output.jsonl", "created_at": int(time.time()),
+                                  "status": "processed"}, data)
+        self.stats["batch_requests"] += len(lines)
+        now = int(time.time())
+        batch.update(status="completed", output_file_id=output_id, completed_at=now, finalizing_at=now,
+                     request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+
+    def _create_batch(self, body: dict) -> dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"), "errors": None,
+            "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "in_progress_at": int(time.time()), "completed_at": None,
+            "finalizing_at": None, "expires_at": None, "failed_at": None, "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": body.get("metadata"),
+        }
+        with self.lock:
+            if body["input_file_id"] not in self.files:
+                raise KeyError(body["input_file_id"])
+            self.batches[batch_id] = batch
+            self.stats["batches"] += 1
+        return dict(batch)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body, content_type: str = "application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path.endswith("/chat/completions"):
+                    self._send(*fake._chat(json.loads(self._body() or b"{}")))
+                elif path.endswith("/files"):
+                    raw = self._body()
+                    message = BytesParser(policy=default_policy).parsebytes(
+                        b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw
+                    )
+                    parts = {p.get_param("name", header="content-disposition"): p for p in message.iter_parts()}
+                    upload = parts["file"]
+                    self._send(200, fake._store_file(
+                        upload.get_payload(decode=True),
+                        parts["purpose"].get_content().strip() if "purpose" in parts else "batch",
+                        upload.get_filename() or "upload.jsonl",
+                    ))
+                elif path.endswith("/batches"):
+                    try:
+                        self._send(200, fake._create_batch(json.loads(self._body() or b"{}")))
+                    except KeyError as e:
+                        self._send(404, {"error": {"message": f"No such file: {e}", "type": "invalid_request_error"}})
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {path}"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                match = re.search(r"/files/([^/]+)/content$", path)
+                if match and match.group(1) in fake.files:
+                    self._send(200, fake.files[match.group(1)][1], "application/octet-stream")
+                    return
+                match = re.search(r"/batches/([^/]+)$", path)
+                if match and match.group(1) in fake.batches:
+                    self._send(200, fake._batch_view(match.group(1)))
+                    return
+                self._send(404, {"error": {"message": f"Unknown path {path}"}})
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server (chat completions + Batch API)")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-delay", type=float, default=1.0)
+    parser.add_argument("--max-parallel", type=int, default=0, help="requests processed at once (0: unlimited)")
+    parser.add_argument("--parallel-slowdown", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeOpenAI(latency=args.latency, error_rate=args.error_rate, batch_delay=args.batch_delay,
+                    max_parallel=args.max_parallel, parallel_slowdown=args.parallel_slowdown) as fake:
+        print(f"OPENAI_BASE_URL={fake.base_url}")
+        while True:
+            time.sleep(3600)
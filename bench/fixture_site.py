@@ -0,0 +1,106 @@
+"""
+Generated static fixture site served from a local HTTP server.
+
+Pages form a tree (each page links to `fanout` children) and contain product
+listings, navigation and footer boilerplate so the cleaning/summarizing stages
+see realistic input.
+"""
+import os
+import random
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def render_page(page_id: int, children, rng: random.Random, listings: int) -> str:
+    nav = "".join(f'<li><a href="/page-{i}.html">Category {i}</a></li>' for i in range(8))
+    items = "".join(
+        f'<li class="product"><a href="/item-{page_id}-{i}.html">'
+        f'<h2 class="title">Product {page_id}-{i}</h2></a>'
+        f'<span class="price">${rng.randint(5, 500)}.{rng.randint(0, 99):02d}</span>'
+        f'<p class="desc">{_sentence(rng, 12)}</p></li>'
+        for i in range(listings)
+    )
+    links = "".join(f'<li><a href="/page-{c}.html">Section {c}</a></li>' for c in children)
+    paragraphs = "".join(f"<p>{_sentence(rng, 25)}</p>" for _ in range(6))
+    return f"""<!doctype html>
+<html><head><title>Fixture page {page_id}</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.analytics = {{}};</script></head>
+<body>
+<header><nav><ul>{nav}</ul></nav></header>
+<main>
+<h1>Fixture page {page_id}</h1>
+{paragraphs}
+<ul class="products">{items}</ul>
+<ul class="sections">{links}</ul>
+</main>
+<footer><p>&copy; Fixture Inc. All rights reserved.</p><a href="/privacy.html">Privacy</a></footer>
+</body></html>"""
+
+
+def generate_site(root: str, pages: int = 50, fanout: int = 4, listings: int = 20, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    for page_id in range(pages):
+        children = [c for c in range(page_id * fanout + 1, page_id * fanout + fanout + 1) if c < pages]
+        html = render_page(page_id, children, rng, listings)
+        name = "index.html" if page_id == 0 else f"page-{page_id}.html"
+        with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+            f.write(html)
+    return root
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureSite:
+    """`with FixtureSite(pages=50) as site: site.url` -> http://127.0.0.1:<port>/"""
+
+    def __init__(self, pages: int = 50, fanout: int = 4, listings: int = 20, root: str = None):
+        self.root = root or tempfile.mkdtemp(prefix="fixture-site-")
+        generate_site(self.root, pages=pages, fanout=fanout, listings=listings)
+        handler = partial(_QuietHandler, directory=self.root)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Serve a generated fixture site")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--listings", type=int, default=20)
+    args = parser.parse_args()
+    with FixtureSite(pages=args.pages, listings=args.listings) as site:
+        print(f"Serving {args.pages} pages from {site.root} at {site.url}")
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,106 @@
+"""
+Throughput benchmark for the local Llama extraction path of the rnd scraper.
+
+Extracts generated fixture pages through OpenAICompatibleProvider against the
+fake OpenAI-compatible server standing in for LM Studio (limited parallel slots,
+per-request slowdown with batch size), once per client concurrency level. All
+pages are submitted at once, as the pipeline does; the provider's request limit
+queues the rest client-side. Reports pages/min, per-page latency, client queue
+wait and the token counts taken from the server's usage data.
+
+Run from the repo root:
+
+    python -m bench.llm_concurrency_bench --pages 24 --concurrency 1,2,4,8
+    python -m bench.llm_concurrency_bench --server-slots 4 --latency 1.0 --slowdown 0.15
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rnd")
+sys.path.insert(0, RND_DIR)
+
+from assets import LLAMA_MODEL_FULLNAME  # noqa: E402
+from llm_providers import OpenAICompatibleProvider  # noqa: E402
+from markdown_converter import html_to_markdown  # noqa: E402
+from scraper import create_dynamic_listing_model, create_listings_container_model, format_chunk, listings_of  # noqa: E402
+
+from bench.fake_openai import FakeOpenAI  # noqa: E402
+from bench.fixture_site import generate_site  # noqa: E402
+from bench.markdown_bench import load_pages  # noqa: E402
+from bench.run import percentile  # noqa: E402
+
+FIELDS = ["title", "price"]
+
+
+def run_level(base_url: str, pages, concurrency: int) -> dict:
+    provider = OpenAICompatibleProvider(
+        "Llama3.1 8B", base_url, "lm-studio", LLAMA_MODEL_FULLNAME, max_in_flight=concurrency
+    )
+    listing_model = create_dynamic_listing_model(FIELDS)
+    container = create_listings_container_model(listing_model)
+    latencies = []
+
+    def extract(markdown: str):
+        started = time.perf_counter()
+        formatted, token_counts = format_chunk(markdown, container, listing_model, provider)
+        latencies.append(time.perf_counter() - started)
+        return len(listings_of(formatted)), token_counts
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(pages)) as pool:
+        results = list(pool.map(extract, pages))
+    elapsed = time.perf_counter() - started
+    stats = provider.stats()
+    return {
+        "concurrency": concurrency,
+        "pages": len(pages),
+        "elapsed_s": round(elapsed, 3),
+        "pages_per_min": round(len(pages) / elapsed * 60, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "queue_wait_s": stats["wait_seconds"],
+        "max_in_flight": stats["max_in_flight_seen"],
+        "listings": sum(count for count, _ in results),
+        "input_tokens": sum(counts["input_tokens"] for _, counts in results),
+        "output_tokens": sum(counts["output_tokens"] for _, counts in results),
+        "usage_reported": stats["usage_reported"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark concurrent requests to a local OpenAI-compatible server")
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated client request limits")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per request when processed alone")
+    parser.add_argument("--server-slots", type=int, default=4, help="requests the server processes at once")
+    parser.add_argument("--slowdown", type=float, default=0.15, help="per-request slowdown per other request in a batch")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="llm-bench-") as root:
+        pages = [html_to_markdown(html) for _, html in load_pages(generate_site(root, pages=args.pages))][:args.pages]
+
+    report = {"config": vars(args), "levels": []}
+    for level in levels:
+        with FakeOpenAI(latency=args.latency, jitter=0.0, max_parallel=args.server_slots,
+                        parallel_slowdown=args.slowdown) as fake:
+            result = run_level(fake.base_url, pages, level)
+            result["server_max_in_flight"] = fake.stats["max_in_flight"]
+        report["levels"].append(result)
+        print(f"concurrency {level:>3}: {result['pages_per_min']:>8} pages/min, p50 {result['p50_ms']} ms",
+              file=sys.stderr)
+
+    baseline = report["levels"][0]["pages_per_min"] if report["levels"] else 0
+    for result in report["levels"]:
+        result["speedup"] = round(result["pages_per_min"] / baseline, 2) if baseline else None
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
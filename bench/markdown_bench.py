@@ -0,0 +1,107 @@
+"""
+HTML-to-Markdown benchmark for the rnd scraper.
+
+Compares the old BeautifulSoup + html2text path with the single-pass lxml
+converter (rnd/markdown_converter.py) on a directory of saved .html pages, or on
+generated fixture pages when no directory is given. Reports conversion time and
+the Markdown token count that would be sent to the LLM.
+
+Run from the repo root:
+
+    python -m bench.markdown_bench --html-dir path/to/saved_pages
+    python -m bench.markdown_bench --site-pages 50 --repeat 5
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import html2text
+from bs4 import BeautifulSoup
+
+RND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rnd")
+sys.path.insert(0, RND_DIR)
+
+from markdown_converter import html_to_markdown  # noqa: E402
+from token_budget import count_tokens  # noqa: E402
+
+from bench.fixture_site import generate_site  # noqa: E402
+from bench.run import percentile  # noqa: E402
+
+
+def legacy_html_to_markdown(html_content: str) -> str:
+    """Previous scraper path: html.parser soup, drop header/footer, serialize, html2text."""
+    soup = BeautifulSoup(html_content, "html.parser")
+    for element in soup.find_all(["header", "footer"]):
+        element.decompose()
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    return converter.handle(str(soup))
+
+
+CONVERTERS = {
+    "legacy_html2text": legacy_html_to_markdown,
+    "single_pass_lxml": html_to_markdown,
+}
+
+
+def load_pages(html_dir: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(html_dir, "**", "*.htm*"), recursive=True)):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.relpath(path, html_dir), f.read()))
+    return pages
+
+
+def run_converter(convert, pages, repeat: int, model: str) -> dict:
+    latencies = []
+    tokens = 0
+    for _ in range(repeat):
+        tokens = 0
+        for _, html in pages:
+            started = time.perf_counter()
+            markdown = convert(html)
+            latencies.append(time.perf_counter() - started)
+            tokens += count_tokens(markdown, model)
+    return {
+        "pages": len(pages),
+        "total_s": round(sum(latencies), 4),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "output_tokens": tokens,
+        "tokens_per_page": round(tokens / len(pages), 1) if pages else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-Markdown conversion")
+    parser.add_argument("--html-dir", help="directory of saved .html pages (default: generated fixture pages)")
+    parser.add_argument("--site-pages", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="gpt-4o-mini", help="tokenizer used for output token counts")
+    args = parser.parse_args()
+
+    if args.html_dir:
+        pages = load_pages(args.html_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="md-bench-") as root:
+            pages = load_pages(generate_site(root, pages=args.site_pages))
+    if not pages:
+        print("No .html pages found", file=sys.stderr)
+        return 1
+
+    results = {name: run_converter(convert, pages, args.repeat, args.model) for name, convert in CONVERTERS.items()}
+    legacy, single = results["legacy_html2text"], results["single_pass_lxml"]
+    results["speedup"] = round(legacy["total_s"] / single["total_s"], 2) if single["total_s"] else None
+    results["token_reduction_pct"] = (
+        round(100 * (1 - single["output_tokens"] / legacy["output_tokens"]), 1) if legacy["output_tokens"] else None
+    )
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+In-memory stand-in for the slice of Redis Stack that app/mainred.py uses:
+HSET and FT.INFO / FT.CREATE / FT.SEARCH with a `KNN k @vector $vec` query,
+optionally prefixed with an `@site:(...)` filter. KNN is brute force cosine.
+"""
+import re
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+_KNN_RE = re.compile(r"KNN\s+(\d+)\s+@vector\s+\$vec")
+_SITE_RE = re.compile(r"@site:\((.*?)\)")
+
+
+class _Index:
+    def __init__(self, store: "MemoryRedis", name: str):
+        self.store = store
+        self.name = name
+
+    def info(self):
+        if self.name not in self.store.indexes:
+            raise RuntimeError("Unknown Index name")
+        return {"index_name": self.name}
+
+    def create_index(self, schema, definition=None):
+        prefixes = definition.args[definition.args.index("PREFIX") + 2] if definition else ""
+        self.store.indexes[self.name] = prefixes
+
+    def search(self, query, query_params=None):
+        qs = query.query_string()
+        k = int(_KNN_RE.search(qs).group(1))
+        site = _SITE_RE.search(qs)
+        qvec = np.frombuffer(query_params["vec"], dtype=np.float32)
+        prefix = self.store.indexes.get(self.name, "")
+
+        with self.store.lock:
+            rows = [(key, h) for key, h in self.store.hashes.items() if key.startswith(prefix)]
+        if site:
+            rows = [(key, h) for key, h in rows if h.get("site") == site.group(1)]
+        if not rows:
+            return SimpleNamespace(total=0, docs=[])
+
+        matrix = np.stack([np.frombuffer(h["vector"], dtype=np.float32) for _, h in rows])
+        # embedding dinormalisasi, jadi cosine distance = 1 - dot
+        scores = 1.0 - matrix @ qvec
+        order = np.argsort(scores)[:k]
+        docs = []
+        for i in order:
+            key, h = rows[i]
+            fields = {f: h.get(f, "") for f in ("site", "url", "kind", "summary", "created_at")}
+            docs.append(SimpleNamespace(id=key, score=str(scores[i]), **fields))
+        return SimpleNamespace(total=len(docs), docs=docs)
+
+
+class MemoryRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def hset(self, key, mapping=None, **kwargs):
+        with self.lock:
+            self.hashes.setdefault(key, {}).update(mapping or {}, **kwargs)
+        return len(mapping or kwargs)
+
+    def ft(self, index_name: str):
+        return _Index(self, index_name)
+
+    def flushall(self):
+        with self.lock:
+            self.hashes.clear()
+            self.indexes.clear()
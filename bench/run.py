@@ -0,0 +1,194 @@
+"""
+Offline end-to-end benchmark for app/mainred.py.
+
+Serves a generated fixture site and a fake Gemini server locally, uses either a
+local Redis Stack (--redis redis://...) or the in-memory stand-in (default),
+then runs the crawl_and_analyze, semantic_search and /chat scenarios.
+
+Run from the repo root:
+
+    python -m bench.run --pages 30 --gemini-latency 0.3
+    python -m bench.run --compare bench/results/<previous>.json
+
+Results (pages/s, p50/p95/p99 latency, peak RSS) are written as JSON to
+bench/results/ so runs can be compared for regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from bench.fake_gemini import FakeGemini
+from bench.fixture_site import WORDS, FixtureSite
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(latencies, elapsed: float, units: int, errors: int = 0) -> dict:
+    return {
+        "count": len(latencies),
+        "units": units,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(units / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss dalam KB di Linux; children = Chromium yang sudah di-wait
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def run_crawl(mainred, site_url: str, depth: int, pages: int, runs: int) -> dict:
+    page_latencies = []
+    original = mainred.analyze_page
+
+    def timed_analyze_page(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            page_latencies.append(time.perf_counter() - started)
+
+    mainred.analyze_page = timed_analyze_page
+    run_latencies, total_pages, errors = [], 0, 0
+    started = time.perf_counter()
+    try:
+        for _ in range(runs):
+            run_started = time.perf_counter()
+            result = asyncio.run(mainred.crawl_and_analyze(site_url, depth, pages))
+            run_latencies.append(time.perf_counter() - run_started)
+            total_pages += len(result["pages"])
+            errors += sum(1 for p in result["pages"] if p["summary"].startswith("Error:"))
+    finally:
+        mainred.analyze_page = original
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(page_latencies, elapsed, total_pages, errors)
+    stats["pages_per_s"] = stats.pop("throughput_per_s")
+    stats["run_p50_ms"] = round(percentile(run_latencies, 50) * 1000, 2)
+    return stats
+
+
+def _queries(n: int):
+    return [" ".join(WORDS[i % len(WORDS): i % len(WORDS) + 3]) or "product" for i in range(n)]
+
+
+def run_search(mainred, n: int, k: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for q in _queries(n):
+        q_started = time.perf_counter()
+        mainred.semantic_search(q, top_k=k)
+        latencies.append(time.perf_counter() - q_started)
+    return summarize(latencies, time.perf_counter() - started, n)
+
+
+def run_chat(mainred, n: int, k: int) -> dict:
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for q in _queries(n):
+        q_started = time.perf_counter()
+        response = mainred.chat(q=q, site=None, k=k)
+        latencies.append(time.perf_counter() - q_started)
+        errors += response.status_code != 200
+    return summarize(latencies, time.perf_counter() - started, n, errors)
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path}:")
+    for name, stats in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in ("pages_per_s", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms"):
+            if metric in stats and metric in base and base[metric]:
+                delta = (stats[metric] - base[metric]) / base[metric] * 100
+                print(f"  {name:<7} {metric:<17} {base[metric]:>10} -> {stats[metric]:>10} ({delta:+.1f}%)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the crawl/search/chat pipeline")
+    parser.add_argument("--pages", type=int, default=20, help="max_pages per crawl")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--site-pages", type=int, default=50, help="pages generated in the fixture site")
+    parser.add_argument("--crawl-runs", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis", default="memory", help="'memory' atau URL Redis Stack lokal")
+    parser.add_argument("--scenarios", default="crawl,search,chat")
+    parser.add_argument("--output", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="hasil JSON sebelumnya untuk dibandingkan")
+    args = parser.parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    with FixtureSite(pages=args.site_pages) as site, FakeGemini(
+        latency=args.gemini_latency, error_rate=args.gemini_error_rate
+    ) as gemini:
+        os.environ["GEMINI_API_KEY"] = os.getenv("GEMINI_API_KEY") or "bench"
+        os.environ["GEMINI_BASE_URL"] = gemini.base_url
+        if args.redis != "memory":
+            os.environ["REDIS_URL"] = args.redis
+
+        from app import mainred
+
+        if args.redis == "memory":
+            from bench.memory_redis import MemoryRedis
+
+            mainred.redis_client = MemoryRedis()
+
+        results = {}
+        if "crawl" in scenarios:
+            results["crawl"] = run_crawl(mainred, site.url, args.depth, args.pages, args.crawl_runs)
+        if "search" in scenarios:
+            mainred.ensure_hash_index()
+            results["search"] = run_search(mainred, args.queries, args.k)
+        if "chat" in scenarios:
+            results["chat"] = run_chat(mainred, args.queries, args.k)
+
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "config": vars(args),
+            "scenarios": results,
+            "peak_rss_mb": peak_rss_mb(),
+            "fake_gemini": dict(gemini.stats),
+        }
+
+    os.makedirs(args.output, exist_ok=True)
+    out_path = os.path.join(args.output, f"bench_{datetime.now().strftime('%Y_%m_%d__%H_%M_%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    print(json.dumps(report, indent=4))
+    print(f"\nResults saved to {out_path}")
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,37 @@
 
-import streamlit as st
 import os
+import sys
+import threading
+
+SESSION_KEYS = {
+    'OPENAI_API_KEY': 'openai_api_key',
+    'GOOGLE_API_KEY': 'gemini_api_key',
+    'GROQ_API_KEY': 'groq_api_key',
+}
+
+_thread_keys = threading.local()
+
+
+def use_api_keys(api_keys):
+    """API keys for the current thread, ahead of the session and the environment (background jobs and their workers)."""
+    _thread_keys.keys = {name: key for name, key in (api_keys or {}).items() if key}
+
+
+def _session_value(key):
+    # Only consult the sidebar when running inside a Streamlit script; the CLI never imports streamlit
+    if 'streamlit' not in sys.modules:
+        return None
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx() is None:
+        return None
+    return sys.modules['streamlit'].session_state.get(key)
+
 
 def get_api_key(api_key_name):
     # Check if the API key from the sidebar is present, else fallback to the .env file
-    if api_key_name == 'OPENAI_API_KEY':
-        return st.session_state['openai_api_key'] or os.getenv(api_key_name)
-    elif api_key_name == 'GOOGLE_API_KEY':
-        return st.session_state['gemini_api_key'] or os.getenv(api_key_name)
-    elif api_key_name == 'GROQ_API_KEY':
-        return st.session_state['groq_api_key'] or os.getenv(api_key_name)
-    else:
-        return os.getenv(api_key_name)
-        
\ No newline at end of file
+    thread_key = getattr(_thread_keys, 'keys', {}).get(api_key_name)
+    if thread_key:
+        return thread_key
+    if api_key_name in SESSION_KEYS:
+        return _session_value(SESSION_KEYS[api_key_name]) or os.getenv(api_key_name)
+    return os.getenv(api_key_name)
@@ -87,6 +87,36 @@ PRICING = {
     # Add other models and their prices here if needed
 }
 
+# Batch API pricing (50% of the synchronous price, results within 24h); used by batch_extraction.py
+BATCH_PRICING = {
+    "gpt-4o-mini": {
+        "input": 0.075 / 1_000_000,  # $0.075 per 1M input tokens
+        "output": 0.300 / 1_000_000, # $0.300 per 1M output tokens
+    },
+    "gpt-4o-2024-08-06": {
+        "input": 1.25 / 1_000_000,  # $1.25 per 1M input tokens
+        "output": 5 / 1_000_000, # $5 per 1M output tokens
+    },
+}
+
+# Maximum input tokens sent per request (content is truncated at a sentence boundary)
+MAX_INPUT_TOKENS = {
+    "gpt-4o-mini": 120_000,
+    "gpt-4o-2024-08-06": 120_000,
+    "gemini-1.5-flash": 900_000,
+    "Llama3.1 8B": 120_000,
+    "Groq Llama3.1 70b": 120_000,
+}
+
+# Expected output size used to estimate cost before a request is sent
+EXPECTED_OUTPUT_TOKENS = 2_000
+
+# Budget governor: cheaper fallbacks (same provider and API key), cheapest last, used when a run's budget runs low
+BUDGET_DOWNGRADES = {
+    "gpt-4o-2024-08-06": ["gpt-4o-mini"],
+}
+BUDGET_DOWNGRADE_AT = 0.2  # downgrade once less than this share of max spend / max tokens would remain
+
 # Timeout settings for web scraping
 TIMEOUT_SETTINGS = {
     "page_load": 30,
@@ -101,13 +131,71 @@ HEADLESS_OPTIONS_DOCKER = ["--headless=new","--no-sandbox","--disable-gpu", "--d
 #in case you don't need to open the website
 ##HEADLESS_OPTIONS=HEADLESS_OPTIONS+[ "--headless=new"]
 
-#number of scrolls
+#maximum number of scrolls while waiting for lazy-loaded content
 NUMBER_SCROLL=2
 
+# Adaptive page loading: poll until scroll height, DOM size and network activity stop changing
+SCROLL_MAX_WAIT=10          # seconds
+SCROLL_POLL_INTERVAL=0.3    # seconds between checks
+SCROLL_STABLE_POLLS=2       # consecutive unchanged checks before the page counts as loaded
+
+# Selenium driver pool: browsers kept alive and pages served before a browser is recycled
+DRIVER_POOL_SIZE=2
+DRIVER_MAX_USES=25
+
+# HTTP-first fetching: pages are only loaded in Chrome when the plain HTML looks incomplete
+HTTP_FETCH_TIMEOUT=15
+HTTP_MAX_CONNECTIONS=20
+HTTP_MIN_TEXT_CHARS=500       # less visible text than this -> escalate to the browser
+HTTP_MIN_TEXT_DENSITY=0.01    # visible text / HTML size below this -> escalate to the browser
+FETCH_WORKERS=8               # concurrent fetches; Chrome usage is still bounded by DRIVER_POOL_SIZE
+
+# Concurrent LLM extraction requests in the multi-URL pipeline
+LLM_WORKERS=4
+# Requests in flight to the local Llama server (match its parallel slots); further requests queue client-side
+LOCAL_LLM_CONCURRENCY=4
+
+# Background scrape jobs: listings live in the output files; the live view keeps only the latest in memory
+JOB_LIVE_ROWS=200             # most recent listing rows shown while a job runs
+JOB_LIVE_PAGES=50             # most recent finished pages shown while a job runs
+
+# Pagination: detection and follow-through of detected page URLs
+PAGINATION_MAX_PAGES=20       # default cap on followed pages
+PAGINATION_WAVE_SIZE=4        # pages scraped concurrently before checking for new listings
+PAGINATION_RULE_MAX_PAGES=500 # cap on page URLs extrapolated by the rule-based detector
+PAGINATION_RULE_MAX_SPAN=1000 # patterns spanning more pages than this (or starting past it) are not pagination
+
+# Chunked extraction: long pages are split into chunks of this many tokens and extracted concurrently
+EXTRACT_CHUNK_TOKENS=8_000
+EXTRACT_CHUNK_WORKERS=4       # per page; the pipeline runs up to LLM_WORKERS pages at once
+CHUNK_BORDER_LISTINGS=3       # lines carried into the next chunk, and listings on each side of a border checked for duplicates
+
+# Extraction result cache (SQLite); bump the version to invalidate entries after changing extraction logic
+EXTRACTION_CACHE_PATH="output/extraction_cache.sqlite"
+EXTRACTION_PROMPT_VERSION="1"
+METRICS_PORT_ENV="SCRAPER_METRICS_PORT" # set to serve Prometheus /metrics (cache hits) from the Streamlit process
+
+# CSS schemas learned from LLM extractions, reused for later pages of the same domain/URL template
+CSS_SCHEMA_DIR="output/css_schemas"
+CSS_SCHEMA_SAMPLES=10          # listing cards used to derive field selectors
+CSS_SCHEMA_MIN_AGREEMENT=0.9   # share of LLM values the schema must reproduce to be stored
+CSS_SCHEMA_MIN_FILL=0.5        # share of fields a stored schema must fill before its output is used
+
+# Schema-driven crawl4ai extraction (main.py): pages crawled at once on the shared browser
+SCHEMA_CRAWL_CONCURRENCY=8
+
+# Batch extraction
+BATCH_POLL_INTERVAL=30        # seconds between batch status checks
+BATCH_MAX_REQUESTS=50_000     # requests per submitted batch file (OpenAI limit)
+
 
 LLAMA_MODEL_FULLNAME="lmstudio-community/Meta-Llama-3.1-8B-Instruct-GGUF"
 GROQ_LLAMA_MODEL_FULLNAME="llama-3.1-70b-versatile"
 
+# OpenAI-compatible endpoints (LM Studio for the local Llama model, Groq's hosted API)
+LOCAL_LLM_BASE_URL="http://localhost:1234/v1"
+GROQ_BASE_URL="https://api.groq.com/openai/v1"
+
 SYSTEM_MESSAGE = """You are an intelligent text extraction and conversion assistant. Your task is to extract structured information 
                         from the given text and convert it into a pure JSON format. The JSON should contain only the structured data extracted from the text, 
                         with no additional commentary, explanations, or extraneous information. 
@@ -0,0 +1,272 @@
+"""
+Batch-API extraction for large offline jobs.
+
+Pages are fetched and reduced as in the interactive pipeline, but instead of one
+synchronous LLM call per page the format_data requests are written as JSONL
+(batch_input_N.jsonl), submitted through a batch provider (llm_providers.py),
+polled until done and mapped back to the usual sorted_data_N.json outputs, plus
+the combined listings.jsonl / .parquet / .csv / .xlsx from output_sink.py.
+Latency is hours instead of seconds; cost follows BATCH_PRICING.
+
+State lives in <output>/batch_manifest.json, so a job can be collected later or
+from another machine:
+
+    python rnd/batch_extraction.py --urls-file urls.txt --fields name price --model gpt-4o-mini
+    python rnd/batch_extraction.py --resume output/<folder>
+
+Offline, point OPENAI_BASE_URL at bench/fake_openai.py.
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from assets import (
+    BATCH_MAX_REQUESTS,
+    BATCH_POLL_INTERVAL,
+    BATCH_PRICING,
+    CHUNK_BORDER_LISTINGS,
+    MAX_INPUT_TOKENS,
+    SYSTEM_MESSAGE,
+    USER_MESSAGE,
+)
+from content_reducer import ContentReducer
+from extraction_cache import extraction_variant, get_default_cache, prompt_version
+from llm_providers import BATCH_TERMINAL_STATUSES, BatchProvider, LLMResult, get_batch_provider
+from output_sink import OutputSink, export_csv, export_excel
+from pipeline import run_pipeline
+from scraper import (
+    create_dynamic_listing_model,
+    create_listings_container_model,
+    generate_unique_folder_name,
+    listings_of,
+    merge_listings,
+    save_formatted_data,
+    save_raw_data,
+)
+from token_budget import count_tokens, split_to_budget
+
+MANIFEST_FILE = "batch_manifest.json"
+
+
+def _load_manifest(output_folder: str) -> dict:
+    with open(os.path.join(output_folder, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(output_folder: str, manifest: dict) -> None:
+    with open(os.path.join(output_folder, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def _batch_cost(token_counts: Dict[str, int], model: str) -> float:
+    pricing = BATCH_PRICING[model]
+    return token_counts["input_tokens"] * pricing["input"] + token_counts["output_tokens"] * pricing["output"]
+
+
+def prepare_batch(
+    urls: List[str],
+    fields: List[str],
+    selected_model: str,
+    output_folder: str,
+    provider: BatchProvider,
+    focus_listings: bool = False,
+) -> dict:
+    """Fetch and reduce every page, answer what the extraction cache can, submit the rest."""
+    os.makedirs(output_folder, exist_ok=True)
+    DynamicListingsContainer = create_listings_container_model(create_dynamic_listing_model(fields))
+    cache = get_default_cache()
+    budget = MAX_INPUT_TOKENS[selected_model] - count_tokens(SYSTEM_MESSAGE + USER_MESSAGE, selected_model)
+
+    manifest = {
+        "model": selected_model,
+        "fields": fields,
+        "prompt_version": prompt_version(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "batches": [],
+        "pages": {},
+    }
+    requests = []
+    reducer = ContentReducer()
+    for item in run_pipeline(urls, fields, selected_model, output_folder, extract=False):
+        index, url = item["index"], item["url"]
+        page = manifest["pages"][str(index)] = {"url": url, "chunks": [], "status": "pending"}
+        if item.get("error"):
+            page.update(status="fetch_failed", error=item["error"])
+            continue
+
+        reduced, reduction = reducer.reduce(
+            item["markdown"], url, focus_listings=focus_listings, model=selected_model
+        )
+        page["input_file"] = f"llmInput_{index}.md"
+        save_raw_data(reduced, output_folder, page["input_file"])
+
+        # Same key as the interactive path: the page before reduction, plus the request settings
+        variant = extraction_variant(focus_listings=focus_listings)
+        page["cache_variant"] = variant
+        cached = cache.get(item["markdown"], fields, selected_model, variant)
+        if cached is not None:
+            save_formatted_data(cached[0], output_folder, f"sorted_data_{index}.json")
+            page.update(status="cached", input_tokens=0, output_tokens=0, cost=0.0)
+            continue
+
+        for number, chunk in enumerate(split_to_budget(reduced, budget, selected_model, overlap=CHUNK_BORDER_LISTINGS) or [""]):
+            custom_id = f"page-{index}-chunk-{number}"
+            page["chunks"].append(custom_id)
+            requests.append(provider.request(custom_id, SYSTEM_MESSAGE, USER_MESSAGE + chunk, DynamicListingsContainer))
+        page["tokens_saved"] = reduction["tokens_saved"]
+
+    for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+        path = os.path.join(output_folder, f"batch_input_{len(manifest['batches']) + 1}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for request in requests[start:start + BATCH_MAX_REQUESTS]:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        batch_id = provider.submit(path)
+        manifest["batches"].append({"id": batch_id, "input_file": os.path.basename(path), "status": "submitted"})
+        print(f"Submitted {path} as batch {batch_id}")
+
+    _save_manifest(output_folder, manifest)
+    return manifest
+
+
+def wait_for_batches(provider: BatchProvider, manifest: dict, output_folder: str,
+                     poll_interval: float = BATCH_POLL_INTERVAL, timeout: Optional[float] = None) -> bool:
+    """Poll until every batch reached a terminal status; False on timeout."""
+    started = time.monotonic()
+    while True:
+        pending = 0
+        for batch in manifest["batches"]:
+            if batch["status"] in BATCH_TERMINAL_STATUSES:
+                continue
+            status = provider.status(batch["id"])
+            batch["status"] = status["status"]
+            print(f"Batch {batch['id']}: {status['status']} ({status['completed']}/{status['total']} done, "
+                  f"{status['failed']} failed)")
+            pending += batch["status"] not in BATCH_TERMINAL_STATUSES
+        _save_manifest(output_folder, manifest)
+        if not pending:
+            return True
+        if timeout is not None and time.monotonic() - started > timeout:
+            return False
+        time.sleep(poll_interval)
+
+
+def collect_batch(output_folder: str, provider: BatchProvider) -> dict:
+    """Map finished batch results back to sorted_data_N.json and fill the extraction cache."""
+    manifest = _load_manifest(output_folder)
+    fields, selected_model = manifest["fields"], manifest["model"]
+    DynamicListingsContainer = create_listings_container_model(create_dynamic_listing_model(fields))
+
+    results: Dict[str, object] = {}
+    for batch in manifest["batches"]:
+        if batch["status"] == "completed":
+            results.update(provider.results(batch["id"], DynamicListingsContainer))
+
+    cache = get_default_cache()
+    totals = defaultdict(float)
+    for index, page in sorted(manifest["pages"].items(), key=lambda item: int(item[0])):
+        if page["status"] != "pending":
+            continue
+        chunk_results = [results.get(custom_id) for custom_id in page["chunks"]]
+        failed = [r for r in chunk_results if not isinstance(r, LLMResult)]
+        if failed:
+            page.update(status="failed", error=str(failed[0] or "missing from batch output"))
+            continue
+
+        if len(chunk_results) == 1:
+            formatted_data = chunk_results[0].data
+        else:
+            formatted_data = {"listings": merge_listings([listings_of(r.data) for r in chunk_results])}
+        token_counts = {
+            "input_tokens": sum(r.input_tokens for r in chunk_results),
+            "output_tokens": sum(r.output_tokens for r in chunk_results),
+        }
+        save_formatted_data(formatted_data, output_folder, f"sorted_data_{index}.json")
+        with open(os.path.join(output_folder, f"rawData_{index}.md"), encoding="utf-8") as f:
+            cache.put(f.read(), fields, selected_model, formatted_data, token_counts, url=page["url"],
+                      variant=page.get("cache_variant"))
+        cost = _batch_cost(token_counts, selected_model)
+        page.update(status="done", cost=cost, **token_counts)
+        totals["input_tokens"] += token_counts["input_tokens"]
+        totals["output_tokens"] += token_counts["output_tokens"]
+        totals["cost"] += cost
+
+    _save_manifest(output_folder, manifest)
+
+    # Combined outputs, streamed page by page from the per-page JSON files
+    with OutputSink(output_folder, fields) as sink:
+        for index, page in sorted(manifest["pages"].items(), key=lambda item: int(item[0])):
+            if page["status"] in ("cached", "done"):
+                with open(os.path.join(output_folder, f"sorted_data_{index}.json"), encoding="utf-8") as f:
+                    sink.write(int(index), page["url"], listings_of(json.load(f)))
+    export_csv(sink.jsonl_path)
+    export_excel(sink.jsonl_path)
+
+    statuses = defaultdict(int)
+    for page in manifest["pages"].values():
+        statuses[page["status"]] += 1
+    summary = {
+        "output_folder": output_folder,
+        "model": selected_model,
+        "pages": dict(statuses),
+        "input_tokens": int(totals["input_tokens"]),
+        "output_tokens": int(totals["output_tokens"]),
+        "total_cost": round(totals["cost"], 6),
+        "listings": sink.rows,
+    }
+    with open(os.path.join(output_folder, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def run_batch(urls: List[str], fields: List[str], selected_model: str, output_folder: str,
+              focus_listings: bool = False, poll_interval: float = BATCH_POLL_INTERVAL,
+              api_key: Optional[str] = None) -> dict:
+    provider = get_batch_provider(selected_model, api_key)
+    manifest = prepare_batch(urls, fields, selected_model, output_folder, provider, focus_listings)
+    wait_for_batches(provider, manifest, output_folder, poll_interval)
+    return collect_batch(output_folder, provider)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract listings through the Batch API")
+    parser.add_argument("--urls-file", help="File with one URL per line")
+    parser.add_argument("--fields", nargs="+", help="Fields to extract")
+    parser.add_argument("--model", default="gpt-4o-mini", choices=sorted(BATCH_PRICING))
+    parser.add_argument("--output", help="Output folder (default: output/<domain>_<timestamp>)")
+    parser.add_argument("--focus-listings", action="store_true")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+    parser.add_argument("--no-wait", action="store_true", help="Submit and exit; collect later with --resume")
+    parser.add_argument("--resume", metavar="FOLDER", help="Poll and collect a previously submitted job")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if args.resume:
+        manifest = _load_manifest(args.resume)
+        provider = get_batch_provider(manifest["model"], api_key)
+        wait_for_batches(provider, manifest, args.resume, args.poll_interval)
+        print(json.dumps(collect_batch(args.resume, provider), indent=2))
+        return
+
+    if not args.urls_file or not args.fields:
+        parser.error("--urls-file and --fields are required unless --resume is given")
+    with open(args.urls_file, encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    if not urls:
+        parser.error(f"{args.urls_file} lists no URLs (blank lines and # comments are skipped)")
+    output_folder = args.output or os.path.join("output", generate_unique_folder_name(urls[0]))
+
+    provider = get_batch_provider(args.model, api_key)
+    manifest = prepare_batch(urls, args.fields, args.model, output_folder, provider, args.focus_listings)
+    if args.no_wait:
+        print(f"Submitted {len(manifest['batches'])} batch(es); collect with --resume {output_folder}")
+        return
+    wait_for_batches(provider, manifest, output_folder, args.poll_interval)
+    print(json.dumps(collect_batch(output_folder, provider), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Per-run spend and token limits for LLM extraction.
+
+Every extraction request reserves its estimated cost before it is sent: the
+pre-counted input tokens plus EXPECTED_OUTPUT_TOKENS, priced from PRICING. A
+reservation that would take committed + in-flight spend (or tokens) over the
+run's limits is refused with BudgetExceeded, so concurrent workers cannot overrun
+the budget together. When the remaining budget drops below BUDGET_DOWNGRADE_AT,
+requests move to the cheaper fallback models of BUDGET_DOWNGRADES (same provider,
+same API key). Once a request gets a response, its reservation is replaced by the
+actual cost, also when that response is unusable (it was billed); only requests
+that got no response release their reservation. stats() reports spend, tokens and the live spend rate.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from assets import BUDGET_DOWNGRADE_AT, BUDGET_DOWNGRADES, EXPECTED_OUTPUT_TOKENS, PRICING
+from token_budget import estimate_cost
+
+# Spend rate is measured over this trailing window
+RATE_WINDOW_SECONDS = 60
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class Reservation:
+    model: str                # model the request must be sent to (may be a downgrade)
+    tokens: int               # input + expected output tokens
+    cost: float               # estimated cost in dollars
+    downgraded: bool = False
+
+
+class BudgetGovernor:
+    def __init__(self, max_cost: Optional[float] = None, max_tokens: Optional[int] = None,
+                 downgrade: bool = True, downgrade_at: float = BUDGET_DOWNGRADE_AT,
+                 expected_output_tokens: int = EXPECTED_OUTPUT_TOKENS):
+        self.max_cost = max_cost or None
+        self.max_tokens = max_tokens or None
+        self.downgrade = downgrade
+        self.downgrade_at = downgrade_at
+        self.expected_output_tokens = expected_output_tokens
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._spent = 0.0
+        self._tokens = 0
+        self._reserved_cost = 0.0
+        self._reserved_tokens = 0
+        self._requests = 0
+        self._downgrades = 0
+        self._refused = 0
+        self._recent = []  # (monotonic time, cost, tokens) of committed requests
+
+    def models_for(self, selected_model: str) -> List[str]:
+        """The selected model followed by its downgrade fallbacks, if downgrading is enabled."""
+        return [selected_model] + (BUDGET_DOWNGRADES.get(selected_model, []) if self.downgrade else [])
+
+    def _remaining_share(self, cost: float, tokens: int) -> float:
+        """Smallest share of either limit left after adding this much on top of spent + reserved."""
+        shares = [1.0]
+        if self.max_cost:
+            shares.append((self.max_cost - self._spent - self._reserved_cost - cost) / self.max_cost)
+        if self.max_tokens:
+            shares.append((self.max_tokens - self._tokens - self._reserved_tokens - tokens) / self.max_tokens)
+        return min(shares)
+
+    def reserve(self, selected_model: str, input_tokens: int,
+                expected_output_tokens: Optional[int] = None) -> Reservation:
+        """Reserve one request's estimated cost; may switch to a cheaper model, raises BudgetExceeded."""
+        tokens = input_tokens + (expected_output_tokens or self.expected_output_tokens)
+        with self._lock:
+            options = []
+            for model in self.models_for(selected_model):
+                cost = estimate_cost(input_tokens, tokens - input_tokens, PRICING[model])
+                remaining = self._remaining_share(cost, tokens)
+                if remaining >= 0:
+                    options.append((model, cost, remaining))
+            if not options:
+                self._refused += 1
+                raise BudgetExceeded(
+                    f"Request of ~{tokens} tokens does not fit the remaining budget "
+                    f"(spent ${self._spent:.4f} + ${self._reserved_cost:.4f} in flight of "
+                    f"{f'${self.max_cost:.4f}' if self.max_cost else 'unlimited'}, "
+                    f"{self._tokens} of {self.max_tokens or 'unlimited'} tokens)"
+                )
+            # Keep the selected model while the budget is comfortable, otherwise the first fallback that leaves room
+            model, cost, _ = next((o for o in options if o[2] >= self.downgrade_at), options[-1])
+            reservation = Reservation(model, tokens, cost, downgraded=model != selected_model)
+            self._reserved_cost += cost
+            self._reserved_tokens += tokens
+            self._downgrades += reservation.downgraded
+            return reservation
+
+    def release(self, reservation: Reservation) -> None:
+        """Drop a reservation whose request got no response (e.g. a transport error), so nothing was billed."""
+        with self._lock:
+            self._reserved_cost -= reservation.cost
+            self._reserved_tokens -= reservation.tokens
+
+    def commit(self, reservation: Reservation, token_counts: Dict[str, int]) -> float:
+        """Replace the reservation by the actual usage; returns the actual cost."""
+        input_tokens = token_counts.get("input_tokens", 0)
+        output_tokens = token_counts.get("output_tokens", 0)
+        cost = estimate_cost(input_tokens, output_tokens, PRICING[reservation.model])
+        with self._lock:
+            self._reserved_cost -= reservation.cost
+            self._reserved_tokens -= reservation.tokens
+            self._spent += cost
+            self._tokens += input_tokens + output_tokens
+            self._requests += 1
+            now = time.monotonic()
+            self._recent.append((now, cost, input_tokens + output_tokens))
+            self._recent = [r for r in self._recent if now - r[0] <= RATE_WINDOW_SECONDS]
+        return cost
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            now = time.monotonic()
+            window = min(now - self._started, RATE_WINDOW_SECONDS) or 1e-9
+            recent = [r for r in self._recent if now - r[0] <= RATE_WINDOW_SECONDS]
+            return {
+                "spent": round(self._spent, 6),
+                "tokens": self._tokens,
+                "in_flight_cost": round(self._reserved_cost, 6),
+                "max_cost": self.max_cost,
+                "max_tokens": self.max_tokens,
+                "requests": self._requests,
+                "downgrades": self._downgrades,
+                "refused": self._refused,
+                "spend_per_minute": round(sum(r[1] for r in recent) / window * 60, 6),
+                "tokens_per_minute": round(sum(r[2] for r in recent) / window * 60),
+            }
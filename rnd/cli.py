@@ -0,0 +1,153 @@
+"""
+Headless runner for the extraction pipeline (no Streamlit in the import path).
+
+Fetches, converts, extracts and saves every URL of a list with the same pipeline
+as the app, printing one progress line per stage, then writes the combined
+listings (JSONL, Parquet, CSV, Excel) and a run_summary.json:
+
+    python rnd/cli.py --urls-file urls.txt --fields name price --model gpt-4o-mini --concurrency 4
+    python rnd/cli.py --urls-file urls.txt --fields name price --model "Llama3.1 8B" --llm-concurrency 8
+
+API keys come from the environment (.env). Exit codes: 0 all URLs succeeded,
+1 some failed, 2 bad arguments, 3 every URL failed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from assets import FETCH_WORKERS, PRICING
+from budget_governor import BudgetGovernor
+from llm_providers import LOCAL_MODELS, get_provider, set_max_in_flight
+from output_sink import OutputSink, export_csv, export_excel
+from pipeline import run_pipeline
+from scraper import generate_unique_folder_name, listings_of
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+
+
+def read_urls(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def run(urls, fields, selected_model, output_folder, concurrency, focus_listings=False, chunked=False,
+        quiet=False, governor=None) -> dict:
+    """Run the pipeline over `urls` and return the run summary (also saved as run_summary.json)."""
+    started = time.perf_counter()
+    log = (lambda message: None) if quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+    totals = {"input_tokens": 0, "output_tokens": 0, "cost": 0.0, "cached": 0, "css_schema": 0}
+    failed = []
+    done = 0
+
+    def show_progress(index, url, stage):
+        if stage in ("fetching", "extracting"):
+            log(f"[{index}/{len(urls)}] {stage} {url}")
+
+    with OutputSink(output_folder, fields) as sink:
+        for item in run_pipeline(
+            urls,
+            fields,
+            selected_model,
+            output_folder,
+            focus_listings=focus_listings,
+            chunked=chunked,
+            fetch_workers=max(concurrency or 0, FETCH_WORKERS),
+            extract_workers=concurrency,
+            on_progress=show_progress,
+            governor=governor,
+        ):
+            done += 1
+            index, url = item["index"], item["url"]
+            if item.get("error"):
+                failed.append({"index": index, "url": url, "error": item["error"]})
+                log(f"[{index}/{len(urls)}] FAILED {url}: {item['error']} ({done}/{len(urls)} done)")
+                continue
+            rows = sink.write(index, url, listings_of(item["formatted_data"]))
+            for key in ("input_tokens", "output_tokens", "cost"):
+                totals[key] += item[key]
+            totals["cached"] += int(item.get("cached", False))
+            totals["css_schema"] += int(item.get("css_schema", False))
+            source = "css schema" if item.get("css_schema") else "cached" if item.get("cached") else f"${item['cost']:.4f}"
+            log(f"[{index}/{len(urls)}] done {url}: {rows} listings, {source} ({done}/{len(urls)} done)")
+            if governor is not None and governor.max_cost:
+                budget = governor.stats()
+                log(f"    spent ${budget['spent']:.4f} of ${budget['max_cost']:.4f} "
+                    f"({budget['spend_per_minute'] * 60:.2f} $/h)")
+
+    summary = {
+        "output_folder": output_folder,
+        "model": selected_model,
+        "urls": len(urls),
+        "succeeded": len(urls) - len(failed),
+        "failed": failed,
+        "listings": sink.rows,
+        "input_tokens": totals["input_tokens"],
+        "output_tokens": totals["output_tokens"],
+        "total_cost": round(totals["cost"], 6),
+        "cached": totals["cached"],
+        "css_schema": totals["css_schema"],
+        "seconds": round(time.perf_counter() - started, 2),
+        "files": {"jsonl": sink.jsonl_path, "parquet": sink.parquet_path},
+        "budget": governor.stats() if governor is not None else None,
+    }
+    if selected_model in LOCAL_MODELS:
+        summary["local_llm"] = get_provider(selected_model).stats()
+    if sink.rows:
+        summary["files"]["csv"] = export_csv(sink.jsonl_path)
+        summary["files"]["xlsx"] = export_excel(sink.jsonl_path)
+    with open(os.path.join(output_folder, "run_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Scrape and extract listings from a list of URLs")
+    parser.add_argument("--urls-file", required=True, help="File with one URL per line ('-' for stdin)")
+    parser.add_argument("--fields", nargs="+", required=True, help="Fields to extract")
+    parser.add_argument("--model", default="gpt-4o-mini", choices=sorted(PRICING))
+    parser.add_argument("--concurrency", type=int, help="Concurrent page extractions (default: LLM_WORKERS, or the local model's request limit)")
+    parser.add_argument("--llm-concurrency", type=int,
+                        help="Requests in flight to the local Llama server; extra requests queue client-side")
+    parser.add_argument("--output", help="Output folder (default: output/<domain>_<timestamp>)")
+    parser.add_argument("--focus-listings", action="store_true")
+    parser.add_argument("--chunked", action="store_true", help="Extract long pages in concurrent chunks")
+    parser.add_argument("--max-cost", type=float, help="Stop extracting once this many dollars would be exceeded")
+    parser.add_argument("--max-tokens", type=int, help="Stop extracting once this many tokens would be exceeded")
+    parser.add_argument("--no-downgrade", action="store_true", help="Never switch to a cheaper model when the budget runs low")
+    parser.add_argument("--quiet", action="store_true", help="Print only the summary")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    urls = [line.strip() for line in sys.stdin if line.strip()] if args.urls_file == "-" else read_urls(args.urls_file)
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return EXIT_USAGE
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.llm_concurrency is not None:
+        if args.model not in LOCAL_MODELS:
+            parser.error(f"--llm-concurrency only applies to {', '.join(LOCAL_MODELS)}")
+        if args.llm_concurrency < 1:
+            parser.error("--llm-concurrency must be at least 1")
+        set_max_in_flight(args.model, args.llm_concurrency)
+    output_folder = args.output or os.path.join("output", generate_unique_folder_name(urls[0]))
+    os.makedirs(output_folder, exist_ok=True)
+
+    governor = BudgetGovernor(args.max_cost, args.max_tokens, downgrade=not args.no_downgrade)
+    summary = run(urls, args.fields, args.model, output_folder, args.concurrency,
+                  focus_listings=args.focus_listings, chunked=args.chunked, quiet=args.quiet, governor=governor)
+    print(json.dumps(summary, indent=2))
+    if not summary["failed"]:
+        return EXIT_OK
+    return EXIT_FAILED if summary["succeeded"] == 0 else EXIT_PARTIAL
+
+
+if __name__ == "__main__":
+    sys.exit(main())
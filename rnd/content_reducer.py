@@ -0,0 +1,211 @@
+"""
+Pre-LLM reduction of page Markdown.
+
+Runs between html_to_markdown and format_data and only removes text that cannot
+contribute listings:
+
+- blocks already seen on another page of the same site (nav menus, cookie
+  banners, newsletter boxes repeated on every page);
+- link farms: long runs of lines that are nothing but links are collapsed into a
+  single line of their link texts (the URLs are what costs the tokens);
+- image-only lines (tracking pixels, logos, linked thumbnails without text);
+- optionally, everything outside the region where the repeated listing-like
+  lines are (focus_listings=True).
+
+A block counts as repeated once it has been seen on another URL of the same
+domain; reducing the same URL again never makes its own blocks "repeated", so
+re-reducing a page is stable. The first page of a site keeps its boilerplate and
+later pages drop it. Use one reducer per run (the pipeline callers do): the state
+is bounded per domain and across domains, and reset() clears it.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from token_budget import count_tokens
+
+REPEATED_BLOCK_MIN_CHARS = 30     # shorter blocks ("Price", "Add to cart") may be listing content
+LINK_FARM_MIN_LINES = 8           # consecutive link-only lines before they count as a link farm
+LINK_ONLY_MAX_EXTRA_CHARS = 3     # non-link characters allowed on a "link-only" line (markers, separators)
+LISTING_MIN_REPEATS = 3           # lines sharing a shape before they count as a listing structure
+LISTING_CONTEXT_LINES = 3         # lines kept before the listing region (section heading, filters)
+MAX_BLOCKS_PER_DOMAIN = 20_000    # remembered block hashes per domain (oldest forgotten first)
+MAX_DOMAINS = 200                 # domains remembered (least recently reduced forgotten first)
+# Part of the extraction cache key: bump after changing what the reducer removes
+REDUCER_VERSION = "1"
+
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINKED_IMAGE = re.compile(r"\[\s*!\[[^\]]*\]\([^)]*\)\s*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_LIST_MARKER = re.compile(r"^\s*(?:[*+-]|\d+\.)\s+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_WORDS = re.compile(r"[^\W\d_]+")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)*")
+_SPACES = re.compile(r"\s+")
+
+
+def _blocks(markdown: str) -> List[str]:
+    return [block for block in re.split(r"\n\s*\n", markdown) if block.strip()]
+
+
+def _block_hash(block: str) -> str:
+    return hashlib.sha1(_SPACES.sub(" ", block).strip().lower().encode("utf-8")).hexdigest()
+
+
+def is_image_only(line: str) -> bool:
+    stripped = _LINKED_IMAGE.sub("", line)
+    stripped = _IMAGE.sub("", stripped)
+    return stripped != line and not _LIST_MARKER.sub("", stripped).strip(" |>")
+
+
+def is_link_only(line: str) -> bool:
+    if not _LINK.search(line):
+        return False
+    rest = _LINK.sub("", _LIST_MARKER.sub("", line))
+    return len(rest.strip(" |·•,-")) <= LINK_ONLY_MAX_EXTRA_CHARS
+
+
+def drop_image_lines(markdown: str) -> Tuple[str, int]:
+    kept, dropped = [], 0
+    for line in markdown.splitlines():
+        if is_image_only(line):
+            dropped += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), dropped
+
+
+def collapse_link_farms(markdown: str, min_lines: int = LINK_FARM_MIN_LINES) -> Tuple[str, int]:
+    """Replace runs of `min_lines`+ link-only lines by one line of their link texts."""
+    lines = markdown.splitlines()
+    out: List[str] = []
+    farms = 0
+    i = 0
+    while i < len(lines):
+        if not is_link_only(lines[i]):
+            out.append(lines[i])
+            i += 1
+            continue
+        run_end = i
+        while run_end < len(lines) and (is_link_only(lines[run_end]) or not lines[run_end].strip()):
+            run_end += 1
+        run = [line for line in lines[i:run_end] if line.strip()]
+        if len(run) >= min_lines:
+            texts = [text.strip() for line in run for text in _LINK.findall(line) if text.strip()]
+            out.append(" | ".join(texts))
+            farms += 1
+        else:
+            out.extend(lines[i:run_end])
+        i = run_end
+    return "\n".join(out), farms
+
+
+def line_shape(line: str) -> str:
+    """Structure of a line with the actual words and numbers abstracted away."""
+    shape = _LINKED_IMAGE.sub("I", line.strip())
+    shape = _IMAGE.sub("I", shape)
+    shape = _LINK.sub("L", shape)
+    shape = _NUMBERS.sub("9", shape)
+    shape = _WORDS.sub("w", shape)
+    return re.sub(r"(w\s*)+", "w", _SPACES.sub("", shape))
+
+
+def focus_on_listings(markdown: str) -> str:
+    """Keep the span of lines sharing the most common listing-like shape, plus a little context."""
+    lines = markdown.splitlines()
+    positions: Dict[str, List[int]] = defaultdict(list)
+    for index, line in enumerate(lines):
+        shape = line_shape(line)
+        # A listing line carries a link, a number or several words; bare "w" lines are prose
+        if shape and shape != "w" and ("L" in shape or "9" in shape or shape.count("w") > 1):
+            positions[shape].append(index)
+    if not positions:
+        return markdown
+    shape, hits = max(positions.items(), key=lambda item: len(item[1]))
+    if len(hits) < LISTING_MIN_REPEATS:
+        return markdown
+    start = max(0, hits[0] - LISTING_CONTEXT_LINES)
+    # Multi-line listings: keep the lines after the last hit up to the next blank line
+    end = hits[-1] + 1
+    while end < len(lines) and lines[end].strip():
+        end += 1
+    return "\n".join(lines[start:end])
+
+
+# Marks a block hash seen on more than one URL
+_SHARED = ""
+
+
+class ContentReducer:
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        # domain -> block hash -> URL it was first seen on (_SHARED once seen on a second URL)
+        self._seen: "OrderedDict[str, OrderedDict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._seen.clear()
+
+    def _domain_blocks(self, domain: str) -> "OrderedDict[str, str]":
+        seen = self._seen.get(domain)
+        if seen is None:
+            seen = self._seen[domain] = OrderedDict()
+            while len(self._seen) > MAX_DOMAINS:
+                self._seen.popitem(last=False)
+        self._seen.move_to_end(domain)
+        return seen
+
+    def _drop_repeated_blocks(self, markdown: str, url: str) -> Tuple[str, int]:
+        domain = urlparse(url).netloc
+        blocks = _blocks(markdown)
+        hashes = [_block_hash(block) if len(block.strip()) >= REPEATED_BLOCK_MIN_CHARS else None for block in blocks]
+        with self._lock:
+            seen = self._domain_blocks(domain)
+            repeated = {h for h in hashes if h and h in seen and seen[h] != url}
+            for h in filter(None, hashes):
+                if h not in seen:
+                    seen[h] = url
+                elif seen[h] != url:
+                    seen[h] = _SHARED
+            while len(seen) > MAX_BLOCKS_PER_DOMAIN:
+                seen.popitem(last=False)
+        kept = [block for block, h in zip(blocks, hashes) if h not in repeated]
+        return "\n\n".join(kept), len(blocks) - len(kept)
+
+    def reduce(self, markdown: str, url: str, focus_listings: bool = False,
+               model: Optional[str] = None) -> Tuple[str, dict]:
+        """Return the reduced Markdown for `url` and what was removed (token counts use `model`)."""
+        model = model or self.model
+        tokens_before = count_tokens(markdown, model)
+        reduced, repeated_blocks = self._drop_repeated_blocks(markdown, url)
+        reduced, image_lines = drop_image_lines(reduced)
+        reduced, link_farms = collapse_link_farms(reduced)
+        if focus_listings:
+            reduced = focus_on_listings(reduced)
+        reduced = _BLANK_LINES.sub("\n\n", reduced).strip() + "\n"
+        tokens_after = count_tokens(reduced, model)
+        return reduced, {
+            "url": url,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "repeated_blocks": repeated_blocks,
+            "image_lines": image_lines,
+            "link_farms": link_farms,
+        }
+
+
+_default_reducer = None
+_default_reducer_lock = threading.Lock()
+
+
+def get_default_reducer() -> ContentReducer:
+    global _default_reducer
+    with _default_reducer_lock:
+        if _default_reducer is None:
+            _default_reducer = ContentReducer()
+        return _default_reducer
@@ -0,0 +1,356 @@
+"""
+CSS extraction schemas learned from LLM output.
+
+After the LLM has extracted a page, the listings are located in the raw HTML:
+every field value is matched against element texts (or href/src attributes for
+URL values), the listing cards are found as the largest ancestors that hold only
+one listing's values, and selectors are derived for the card (baseSelector) and
+for each field relative to it. The schema is validated by re-extracting the page
+and comparing with the LLM listings, and only stored when they agree.
+
+Schemas use crawl4ai's JsonCssExtractionStrategy format (see main.py):
+
+    {"name": ..., "baseSelector": ..., "fields": [{"name", "selector", "type", "attribute"?}]}
+
+and are stored as JSON per domain and URL template (numbers and ids in the path
+replaced, pagination parameters and trailing /page/N segments dropped), so later
+pages of the same template, including the next pages of a listing, are extracted
+without the LLM.
+A stored schema whose output fails the sanity check is dropped and the page goes
+to the LLM again, which learns a new one.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from assets import CSS_SCHEMA_DIR, CSS_SCHEMA_MIN_AGREEMENT, CSS_SCHEMA_MIN_FILL, CSS_SCHEMA_SAMPLES
+from pagination_rules import GENERIC_PAGE_NAMES, PAGE_NAMES
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "head", "title", "meta", "link"}
+URL_ATTRIBUTES = ("href", "src", "data-src")
+MAX_TEXT_LENGTH = 300
+
+_SPACES = re.compile(r"\s+")
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w-]{1,}$")
+_CSS_IDENT = re.compile(r"^-?[A-Za-z_][\w-]*$")
+
+
+def normalize(value) -> str:
+    return _SPACES.sub(" ", str(value)).strip().lower() if value is not None else ""
+
+
+def template_key(url: str) -> str:
+    """
+    Domain plus path shape: segments containing digits become {n}, query values are dropped.
+    Pages of one listing share the key: pagination parameters (page, p, offset, start, ...)
+    and a trailing /page/N are left out.
+    """
+    parsed = urlparse(url)
+    segments = [s for s in parsed.path.split("/") if s]
+    if len(segments) >= 2 and segments[-1].isdigit() and segments[-2].lower() in PAGE_NAMES:
+        segments = segments[:-2]
+    segments = ["{n}" if _ID_SEGMENT.match(s) else s for s in segments]
+    query = sorted({name for name in (part.split("=", 1)[0] for part in parsed.query.split("&") if part)
+                    if name.lower() not in PAGE_NAMES | GENERIC_PAGE_NAMES})
+    return parsed.netloc + "/" + "/".join(segments) + ("?" + "&".join(query) if query else "")
+
+
+def _text(el) -> str:
+    return normalize(el.get_text(" "))
+
+
+def _attribute_value(el, attribute: str, base_url: Optional[str]) -> str:
+    value = el.get(attribute)
+    if not value:
+        return ""
+    return normalize(urljoin(base_url, value) if base_url else value)
+
+
+def _field_value(el, field: dict, base_url: Optional[str]):
+    if field["type"] == "exists":
+        return el is not None
+    if el is None:
+        return None
+    if field["type"] == "attribute":
+        value = el.get(field["attribute"])
+        return urljoin(base_url, value) if value and base_url else value
+    return _SPACES.sub(" ", el.get_text(" ")).strip()
+
+
+def apply_schema(schema: dict, html: str, base_url: Optional[str] = None) -> List[dict]:
+    """Listings extracted with a crawl4ai-style schema (text, attribute and exists fields)."""
+    soup = BeautifulSoup(html, "lxml")
+    listings = []
+    for base in soup.select(schema["baseSelector"]):
+        item = {}
+        for field in schema["fields"]:
+            value = _field_value(base.select_one(field["selector"]), field, base_url)
+            if field["type"] != "exists" and value is None:
+                value = field.get("default")
+            item[field["name"]] = value
+        listings.append(item)
+    return listings
+
+
+def _simple_selector(el, classes: Optional[List[str]] = None) -> str:
+    classes = classes if classes is not None else el.get("class", [])
+    return el.name + "".join(f".{c}" for c in classes if _CSS_IDENT.match(c))
+
+
+def _common_classes(elements) -> List[str]:
+    common = set(elements[0].get("class", []))
+    for el in elements[1:]:
+        common &= set(el.get("class", []))
+    return [c for c in elements[0].get("class", []) if c in common]
+
+
+def _matches(value: str, expected: str) -> bool:
+    return bool(value) and bool(expected) and (value == expected or expected in value or value in expected)
+
+
+def agreement(extracted: List[dict], listings: List[dict], fields: List[str]) -> float:
+    """Share of non-empty LLM field values reproduced by the row at the same position."""
+    checked = agreed = 0
+    for row, listing in zip(extracted, listings):
+        for field in fields:
+            expected = normalize(listing.get(field))
+            if expected:
+                checked += 1
+                agreed += _matches(normalize(row.get(field)), expected)
+    if not checked:
+        return 0.0
+    # Missing or surplus rows count against the schema as well
+    return agreed / checked * min(len(extracted), len(listings)) / max(len(extracted), len(listings))
+
+
+class _Index:
+    """Elements by normalized text and by (resolved) URL attribute value."""
+
+    def __init__(self, soup, base_url: Optional[str]):
+        self.by_text = defaultdict(list)
+        self.by_url = defaultdict(list)
+        for el in soup.find_all(True):
+            if el.name in SKIP_TAGS:
+                continue
+            text = _text(el)
+            if 0 < len(text) <= MAX_TEXT_LENGTH:
+                self.by_text[text].append(el)
+            for attribute in URL_ATTRIBUTES:
+                value = _attribute_value(el, attribute, base_url)
+                if value:
+                    self.by_url[value].append((el, attribute))
+
+    def find(self, value) -> List[Tuple[object, Optional[str]]]:
+        """(element, attribute or None for text) candidates, innermost first."""
+        value = normalize(value)
+        if not value:
+            return []
+        if value in self.by_url:
+            return self.by_url[value]
+        candidates = self.by_text.get(value, [])
+        # <a><span>Title</span></a>: keep the innermost element carrying the text
+        inner = [el for el in candidates if not any(c is not el and _contains(el, c) for c in candidates)]
+        return [(el, None) for el in inner]
+
+
+def _contains(ancestor, el) -> bool:
+    # Identity, not ==: bs4 compares tags by markup, and listing cards often look alike
+    return el is ancestor or any(parent is ancestor for parent in el.parents)
+
+
+def _common_ancestor(elements):
+    for candidate in [elements[0], *elements[0].parents]:
+        if all(_contains(candidate, other) for other in elements[1:]):
+            return candidate
+    return None
+
+
+def _card_roots(index: _Index, listings: List[dict], fields: List[str]) -> List[Tuple[int, object]]:
+    """(listing position, card element) for listings whose values pin down a unique card."""
+    anchors = {}
+    for position, listing in enumerate(listings):
+        unique = [found[0][0] for field in fields if len(found := index.find(listing.get(field))) == 1]
+        if unique:
+            anchors[position] = unique
+    others = {position: [el for p, els in anchors.items() if p != position for el in els] for position in anchors}
+
+    roots = []
+    for position, elements in anchors.items():
+        root = _common_ancestor(elements)
+        if root is None:
+            continue
+        # Grow to the largest ancestor that holds no other listing's values: the listing card
+        while root.parent is not None and root.parent.name not in ("body", "html", "[document]") and not any(
+            _contains(root.parent, el) for el in others[position]
+        ):
+            root = root.parent
+        roots.append((position, root))
+    return roots
+
+
+def _base_selector(soup, roots) -> Optional[str]:
+    tag = Counter(root.name for _, root in roots).most_common(1)[0][0]
+    elements = [root for _, root in roots if root.name == tag]
+    candidates = [_simple_selector(elements[0], _common_classes(elements))]
+    parents = [el.parent for el in elements if el.parent is not None]
+    if parents and all(p.name == parents[0].name for p in parents):
+        candidates.append(_simple_selector(parents[0], _common_classes(parents)) + " > " + candidates[0])
+    for selector in candidates:
+        selected = soup.select(selector)
+        if all(any(el is s for s in selected) for el in elements):
+            return selector
+    return None
+
+
+def _relative_paths(root, el) -> List[str]:
+    """Selector candidates for `el` inside `root`, most general first."""
+    chain = [el] + [p for p in el.parents if p is not root and _contains(root, p)]
+    chain.reverse()
+    return [
+        _simple_selector(el),
+        el.name,
+        " > ".join(_simple_selector(node) for node in chain),
+        " > ".join(node.name for node in chain),
+    ]
+
+
+def induce_schema(html: str, listings: List[dict], fields: List[str], base_url: Optional[str] = None,
+                  name: str = "listings", samples: int = CSS_SCHEMA_SAMPLES) -> Optional[dict]:
+    """Schema whose selectors reproduce the LLM listings on this page, or None."""
+    if len(listings) < 2:
+        return None
+    soup = BeautifulSoup(html, "lxml")
+    index = _Index(soup, base_url)
+    roots = _card_roots(index, listings, fields)
+    if len(roots) < 2:
+        return None
+    base_selector = _base_selector(soup, roots)
+    if base_selector is None:
+        return None
+    roots = roots[:samples]
+
+    schema_fields = []
+    for field in fields:
+        observed = []  # (root, expected value, element, attribute)
+        for position, root in roots:
+            value = listings[position].get(field)
+            for el, attribute in index.find(value):
+                if _contains(root, el):
+                    observed.append((root, normalize(value), el, attribute))
+                    break
+        if not observed:
+            if any(normalize(listing.get(field)) for listing in listings):
+                return None  # a value the page does not show as-is (the LLM rephrased or inferred it)
+            continue
+        root, _, el, attribute = observed[0]
+        spec = {"name": field, "selector": None, "type": "attribute" if attribute else "text"}
+        if attribute:
+            spec["attribute"] = attribute
+        for selector in _relative_paths(root, el):
+            spec["selector"] = selector
+            hits = sum(
+                _matches(normalize(_field_value(r.select_one(selector), spec, base_url)), expected)
+                for r, expected, _, _ in observed
+            )
+            if hits == len(observed):
+                break
+        else:
+            return None
+        schema_fields.append(spec)
+
+    return {"name": name, "baseSelector": base_selector, "fields": schema_fields}
+
+
+def sane(extracted: List[dict], fields: List[str], min_fill: float = CSS_SCHEMA_MIN_FILL) -> bool:
+    """A stored schema's output is trusted when it found rows and filled most of their fields."""
+    if not extracted:
+        return False
+    filled = sum(bool(normalize(row.get(field))) for row in extracted for field in fields)
+    return filled / (len(extracted) * len(fields)) >= min_fill
+
+
+class SchemaStore:
+    """Validated schemas as JSON files: <dir>/<domain>/<hash of template and fields>.json."""
+
+    def __init__(self, directory: str = CSS_SCHEMA_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, url: str, fields: List[str]) -> str:
+        key = template_key(url) + "\x1f" + json.dumps(sorted(fields))
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, urlparse(url).netloc.replace(":", "_"), f"{digest}.json")
+
+    def get(self, url: str, fields: List[str]) -> Optional[dict]:
+        path = self._path(url, fields)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, url: str, fields: List[str], schema: dict, score: float) -> None:
+        path = self._path(url, fields)
+        record = {
+            "template": template_key(url),
+            "fields": fields,
+            "learned_from": url,
+            "agreement": round(score, 3),
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "schema": schema,
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(record, f, indent=4, ensure_ascii=False)
+
+    def drop(self, url: str, fields: List[str]) -> None:
+        with self._lock:
+            try:
+                os.remove(self._path(url, fields))
+            except FileNotFoundError:
+                pass
+
+    def extract(self, url: str, fields: List[str], html: str) -> Optional[List[dict]]:
+        """Listings from the stored schema of this URL's template, or None (no schema, or it failed)."""
+        record = self.get(url, fields)
+        if record is None:
+            return None
+        extracted = apply_schema(record["schema"], html, base_url=url)
+        if sane(extracted, fields):
+            return extracted
+        print(f"CSS schema for {record['template']} no longer fits {url}; falling back to the LLM")
+        self.drop(url, fields)
+        return None
+
+    def learn(self, url: str, fields: List[str], html: str, listings: List[dict],
+              min_agreement: float = CSS_SCHEMA_MIN_AGREEMENT) -> Optional[dict]:
+        """Induce a schema from LLM listings and store it if re-extraction agrees with them."""
+        schema = induce_schema(html, listings, fields, base_url=url, name=template_key(url))
+        if schema is None:
+            return None
+        score = agreement(apply_schema(schema, html, base_url=url), listings, fields)
+        if score < min_agreement:
+            return None
+        self.put(url, fields, schema, score)
+        print(f"Learned CSS schema for {template_key(url)} (agreement {score:.0%})")
+        return schema
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_schema_store() -> SchemaStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SchemaStore()
+        return _default_store
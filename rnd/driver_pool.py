@@ -0,0 +1,157 @@
+"""
+Reusable pool of Selenium Chrome drivers.
+
+The chromedriver binary is resolved once per process, browsers are reused across
+URLs (cookies and storage are reset between uses) and recycled after
+DRIVER_MAX_USES pages or when a WebDriverException shows the browser crashed.
+"""
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+from assets import HEADLESS_OPTIONS, HEADLESS_OPTIONS_DOCKER, DRIVER_POOL_SIZE, DRIVER_MAX_USES
+
+
+def is_running_in_docker():
+    """
+    Detect if the app is running inside a Docker container.
+    This checks if the '/proc/1/cgroup' file contains 'docker'.
+    """
+    try:
+        with open("/proc/1/cgroup", "rt") as file:
+            return "docker" in file.read()
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=1)
+def chromedriver_path() -> str:
+    """Resolve (and download if needed) the chromedriver binary once per process."""
+    return ChromeDriverManager().install()
+
+
+def create_driver() -> webdriver.Chrome:
+    options = Options()
+    # Apply headless options based on whether the code is running in Docker
+    for option in HEADLESS_OPTIONS_DOCKER if is_running_in_docker() else HEADLESS_OPTIONS:
+        options.add_argument(option)
+    return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+
+
+def reset_driver(driver: webdriver.Chrome) -> None:
+    """Clear cookies, storage and the current page so the next URL starts clean."""
+    try:
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    except WebDriverException:
+        pass  # about:blank and some origins do not expose storage
+    try:
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    except WebDriverException:
+        driver.delete_all_cookies()
+    driver.get("about:blank")
+
+
+class DriverPool:
+    def __init__(self, size: int = DRIVER_POOL_SIZE, max_uses: int = DRIVER_MAX_USES, factory=create_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "crashed": 0}
+
+    def _checkout(self) -> webdriver.Chrome:
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                driver.current_url  # cheap liveness check
+                with self._lock:
+                    self.stats["reused"] += 1
+                return driver
+            except WebDriverException:
+                self._discard(driver, "crashed")
+        driver = self.factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+            self.stats["created"] += 1
+        return driver
+
+    def _discard(self, driver: webdriver.Chrome, reason: str) -> None:
+        with self._lock:
+            self._uses.pop(id(driver), None)
+            self.stats[reason] += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _release(self, driver: webdriver.Chrome, broken: bool) -> None:
+        with self._lock:
+            self._uses[id(driver)] = uses = self._uses.get(id(driver), 0) + 1
+        if broken:
+            self._discard(driver, "crashed")
+            return
+        if uses >= self.max_uses:
+            self._discard(driver, "recycled")
+            return
+        try:
+            reset_driver(driver)
+        except WebDriverException:
+            self._discard(driver, "crashed")
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self):
+        """`with pool.driver() as driver:` borrows a browser, blocking while all are busy."""
+        self._slots.acquire()
+        driver = None
+        broken = False
+        try:
+            driver = self._checkout()
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            if driver is not None:
+                self._release(driver, broken)
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> DriverPool:
+    """Process-wide pool shared by the Streamlit app and batch runners."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DriverPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
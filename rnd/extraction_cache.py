@@ -0,0 +1,242 @@
+"""
+Persistent cache of LLM extraction results (SQLite).
+
+Entries are keyed by (normalized page Markdown hash, sorted field list, model,
+prompt version, extraction variant), so re-running the scraper on unchanged pages
+with the same fields does not call, or pay for, the LLM again. The Markdown is the
+page as converted, before content reduction (whose output depends on the other
+pages reduced in the run); the variant covers what shapes the request instead:
+the system prompt actually sent (the Llama path builds its own from the fields),
+chunked extraction, focus_listings and the reducer version. Whitespace-only
+differences in the Markdown map to the same entry; any change to the extraction
+prompts changes the prompt version and misses. Hits are also counted in the
+Prometheus counter scraper_cache_hits_total{cache="extraction"} when prometheus_client
+is installed.
+
+Inspect and evict from the command line:
+
+    python rnd/extraction_cache.py stats
+    python rnd/extraction_cache.py list --limit 20
+    python rnd/extraction_cache.py evict --older-than-days 7 --max-size-mb 200
+    python rnd/extraction_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from assets import EXTRACTION_CACHE_PATH, EXTRACTION_PROMPT_VERSION, SYSTEM_MESSAGE, USER_MESSAGE
+from content_reducer import REDUCER_VERSION
+from llm_json import parse_llm_json
+
+try:
+    from prometheus_client import Counter
+
+    CACHE_HITS = Counter("scraper_cache_hits_total", "Scraper cache hits", ["cache"])
+except ImportError:  # prometheus_client is optional
+    CACHE_HITS = None
+
+_SPACES = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    model TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    result TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def prompt_version() -> str:
+    """Manual version plus a hash of the prompts, so prompt edits invalidate old entries."""
+    digest = hashlib.sha256((SYSTEM_MESSAGE + USER_MESSAGE).encode("utf-8")).hexdigest()[:12]
+    return f"{EXTRACTION_PROMPT_VERSION}-{digest}"
+
+
+def extraction_variant(system_message: str = SYSTEM_MESSAGE, chunked: bool = False,
+                       focus_listings: bool = False) -> str:
+    """The request settings besides page, fields and model that change an extraction's result."""
+    return json.dumps({
+        "system": hashlib.sha256(system_message.encode("utf-8")).hexdigest()[:12],
+        "chunked": bool(chunked),
+        "focus_listings": bool(focus_listings),
+        "reducer": REDUCER_VERSION,
+    }, sort_keys=True)
+
+
+def cache_key(markdown: str, fields: List[str], model: str, variant: Optional[str] = None) -> str:
+    markdown_hash = hashlib.sha256(_SPACES.sub(" ", markdown).strip().encode("utf-8")).hexdigest()
+    parts = [markdown_hash, json.dumps(sorted(fields)), model, prompt_version(), variant or extraction_variant()]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _as_json(formatted_data) -> str:
+    if isinstance(formatted_data, str):
+        formatted_data = parse_llm_json(formatted_data)
+    if hasattr(formatted_data, "dict"):
+        formatted_data = formatted_data.dict()
+    return json.dumps(formatted_data, ensure_ascii=False)
+
+
+class ExtractionCache:
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: safe from pipeline worker threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, markdown: str, fields: List[str], model: str,
+            variant: Optional[str] = None) -> Optional[Tuple[dict, Dict[str, int]]]:
+        """Cached (formatted_data, original token_counts), or None."""
+        key = cache_key(markdown, fields, model, variant)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT result, input_tokens, output_tokens FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE extractions SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        if CACHE_HITS is not None:
+            CACHE_HITS.labels("extraction").inc()
+        result, input_tokens, output_tokens = row
+        return json.loads(result), {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+    def put(self, markdown: str, fields: List[str], model: str, formatted_data, token_counts: Dict[str, int],
+            url: Optional[str] = None, variant: Optional[str] = None) -> None:
+        result = _as_json(formatted_data)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions "
+                "(key, url, model, fields, result, input_tokens, output_tokens, size_bytes, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key(markdown, fields, model, variant), url, model, json.dumps(sorted(fields)), result,
+                    token_counts.get("input_tokens", 0), token_counts.get("output_tokens", 0),
+                    len(result.encode("utf-8")), now, now,
+                ),
+            )
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            count, size, hits, oldest, newest = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(hits), 0), MIN(created_at), MAX(created_at) "
+                "FROM extractions"
+            ).fetchone()
+            models = dict(conn.execute("SELECT model, COUNT(*) FROM extractions GROUP BY model").fetchall())
+        return {
+            "path": self.path,
+            "entries": count,
+            "size_mb": round(size / 1_000_000, 3),
+            "hits": hits,
+            "oldest": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(oldest)) if oldest else None,
+            "newest": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(newest)) if newest else None,
+            "models": models,
+        }
+
+    def entries(self, limit: int = 20) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, url, model, fields, size_bytes, hits, created_at, last_used_at FROM extractions "
+                "ORDER BY last_used_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {
+                "key": key[:16], "url": url, "model": model, "fields": json.loads(fields), "size_bytes": size,
+                "hits": hits,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)),
+                "last_used_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(used)),
+            }
+            for key, url, model, fields, size, hits, created, used in rows
+        ]
+
+    def evict(self, older_than_days: Optional[float] = None, max_size_mb: Optional[float] = None) -> int:
+        """Drop entries unused for `older_than_days`, then least recently used ones until under `max_size_mb`."""
+        removed = 0
+        with self._lock, self._connect() as conn:
+            if older_than_days is not None:
+                cutoff = time.time() - older_than_days * 86400
+                removed += conn.execute("DELETE FROM extractions WHERE last_used_at < ?", (cutoff,)).rowcount
+            if max_size_mb is not None:
+                budget = max_size_mb * 1_000_000
+                total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extractions").fetchone()[0]
+                for key, size in conn.execute(
+                    "SELECT key, size_bytes FROM extractions ORDER BY last_used_at ASC"
+                ).fetchall():
+                    if total <= budget:
+                        break
+                    conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+        if removed:
+            with self._connect() as conn:
+                conn.execute("VACUUM")
+        return removed
+
+    def clear(self) -> int:
+        with self._lock, self._connect() as conn:
+            removed = conn.execute("DELETE FROM extractions").rowcount
+        with self._connect() as conn:
+            conn.execute("VACUUM")
+        return removed
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ExtractionCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache()
+        return _default_cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect and evict the extraction result cache")
+    parser.add_argument("--path", default=EXTRACTION_CACHE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Entry count, size and hits")
+    list_parser = commands.add_parser("list", help="Most recently used entries")
+    list_parser.add_argument("--limit", type=int, default=20)
+    evict_parser = commands.add_parser("evict", help="Remove old entries and/or shrink the cache")
+    evict_parser.add_argument("--older-than-days", type=float)
+    evict_parser.add_argument("--max-size-mb", type=float)
+    commands.add_parser("clear", help="Remove every entry")
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "list":
+        print(json.dumps(cache.entries(args.limit), indent=2, ensure_ascii=False))
+    elif args.command == "evict":
+        if args.older_than_days is None and args.max_size_mb is None:
+            parser.error("evict needs --older-than-days and/or --max-size-mb")
+        print(f"Evicted {cache.evict(args.older_than_days, args.max_size_mb)} entries")
+    else:
+        print(f"Removed {cache.clear()} entries")
+
+
+if __name__ == "__main__":
+    main()
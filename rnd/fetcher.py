@@ -0,0 +1,161 @@
+"""
+Tiered page fetcher: plain HTTP first, headless Chrome only when needed.
+
+A pooled async HTTP client (httpx) fetches the page; `needs_browser` decides from
+text density, empty SPA roots and <noscript> JavaScript warnings whether the
+response is already complete. Pages that fail the check are re-fetched through
+the Selenium driver pool, and the decision is remembered per domain so later
+pages of a JavaScript-rendered site go straight to the browser.
+
+The client lives on a private event loop thread, so synchronous callers such as
+the thread-pool pipeline can share it through `fetch()`.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from assets import (
+    USER_AGENTS,
+    HTTP_FETCH_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MIN_TEXT_CHARS,
+    HTTP_MIN_TEXT_DENSITY,
+)
+from scraper import fetch_html_selenium
+
+_SCRIPT_STYLE = re.compile(r"<(script|style|template)\b[^>]*>.*?</\1\s*>", re.I | re.S)
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_EMPTY_SPA_ROOT = re.compile(
+    r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt|svelte)[\"'][^>]*>\s*</div>", re.I
+)
+_NOSCRIPT_JS = re.compile(r"<noscript\b[^>]*>(?:(?!</noscript>).)*javascript", re.I | re.S)
+
+
+def visible_text_length(html: str) -> int:
+    text = _TAG.sub(" ", _SCRIPT_STYLE.sub(" ", html))
+    return len(_SPACE.sub(" ", text).strip())
+
+
+def needs_browser(html: str) -> Optional[str]:
+    """Return why `html` looks incomplete without JavaScript, or None if it can be used as-is."""
+    if not html:
+        return "empty"
+    text_chars = visible_text_length(html)
+    if _EMPTY_SPA_ROOT.search(html) and text_chars < HTTP_MIN_TEXT_CHARS * 4:
+        return "empty_spa_root"
+    if text_chars < HTTP_MIN_TEXT_CHARS:
+        return "low_text"
+    if _NOSCRIPT_JS.search(html) and text_chars < HTTP_MIN_TEXT_CHARS * 4:
+        return "noscript"
+    if text_chars / len(html) < HTTP_MIN_TEXT_DENSITY:
+        return "low_density"
+    return None
+
+
+class TieredFetcher:
+    def __init__(self, timeout: float = HTTP_FETCH_TIMEOUT, max_connections: int = HTTP_MAX_CONNECTIONS):
+        self.domain_tier: Dict[str, str] = {}
+        self.stats = {
+            "http": 0,
+            "browser": 0,
+            "escalated": 0,
+            "http_seconds": 0.0,
+            "browser_seconds": 0.0,
+            "escalation_reasons": {},
+        }
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-fetcher", daemon=True)
+        self._thread.start()
+        self._client = asyncio.run_coroutine_threadsafe(
+            self._make_client(timeout, max_connections), self._loop
+        ).result()
+
+    async def _make_client(self, timeout: float, max_connections: int) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"User-Agent": random.choice(USER_AGENTS), "Accept": "text/html,application/xhtml+xml"},
+        )
+
+    def _record(self, tier: str, seconds: float, reason: Optional[str] = None) -> None:
+        with self._lock:
+            self.stats[tier] += 1
+            self.stats[f"{tier}_seconds"] += seconds
+            if reason:
+                self.stats["escalated"] += 1
+                reasons = self.stats["escalation_reasons"]
+                reasons[reason] = reasons.get(reason, 0) + 1
+
+    async def _fetch_http(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            response = await self._client.get(url)
+        except httpx.HTTPError as e:
+            return None, f"http_error:{type(e).__name__}"
+        if response.status_code >= 400:
+            return None, f"http_{response.status_code}"
+        if "html" not in response.headers.get("content-type", "html"):
+            return None, "not_html"
+        html = response.text
+        return html, needs_browser(html)
+
+    async def afetch(self, url: str, stats: Optional[dict] = None) -> str:
+        domain = urlparse(url).netloc
+        reason = None
+        if self.domain_tier.get(domain) != "browser":
+            started = time.perf_counter()
+            html, reason = await self._fetch_http(url)
+            if reason is None:
+                elapsed = time.perf_counter() - started
+                self.domain_tier[domain] = "http"
+                self._record("http", elapsed)
+                if stats is not None:
+                    stats.update(tier="http", load_seconds=round(elapsed, 3))
+                return html
+            if reason not in ("http_404", "http_410"):
+                # Missing pages say nothing about how the rest of the site renders
+                self.domain_tier[domain] = "browser"
+
+        load_stats = {}
+        started = time.perf_counter()
+        html = await asyncio.to_thread(fetch_html_selenium, url, False, None, load_stats)
+        self._record("browser", time.perf_counter() - started, reason)
+        if stats is not None:
+            stats.update(load_stats, tier="browser", escalation=reason)
+        return html
+
+    def fetch(self, url: str, stats: Optional[dict] = None) -> str:
+        """Blocking wrapper for thread-pool callers."""
+        return asyncio.run_coroutine_threadsafe(self.afetch(url, stats), self._loop).result()
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self.stats.items()}
+        for tier in ("http", "browser"):
+            summary[f"{tier}_avg_seconds"] = round(summary[f"{tier}_seconds"] / summary[tier], 3) if summary[tier] else 0.0
+        summary["domains"] = dict(self.domain_tier)
+        return summary
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def get_default_fetcher() -> TieredFetcher:
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = TieredFetcher()
+        return _default_fetcher
@@ -0,0 +1,227 @@
+"""
+Tolerant parsing of LLM JSON output, done once per response by the providers.
+
+parse_llm_json takes the raw response text and returns the parsed JSON. It
+strips code fences and any prose around the JSON (including bracketed prose
+such as "[2] results"), drops trailing commas, and
+repairs output that was cut off (e.g. by the output token limit) back to its last
+complete array element, so a truncated listings array still yields the listings
+before the cut. validate then coerces the parsed JSON into the response model:
+scalars become strings for `str` fields, missing fields are left empty and list
+items that still do not validate are dropped instead of failing the whole page.
+
+orjson is used when installed, json otherwise.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+
+try:
+    import orjson
+except ImportError:  # fast parsing is optional
+    orjson = None
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.S)
+# A cut-off response is repaired at one of its last commas / openings; older cut points are not tried
+MAX_REPAIR_ATTEMPTS = 64
+# Brackets in prose before the JSON are skipped; candidate starts past this many are not tried
+MAX_START_CANDIDATES = 32
+
+
+class LLMOutputError(ValueError):
+    """Unusable model output; `token_counts` is the billed usage of the response when a provider knows it."""
+
+    def __init__(self, message: str, token_counts: Optional[Dict[str, int]] = None):
+        super().__init__(message)
+        self.token_counts = token_counts
+
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _scan(text: str, start: int) -> Tuple[str, bool, int, List[Tuple[int, Tuple[str, ...]]]]:
+    """
+    Copy the JSON value starting at `start`, dropping trailing commas and stopping at its end.
+    Returns (copied text, complete, end position in `text`, cut points (length of copy, open closers)).
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escaped = False
+    for position, ch in enumerate(text[start:], start):
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append((len(out), tuple(stack)))
+            continue
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if not stack or stack[-1] != ch:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), True, position + 1, cuts
+            continue
+        elif ch == ",":
+            cuts.append((len(out), tuple(stack)))
+        out.append(ch)
+    return "".join(out), False, len(text), cuts
+
+
+def _repair(copied: str, cuts: List[Tuple[int, Tuple[str, ...]]]) -> Optional[Any]:
+    """Close a cut-off value at its last cut point that parses, preferring array-element boundaries."""
+    candidates = list(reversed(cuts))[:MAX_REPAIR_ATTEMPTS]
+    # Cutting between array elements (or top-level keys) keeps whole listings; other cuts keep partial objects
+    candidates.sort(key=lambda cut: not (cut[1][-1] == "]" or len(cut[1]) == 1))
+    for position, closers in candidates:
+        head = copied[:position].rstrip()
+        if head.endswith(","):
+            head = head[:-1]
+        try:
+            return loads(head + "".join(reversed(closers)))
+        except ValueError:
+            continue
+    return None
+
+
+def _expected_shape(value, response_model: Optional[Type[BaseModel]]) -> bool:
+    """Whether `value` looks like the response: an object with a model field, or a bare array of objects."""
+    fields = set(response_model.model_fields) if response_model is not None else set()
+    if isinstance(value, dict):
+        return not fields or bool(fields & value.keys())
+    if isinstance(value, list):
+        return len(fields) <= 1 and all(isinstance(item, (dict, list)) for item in value)
+    return False
+
+
+def parse_llm_json(text, response_model: Optional[Type[BaseModel]] = None) -> Any:
+    """
+    Parse the JSON in an LLM response; raises LLMOutputError when nothing can be recovered.
+
+    Every `{` / `[` is a candidate start, tried in order: the first value there that has
+    the expected shape (see _expected_shape) wins, so bracketed prose before the JSON
+    ("Here are [2] results: {...}") is skipped. When no candidate has it, the first value
+    that parsed is returned.
+    """
+    if not isinstance(text, (str, bytes)):
+        return text
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="replace")
+    text = text.strip().lstrip("﻿")
+    try:
+        return loads(text)
+    except ValueError:
+        pass
+
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    fallback = None
+    start, tried = _next_start(text, 0), 0
+    while start >= 0 and tried < MAX_START_CANDIDATES:
+        tried += 1
+        copied, complete, end, cuts = _scan(text, start)
+        value = None
+        if complete:
+            try:
+                value = loads(copied)
+            except ValueError:
+                pass
+        if value is None:
+            value = _repair(copied, cuts)
+            if value is not None:
+                logging.info(f"Repaired malformed model output ({len(text)} chars)")
+        if value is not None:
+            if _expected_shape(value, response_model):
+                return value
+            if fallback is None:
+                fallback = value
+        # A value that parsed is skipped as a whole; after a failed start the next bracket may begin the JSON
+        start = _next_start(text, end if complete and value is not None else start + 1)
+    if fallback is not None:
+        return fallback
+    if tried == 0:
+        raise LLMOutputError(f"No JSON found in model output: {text[:200]!r}")
+    raise LLMOutputError(f"Unrecoverable JSON in model output: {text[:200]!r}")
+
+
+def _next_start(text: str, position: int) -> int:
+    starts = [i for i in (text.find("{", position), text.find("[", position)) if i >= 0]
+    return min(starts) if starts else -1
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value):
+        return ", ".join(_text(v) for v in value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _item_model(annotation) -> Optional[Type]:
+    if get_origin(annotation) is not list or not get_args(annotation):
+        return None
+    return get_args(annotation)[0]
+
+
+def _coerced(model: Type[BaseModel], data: dict) -> dict:
+    values = {}
+    for name, field in model.model_fields.items():
+        value = data.get(name)
+        item_type = _item_model(field.annotation)
+        if field.annotation is str:
+            value = _text(value)
+        elif isinstance(item_type, type) and issubclass(item_type, BaseModel):
+            value = [item for item in (_lenient(item_type, v) for v in (value or [])) if item is not None]
+        elif item_type is str:
+            value = [_text(v) for v in (value if isinstance(value, list) else [value]) if v is not None]
+        values[name] = value
+    return values
+
+
+def _lenient(model: Type[BaseModel], data) -> Optional[BaseModel]:
+    if not isinstance(data, dict):
+        return None
+    try:
+        return model.model_validate(_coerced(model, data))
+    except ValidationError:
+        return None
+
+
+def validate(data, response_model: Optional[Type[BaseModel]]):
+    """
+    `data` as a `response_model` instance: strict validation first, then with coercion
+    (invalid list items dropped). Returns `data` unchanged when it cannot be made to fit.
+    """
+    if response_model is None:
+        return data
+    try:
+        return response_model.model_validate(data)
+    except ValidationError:
+        pass
+    if isinstance(data, list) and len(response_model.model_fields) == 1:
+        data = {next(iter(response_model.model_fields)): data}  # bare array instead of {"listings": [...]}
+    return _lenient(response_model, data) or data
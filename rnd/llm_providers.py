@@ -0,0 +1,520 @@
+"""
+LLM provider layer for extraction and pagination detection.
+
+One provider per model family, each holding long-lived clients so concurrent
+extractions share connection pools instead of reconnecting on every call:
+
+- OpenAIProvider: structured outputs via `beta.chat.completions.parse`;
+- GeminiProvider: JSON mode with a response schema (google.generativeai);
+- OpenAICompatibleProvider: plain chat completions against LM Studio / Groq style
+  servers, with the JSON schema spelled out in the system message by the caller.
+  For the local server, at most `max_in_flight` requests are sent at once (its
+  parallel slots); callers beyond that wait in a client-side queue.
+
+All providers return an LLMResult whose token counts come from the API's usage
+report (falling back to token_budget.count_tokens when a server omits it), so
+format_data and detect_pagination_elements account tokens the same way. Response
+text is parsed once, tolerantly (llm_json), and validated into the response model,
+so callers get typed objects; truncated structured outputs are repaired, not dropped.
+A response that was billed but cannot be used raises LLMOutputError carrying its
+token counts, so budgets still account for it.
+
+`complete` is thread-safe; `acomplete` is the async variant. Async clients are
+bound to the event loop that first uses them, so keep async callers on one
+long-lived loop to benefit from the pool.
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from openai import AsyncOpenAI, LengthFinishReasonError, OpenAI
+import google.generativeai as genai
+from pydantic import BaseModel
+
+from api_management import get_api_key
+from assets import GROQ_BASE_URL, GROQ_LLAMA_MODEL_FULLNAME, LLAMA_MODEL_FULLNAME, LOCAL_LLM_BASE_URL, LOCAL_LLM_CONCURRENCY
+from llm_json import LLMOutputError, parse_llm_json, validate
+from token_budget import count_tokens
+
+OPENAI_MODELS = ["gpt-4o-mini", "gpt-4o-2024-08-06"]
+LOCAL_MODELS = ["Llama3.1 8B"]
+
+
+@dataclass
+class LLMResult:
+    data: Any                 # validated response_model instance, or the raw parsed JSON if validation failed
+    text: str                 # raw response text
+    input_tokens: int
+    output_tokens: int
+
+    @property
+    def token_counts(self) -> Dict[str, int]:
+        return {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+
+def _validated(text: str, response_model: Optional[Type[BaseModel]]):
+    return validate(parse_llm_json(text, response_model), response_model)
+
+
+class LLMProvider(ABC):
+    # True when the provider cannot enforce a response schema and the caller should describe it in the prompt
+    schema_in_prompt = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def _result(self, parse: Callable[[], Any], text: str, prompt: str,
+                input_tokens: Optional[int], output_tokens: Optional[int]) -> LLMResult:
+        """LLMResult of a billed response; when `parse` fails, its LLMOutputError carries the usage."""
+        input_tokens = input_tokens if input_tokens is not None else count_tokens(prompt, self.model)
+        output_tokens = output_tokens if output_tokens is not None else count_tokens(text, self.model)
+        try:
+            data = parse()
+        except LLMOutputError as e:
+            e.token_counts = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+            raise
+        return LLMResult(data=data, text=text, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    @abstractmethod
+    def complete(self, system: str, user: str, response_model: Optional[Type[BaseModel]] = None) -> LLMResult:
+        ...
+
+    @abstractmethod
+    async def acomplete(self, system: str, user: str, response_model: Optional[Type[BaseModel]] = None) -> LLMResult:
+        ...
+
+
+class _OpenAIClients:
+    """Shared sync client plus one async client per event loop."""
+
+    def __init__(self, **client_kwargs):
+        self.client_kwargs = client_kwargs
+        self.sync = OpenAI(**client_kwargs)
+        self._async = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def for_loop(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async.get(loop)
+            if client is None:
+                client = self._async[loop] = AsyncOpenAI(**self.client_kwargs)
+            return client
+
+
+def _usage(completion) -> Tuple[Optional[int], Optional[int]]:
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return None, None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+class OpenAIProvider(LLMProvider):
+    def __init__(self, model: str, api_key: Optional[str]):
+        super().__init__(model)
+        self.clients = _OpenAIClients(api_key=api_key)
+
+    def _messages(self, system: str, user: str):
+        return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+    def _from_completion(self, completion, system: str, user: str, response_model) -> LLMResult:
+        message = completion.choices[0].message
+        text = message.content or ""
+        # A completion cut off at the length limit has no `parsed`; repair its text instead
+        parsed = getattr(message, "parsed", None)
+        return self._result(
+            lambda: parsed if parsed is not None else _validated(text, response_model),
+            text, system + user, *_usage(completion),
+        )
+
+    def complete(self, system, user, response_model=None):
+        if response_model is not None:
+            try:
+                completion = self.clients.sync.beta.chat.completions.parse(
+                    model=self.model, messages=self._messages(system, user), response_format=response_model
+                )
+            except LengthFinishReasonError as e:
+                completion = e.completion
+        else:
+            completion = self.clients.sync.chat.completions.create(
+                model=self.model, messages=self._messages(system, user), response_format={"type": "json_object"}
+            )
+        return self._from_completion(completion, system, user, response_model)
+
+    async def acomplete(self, system, user, response_model=None):
+        client = self.clients.for_loop()
+        if response_model is not None:
+            try:
+                completion = await client.beta.chat.completions.parse(
+                    model=self.model, messages=self._messages(system, user), response_format=response_model
+                )
+            except LengthFinishReasonError as e:
+                completion = e.completion
+        else:
+            completion = await client.chat.completions.create(
+                model=self.model, messages=self._messages(system, user), response_format={"type": "json_object"}
+            )
+        return self._from_completion(completion, system, user, response_model)
+
+
+_gemini_configured_key = None
+_gemini_lock = threading.Lock()
+
+
+class GeminiProvider(LLMProvider):
+    def __init__(self, model: str, api_key: Optional[str]):
+        super().__init__(model)
+        self.api_key = api_key
+        self._models: Dict[Optional[str], genai.GenerativeModel] = {}
+        self._lock = threading.Lock()
+
+    def _generative_model(self, response_model) -> "genai.GenerativeModel":
+        global _gemini_configured_key
+        # genai keeps its configuration process-wide; only reconfigure when the key changes
+        with _gemini_lock:
+            if _gemini_configured_key != self.api_key:
+                genai.configure(api_key=self.api_key)
+                _gemini_configured_key = self.api_key
+        # Listing models are rebuilt per page from the field list, so cache by schema, not class
+        key = json.dumps(response_model.model_json_schema(), sort_keys=True) if response_model is not None else None
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                generation_config = {"response_mime_type": "application/json"}
+                if response_model is not None:
+                    generation_config["response_schema"] = response_model
+                model = self._models[key] = genai.GenerativeModel(
+                    self.model, generation_config=generation_config
+                )
+            return model
+
+    def _from_completion(self, completion, prompt: str, response_model) -> LLMResult:
+        usage = completion.usage_metadata
+        try:
+            text, blocked = completion.text, None
+        except ValueError as e:  # no text part, e.g. blocked by safety filters; the prompt is billed anyway
+            text, blocked = "", e
+
+        def parse():
+            if blocked is not None:
+                raise LLMOutputError(f"{self.model} returned no text: {blocked}")
+            return _validated(text, response_model)
+
+        return self._result(parse, text, prompt, usage.prompt_token_count, usage.candidates_token_count)
+
+    def complete(self, system, user, response_model=None):
+        prompt = system + "\n" + user
+        completion = self._generative_model(response_model).generate_content(prompt)
+        return self._from_completion(completion, prompt, response_model)
+
+    async def acomplete(self, system, user, response_model=None):
+        prompt = system + "\n" + user
+        completion = await self._generative_model(response_model).generate_content_async(prompt)
+        return self._from_completion(completion, prompt, response_model)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    schema_in_prompt = True
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str], served_model: str, temperature: float = 0.7,
+                 max_in_flight: Optional[int] = None):
+        super().__init__(model)
+        self.served_model = served_model
+        self.temperature = temperature
+        self.clients = _OpenAIClients(base_url=base_url, api_key=api_key)
+        self._lock = threading.Lock()
+        self._async_slots = weakref.WeakKeyDictionary()
+        self._stats = {"requests": 0, "queued": 0, "in_flight": 0, "max_in_flight_seen": 0,
+                       "wait_seconds": 0.0, "usage_reported": 0}
+        self.set_max_in_flight(max_in_flight)
+
+    def set_max_in_flight(self, max_in_flight: Optional[int]) -> None:
+        """Limit concurrent requests (None: unlimited); requests already waiting keep the old limit."""
+        with self._lock:
+            self.max_in_flight = max_in_flight
+            self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+            self._async_slots = weakref.WeakKeyDictionary()
+
+    def _acquired(self, waited_since: float) -> None:
+        with self._lock:
+            self._stats["queued"] -= 1
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight_seen"] = max(self._stats["max_in_flight_seen"], self._stats["in_flight"])
+            self._stats["wait_seconds"] += time.perf_counter() - waited_since
+
+    def _released(self) -> None:
+        with self._lock:
+            self._stats["in_flight"] -= 1
+            self._stats["requests"] += 1
+
+    @contextmanager
+    def _slot(self):
+        with self._lock:
+            self._stats["queued"] += 1
+            slots = self._slots
+        waited_since = time.perf_counter()
+        if slots is not None:
+            slots.acquire()
+        self._acquired(waited_since)
+        try:
+            yield
+        finally:
+            self._released()
+            if slots is not None:
+                slots.release()
+
+    @asynccontextmanager
+    async def _aslot(self):
+        # asyncio semaphores are bound to their loop, like the async clients
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["queued"] += 1
+            slots = None
+            if self.max_in_flight:
+                slots = self._async_slots.get(loop)
+                if slots is None:
+                    slots = self._async_slots[loop] = asyncio.Semaphore(self.max_in_flight)
+        waited_since = time.perf_counter()
+        if slots is not None:
+            try:
+                await slots.acquire()
+            except BaseException:  # cancelled while queued
+                with self._lock:
+                    self._stats["queued"] -= 1
+                raise
+        self._acquired(waited_since)
+        try:
+            yield
+        finally:
+            self._released()
+            if slots is not None:
+                slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counts, current queue / in-flight sizes and total client-side queue wait."""
+        with self._lock:
+            return {**self._stats, "max_in_flight": self.max_in_flight, "wait_seconds": round(self._stats["wait_seconds"], 3)}
+
+    def _request(self, system: str, user: str) -> dict:
+        return {
+            "model": self.served_model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+            "temperature": self.temperature,
+        }
+
+    def _from_completion(self, completion, system: str, user: str, response_model) -> LLMResult:
+        choice = completion.choices[0]
+        text = (choice.message.content or "").strip()
+        input_tokens, output_tokens = _usage(completion)
+        if input_tokens is not None:
+            with self._lock:
+                self._stats["usage_reported"] += 1
+
+        def parse():
+            if choice.message.content is None:
+                # e.g. a refusal or a tool call instead of text
+                raise LLMOutputError(f"{self.served_model} returned no content (finish_reason={choice.finish_reason})")
+            return _validated(text, response_model)
+
+        return self._result(parse, text, system + user, input_tokens, output_tokens)
+
+    def complete(self, system, user, response_model=None):
+        with self._slot():
+            completion = self.clients.sync.chat.completions.create(**self._request(system, user))
+        return self._from_completion(completion, system, user, response_model)
+
+    async def acomplete(self, system, user, response_model=None):
+        async with self._aslot():
+            completion = await self.clients.for_loop().chat.completions.create(**self._request(system, user))
+        return self._from_completion(completion, system, user, response_model)
+
+
+_providers: Dict[Tuple[str, Optional[str]], LLMProvider] = {}
+_providers_lock = threading.Lock()
+_max_in_flight: Dict[str, Optional[int]] = {model: LOCAL_LLM_CONCURRENCY for model in LOCAL_MODELS}
+
+
+def _create_provider(selected_model: str, api_key: Optional[str]) -> LLMProvider:
+    if selected_model in OPENAI_MODELS:
+        return OpenAIProvider(selected_model, api_key)
+    if selected_model == "gemini-1.5-flash":
+        return GeminiProvider(selected_model, api_key)
+    if selected_model == "Llama3.1 8B":
+        return OpenAICompatibleProvider(selected_model, LOCAL_LLM_BASE_URL, "lm-studio", LLAMA_MODEL_FULLNAME,
+                                        max_in_flight=_max_in_flight.get(selected_model))
+    if selected_model == "Groq Llama3.1 70b":
+        return OpenAICompatibleProvider(selected_model, GROQ_BASE_URL, api_key, GROQ_LLAMA_MODEL_FULLNAME)
+    raise ValueError(f"Unsupported model: {selected_model}")
+
+
+def _api_key_for(selected_model: str) -> Optional[str]:
+    if selected_model in OPENAI_MODELS:
+        return get_api_key('OPENAI_API_KEY')
+    if selected_model == "gemini-1.5-flash":
+        return get_api_key('GOOGLE_API_KEY')
+    if selected_model == "Groq Llama3.1 70b":
+        return get_api_key('GROQ_API_KEY')
+    return None
+
+
+def get_provider(selected_model: str) -> LLMProvider:
+    """
+    Long-lived provider for `selected_model`, cached per API key so a key changed in the
+    sidebar gets fresh clients. Call on the Streamlit script thread (API keys come from the
+    session) and hand the provider to worker threads.
+    """
+    api_key = _api_key_for(selected_model)
+    with _providers_lock:
+        provider = _providers.get((selected_model, api_key))
+        if provider is None:
+            provider = _providers[(selected_model, api_key)] = _create_provider(selected_model, api_key)
+        return provider
+
+
+def max_in_flight(selected_model: str) -> Optional[int]:
+    """Concurrent request limit of `selected_model`'s provider (None: unlimited)."""
+    return _max_in_flight.get(selected_model)
+
+
+def set_max_in_flight(selected_model: str, limit: Optional[int]) -> None:
+    """Change the concurrent request limit of a local model, for its current and future providers."""
+    if selected_model not in LOCAL_MODELS:
+        raise ValueError(f"Request concurrency is only configurable for local models, not {selected_model}")
+    with _providers_lock:
+        _max_in_flight[selected_model] = limit
+        providers = [p for (model, _), p in _providers.items() if model == selected_model]
+    for provider in providers:
+        provider.set_max_in_flight(limit)
+
+
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _strict_schema(schema: dict) -> dict:
+    """JSON schema accepted by structured outputs in strict mode: closed objects, every property required."""
+    if isinstance(schema, dict):
+        schema = {key: _strict_schema(value) for key, value in schema.items()}
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+    elif isinstance(schema, list):
+        schema = [_strict_schema(value) for value in schema]
+    return schema
+
+
+class BatchProvider(ABC):
+    """
+    Asynchronous bulk extraction: requests are written as JSONL, submitted as one job and
+    collected once the provider has processed them (hours later, at a discount).
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abstractmethod
+    def request(self, custom_id: str, system: str, user: str, response_model: Optional[Type[BaseModel]] = None) -> dict:
+        ...
+
+    @abstractmethod
+    def submit(self, jsonl_path: str) -> str:
+        ...
+
+    @abstractmethod
+    def status(self, batch_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def results(self, batch_id: str, response_model: Optional[Type[BaseModel]] = None):
+        """Yield (custom_id, LLMResult or error message) for every request of a finished batch."""
+        ...
+
+
+class OpenAIBatchProvider(BatchProvider):
+    endpoint = "/v1/chat/completions"
+
+    def __init__(self, model: str, api_key: Optional[str]):
+        super().__init__(model)
+        self.client = OpenAI(api_key=api_key)
+
+    def request(self, custom_id, system, user, response_model=None):
+        body = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+        }
+        if response_model is not None:
+            body["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": response_model.__name__,
+                    "schema": _strict_schema(response_model.model_json_schema()),
+                    "strict": True,
+                },
+            }
+        else:
+            body["response_format"] = {"type": "json_object"}
+        return {"custom_id": custom_id, "method": "POST", "url": self.endpoint, "body": body}
+
+    def submit(self, jsonl_path):
+        with open(jsonl_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=self.endpoint, completion_window="24h"
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "id": batch.id,
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+            "total": counts.total if counts else 0,
+            "completed": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+        }
+
+    def _lines(self, file_id: Optional[str]):
+        if not file_id:
+            return
+        for line in self.client.files.content(file_id).text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def results(self, batch_id, response_model=None):
+        status = self.status(batch_id)
+        for line in self._lines(status["output_file_id"]):
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                yield line["custom_id"], str(line.get("error") or response.get("body"))
+                continue
+            body = response["body"]
+            text = body["choices"][0]["message"].get("content") or ""
+            usage = body.get("usage") or {}
+            try:
+                data = _validated(text, response_model)
+            except LLMOutputError as e:
+                yield line["custom_id"], f"invalid JSON: {e}"
+                continue
+            yield line["custom_id"], LLMResult(
+                data=data,
+                text=text,
+                input_tokens=usage.get("prompt_tokens", 0),
+                output_tokens=usage.get("completion_tokens", 0),
+            )
+        for line in self._lines(status["error_file_id"]):
+            yield line["custom_id"], str(line.get("error") or line.get("response"))
+
+
+def get_batch_provider(selected_model: str, api_key: Optional[str] = None) -> BatchProvider:
+    """Batch provider for `selected_model`; only the OpenAI models have a Batch API here."""
+    if selected_model in OPENAI_MODELS:
+        return OpenAIBatchProvider(selected_model, api_key or _api_key_for(selected_model))
+    raise ValueError(f"Batch extraction is not supported for {selected_model}")
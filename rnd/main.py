@@ -1,51 +1,184 @@
+"""
+Schema-driven listing extraction with crawl4ai: no LLM, many URLs at once.
+
+Every URL is matched to a named JsonCssExtractionStrategy schema from the
+registry (rnd/schemas/*.json, see schema_registry.py). The URLs of each schema
+are crawled with arun_many on one shared browser, at most --concurrency pages at a
+time. Results are streamed as they finish. Listings are appended to
+<output>/<schema>/listings.jsonl (and .parquet). run_summary.json reports pages/s
+and failure rates per schema:
+
+    python rnd/main.py --urls-file urls.txt --concurrency 8
+    python rnd/main.py "https://www.amazon.com/s?k=Samsung+Galaxy+Tab"
+    python rnd/main.py --schema amazon_search --urls-file urls.txt
+
+Exit codes: 0 every page gave listings, 1 some failed, 2 bad arguments or no
+URL matched a schema, 3 every page failed.
+
+Needs crawl4ai >= 0.5 (streamed arun_many via CrawlerRunConfig(stream=True) and
+crawl4ai.async_dispatcher.SemaphoreDispatcher).
+"""
+import argparse
 import asyncio
 import json
-from crawl4ai import AsyncWebCrawler
+import os
+import sys
+import time
+from datetime import datetime
+
+from crawl4ai import AsyncWebCrawler, CacheMode
 from crawl4ai import JsonCssExtractionStrategy
 from crawl4ai.async_configs import BrowserConfig, CrawlerRunConfig
+from crawl4ai.async_dispatcher import SemaphoreDispatcher
+
+from assets import SCHEMA_CRAWL_CONCURRENCY
+from llm_json import loads
+from output_sink import OutputSink
+from schema_registry import SchemaRegistry, crawl_schema, get_default_registry, group_by_schema
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def _rates(stats: dict) -> dict:
+    pages = stats["pages"]
+    failed = stats["fetch_failed"] + stats["empty"] + stats["invalid"]
+    return {**stats, "failure_rate": round(failed / pages, 4) if pages else 0.0}
 
-async def extract_amazon_products():
-    browser_config = BrowserConfig(browser_type="chromium", headless=True)
-
-    crawler_config = CrawlerRunConfig(
-        extraction_strategy=JsonCssExtractionStrategy(
-            schema={
-                "name": "Amazon Product Search Results",
-                "baseSelector": "[data-component-type='s-search-result']",
-                "fields": [
-                    {"name": "title", "selector": "a h2 span", "type": "text"},
-                    {"name": "url", "selector": ".puisg-col-inner a", "type": "attribute", "attribute": "href"},
-                    {"name": "image", "selector": ".s-image", "type": "attribute", "attribute": "src"},
-                    {"name": "rating", "selector": ".a-icon-star-small .a-icon-alt", "type": "text"},
-                    {"name": "reviews_count", "selector": "[data-csa-c-func-deps='aui-da-a-popover'] ~ span span", "type": "text"},
-                    {"name": "price", "selector": ".a-price .a-offscreen", "type": "text"},
-                    {"name": "original_price", "selector": ".a-price.a-text-price .a-offscreen", "type": "text"},
-                    {"name": "sponsored", "selector": ".puis-sponsored-label-text", "type": "exists"},
-                    {"name": "delivery_info", "selector": "[data-cy='delivery-recipe'] .a-color-base.a-text-bold", "type": "text", "multiple": True},
-                ]
-            }
-        )
+
+def _request_index(result, index_of: dict) -> int:
+    """Input index of the URL a result answers; redirected pages are matched on either URL."""
+    for url in (result.url, getattr(result, "redirected_url", None)):
+        if url in index_of:
+            return index_of[url]
+        if url and url.rstrip("/") in index_of:
+            return index_of[url.rstrip("/")]
+    _log(f"Cannot map {result.url} back to an input URL")
+    return 0
+
+
+async def _crawl_schema(crawler, name: str, schema: dict, indexed_urls, concurrency: int, output_folder: str) -> dict:
+    """Crawl one schema's URLs and stream their listings to the schema's sink; returns its stats."""
+    stats = {"pages": 0, "succeeded": 0, "fetch_failed": 0, "empty": 0, "invalid": 0, "listings": 0}
+    index_of = {url: index for index, url in indexed_urls}
+    for index, url in indexed_urls:
+        index_of.setdefault(url.rstrip("/"), index)
+    config = CrawlerRunConfig(
+        extraction_strategy=JsonCssExtractionStrategy(crawl_schema(schema)),
+        cache_mode=CacheMode.BYPASS,
+        stream=True,
     )
+    dispatcher = SemaphoreDispatcher(semaphore_count=concurrency, max_session_permit=concurrency)
+    fields = [field["name"] for field in schema["fields"]]
+
+    with OutputSink(os.path.join(output_folder, name), fields) as sink:
+        async for result in await crawler.arun_many([url for _, url in indexed_urls], config=config, dispatcher=dispatcher):
+            stats["pages"] += 1
+            index = _request_index(result, index_of)
+            if not result.success:
+                stats["fetch_failed"] += 1
+                _log(f"[{name}] FAILED {result.url}: {result.error_message}")
+                continue
+            try:
+                listings = loads(result.extracted_content or "[]")
+            except ValueError as e:
+                stats["invalid"] += 1
+                _log(f"[{name}] invalid extraction for {result.url}: {e}")
+                continue
+            listings = listings if isinstance(listings, list) else [listings]
+            if not listings:
+                stats["empty"] += 1
+                _log(f"[{name}] no listings on {result.url}")
+                continue
+            stats["succeeded"] += 1
+            stats["listings"] += sink.write(index, result.url, listings)
+            _log(f"[{name}] {len(listings)} listings from {result.url} ({stats['pages']}/{len(indexed_urls)} done)")
+        stats["files"] = {"jsonl": sink.jsonl_path, "parquet": sink.parquet_path}
+    return stats
+
+
+async def extract_many(urls, output_folder: str, concurrency: int = SCHEMA_CRAWL_CONCURRENCY,
+                       registry: SchemaRegistry = None, schema_name: str = None, headless: bool = True) -> dict:
+    """Crawl `urls` with their registry schemas and return the run summary (also saved as run_summary.json)."""
+    registry = registry or get_default_registry()
+    groups, unmatched = group_by_schema(urls, registry, schema_name)
+    for url in unmatched:
+        _log(f"No schema matches {url}")
+
+    started = time.perf_counter()
+    per_schema = {}
+    if groups:
+        async with AsyncWebCrawler(config=BrowserConfig(browser_type="chromium", headless=headless)) as crawler:
+            # Schemas run one after another; the pages of each share the browser `concurrency` at a time
+            for name, indexed_urls in groups.items():
+                per_schema[name] = _rates(await _crawl_schema(
+                    crawler, name, registry.get(name), indexed_urls, concurrency, output_folder
+                ))
+    seconds = time.perf_counter() - started
+
+    totals = {key: sum(stats[key] for stats in per_schema.values())
+              for key in ("pages", "succeeded", "fetch_failed", "empty", "invalid", "listings")}
+    summary = {
+        "output_folder": output_folder,
+        **_rates(totals),
+        "unmatched": unmatched,
+        "seconds": round(seconds, 2),
+        "pages_per_second": round(totals["pages"] / seconds, 3) if seconds and totals["pages"] else 0.0,
+        "concurrency": concurrency,
+        "schemas": per_schema,
+    }
+    os.makedirs(output_folder, exist_ok=True)
+    with open(os.path.join(output_folder, "run_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Extract listings with registered CSS schemas (no LLM)")
+    parser.add_argument("urls", nargs="*", help="URLs to extract")
+    parser.add_argument("--urls-file", help="File with one URL per line ('-' for stdin)")
+    parser.add_argument("--schema", help="Use this registry schema for every URL instead of matching")
+    parser.add_argument("--schemas-dir", help="Directory of schema JSON files (default: rnd/schemas)")
+    parser.add_argument("--concurrency", type=int, default=SCHEMA_CRAWL_CONCURRENCY, help="Pages crawled at once")
+    parser.add_argument("--output", help="Output folder (default: output/schema_run_<timestamp>)")
+    parser.add_argument("--headed", action="store_true", help="Show the browser window")
+    parser.add_argument("--list-schemas", action="store_true", help="Print the registered schemas and exit")
+    args = parser.parse_args(argv)
 
-    url = "https://www.amazon.com/s?k=Samsung+Galaxy+Tab"
+    registry = SchemaRegistry(args.schemas_dir) if args.schemas_dir else get_default_registry()
+    if args.list_schemas:
+        print(json.dumps({name: schema["match"] for name, schema in registry.schemas.items()}, indent=2))
+        return EXIT_OK
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.schema and args.schema not in registry.schemas:
+        parser.error(f"unknown schema '{args.schema}' (available: {', '.join(registry.names()) or 'none'})")
 
-    async with AsyncWebCrawler(config=browser_config) as crawler:
-        result = await crawler.arun(url=url, config=crawler_config)
+    urls = list(args.urls)
+    if args.urls_file == "-":
+        urls += [line.strip() for line in sys.stdin if line.strip()]
+    elif args.urls_file:
+        with open(args.urls_file, encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return EXIT_USAGE
 
-        if result and result.extracted_content:
-            products = json.loads(result.extracted_content)
+    output_folder = args.output or os.path.join("output", f"schema_run_{datetime.now().strftime('%Y_%m_%d__%H_%M_%S')}")
+    summary = asyncio.run(extract_many(urls, output_folder, args.concurrency, registry, args.schema, not args.headed))
+    print(json.dumps(summary, indent=2))
+    if not summary["pages"]:
+        return EXIT_USAGE
+    if summary["succeeded"] == summary["pages"] and not summary["unmatched"]:
+        return EXIT_OK
+    return EXIT_FAILED if summary["succeeded"] == 0 else EXIT_PARTIAL
 
-            for product in products:
-                print("\nProduct Details:")
-                print(f"Title: {product.get('title')}")
-                print(f"Price: {product.get('price')}")
-                print(f"Original Price: {product.get('original_price')}")
-                print(f"Rating: {product.get('rating')}")
-                print(f"Reviews: {product.get('reviews_count')}")
-                print(f"Sponsored: {'Yes' if product.get('sponsored') else 'No'}")
-                if product.get("delivery_info"):
-                    print(f"Delivery: {' '.join(product['delivery_info'])}")
-                print("-" * 80)
 
 if __name__ == "__main__":
-    asyncio.run(extract_amazon_products())
\ No newline at end of file
+    sys.exit(main())
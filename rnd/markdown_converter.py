@@ -0,0 +1,194 @@
+"""
+Single-pass HTML to Markdown conversion.
+
+The page is parsed once with lxml; header/footer and non-content elements are
+dropped on the tree, the main content region is located on the same tree, and
+Markdown is emitted directly from it (no serialize + re-parse through html2text).
+
+Main content is the `<main>` / `[role=main]` element when it holds most of the
+page text, otherwise the deepest element that still contains
+MAIN_CONTENT_TEXT_SHARE of the page's visible text. Listing pages keep all their
+items because a listing grid is where most of the text lives.
+"""
+import re
+from typing import List, Optional
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+# Removed with their content before anything else (header/footer as in clean_html)
+DROP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "head", "header", "footer", "link", "meta"}
+
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "aside", "nav", "form", "fieldset",
+    "figure", "figcaption", "address", "details", "summary", "dl", "dt", "dd",
+    "center", "body", "html",
+}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+MAIN_CONTENT_TEXT_SHARE = 0.8
+
+_WS = re.compile(r"\s+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _text_len(el) -> int:
+    return len(_WS.sub("", el.text_content() or ""))
+
+
+def find_main_content(root):
+    """Return the element holding the page's main content (falls back to the body)."""
+    body = root.find(".//body")
+    if body is None:
+        body = root
+    total = _text_len(body)
+    if total == 0:
+        return body
+
+    for candidate in body.xpath(".//main | .//*[@role='main']"):
+        if _text_len(candidate) >= total * MAIN_CONTENT_TEXT_SHARE:
+            return candidate
+
+    node = body
+    while True:
+        best = None
+        for child in node:
+            if isinstance(child.tag, str) and _text_len(child) >= total * MAIN_CONTENT_TEXT_SHARE:
+                best = child
+                break
+        if best is None:
+            return node
+        node = best
+
+
+class _Renderer:
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url
+
+    def _url(self, href: str) -> str:
+        return urljoin(self.base_url, href) if self.base_url else href
+
+    def inline(self, el, pre: bool = False) -> str:
+        parts: List[str] = []
+        if el.text:
+            parts.append(el.text if pre else _WS.sub(" ", el.text))
+        for child in el:
+            parts.append(self.render(child, pre))
+            if child.tail:
+                parts.append(child.tail if pre else _WS.sub(" ", child.tail))
+        return "".join(parts)
+
+    def render(self, el, pre: bool = False) -> str:
+        tag = el.tag
+        if not isinstance(tag, str):  # comments, processing instructions
+            return ""
+        tag = tag.lower()
+
+        if tag in HEADINGS:
+            text = self.inline(el).strip()
+            return f"\n\n{'#' * HEADINGS[tag]} {text}\n\n" if text else ""
+        if tag in BLOCK_TAGS:
+            text = self.inline(el, pre).strip()
+            return f"\n\n{text}\n\n" if text else ""
+        if tag in ("ul", "ol"):
+            return self.render_list(el, ordered=tag == "ol")
+        if tag == "li":  # stray <li> outside a list
+            return f"\n  * {self.inline(el).strip()}\n"
+        if tag == "table":
+            return self.render_table(el)
+        if tag == "pre":
+            return f"\n\n```\n{el.text_content().strip(chr(10))}\n```\n\n"
+        if tag == "blockquote":
+            text = self.inline(el).strip()
+            return "\n\n" + "\n".join(f"> {line}" for line in text.splitlines()) + "\n\n" if text else ""
+        if tag == "br":
+            return "\n"
+        if tag == "hr":
+            return "\n\n* * *\n\n"
+        if tag == "a":
+            if any(isinstance(d.tag, str) and (d.tag in HEADINGS or d.tag in BLOCK_TAGS) for d in el.iterdescendants()):
+                # Card links wrapping headings/blocks: Markdown link text must stay on one line
+                text = _WS.sub(" ", el.text_content()).strip()
+            else:
+                text = self.inline(el, pre).strip()
+            href = el.get("href")
+            if not href or href.startswith(("javascript:", "#")):
+                return text
+            return f"[{text}]({self._url(href)})"
+        if tag == "img":
+            src = el.get("src") or el.get("data-src")
+            return f"![{(el.get('alt') or '').strip()}]({self._url(src)})" if src else ""
+        if tag in ("strong", "b"):
+            text = self.inline(el, pre).strip()
+            return f"**{text}**" if text else ""
+        if tag in ("em", "i"):
+            text = self.inline(el, pre).strip()
+            return f"_{text}_" if text else ""
+        if tag == "code":
+            return f"`{el.text_content()}`"
+        return self.inline(el, pre)
+
+    def render_list(self, el, ordered: bool, depth: int = 0) -> str:
+        lines = []
+        indent = "  " * (depth + 1)
+        number = 0
+        for li in el:
+            if not isinstance(li.tag, str) or li.tag.lower() != "li":
+                continue
+            number += 1
+            nested = []
+            parts = [_WS.sub(" ", li.text or "")]
+            for child in li:
+                child_tag = child.tag.lower() if isinstance(child.tag, str) else ""
+                if child_tag in ("ul", "ol"):
+                    nested.append(self.render_list(child, child_tag == "ol", depth + 1).strip("\n"))
+                else:
+                    parts.append(self.render(child))
+                if child.tail:
+                    parts.append(_WS.sub(" ", child.tail))
+            text = _WS.sub(" ", "".join(parts)).strip()
+            marker = f"{number}." if ordered else "*"
+            if text:
+                lines.append(f"{indent}{marker} {text}")
+            lines.extend(nested)
+        return "\n\n" + "\n".join(lines) + "\n\n" if lines else ""
+
+    def render_table(self, el) -> str:
+        rows = []
+        for tr in el.iter("tr"):
+            cells = [
+                _WS.sub(" ", self.inline(cell)).strip().replace("|", "\\|")
+                for cell in tr
+                if isinstance(cell.tag, str) and cell.tag.lower() in ("td", "th")
+            ]
+            if cells:
+                rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(r) for r in rows)
+        lines = []
+        for i, row in enumerate(rows):
+            lines.append("| " + " | ".join(row + [""] * (width - len(row))) + " |")
+            if i == 0:
+                lines.append("|" + "---|" * width)
+        return "\n\n" + "\n".join(lines) + "\n\n"
+
+
+def _normalize(markdown: str) -> str:
+    lines = [line.rstrip() for line in markdown.splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip() + "\n"
+
+
+def html_to_markdown(html_content: str, base_url: Optional[str] = None, main_content_only: bool = True) -> str:
+    """Convert HTML to Markdown in one parse, keeping only the main content region by default."""
+    if not html_content or not html_content.strip():
+        return ""
+    try:
+        root = lxml.html.document_fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        return ""
+
+    etree.strip_elements(root, *DROP_TAGS, with_tail=False)
+    region = find_main_content(root) if main_content_only else root
+    return _normalize(_Renderer(base_url).render(region))
@@ -0,0 +1,134 @@
+"""
+Streaming output for extracted listings.
+
+Listings are appended as each page finishes: one line per listing in
+listings.jsonl and one Parquet row group per page in listings.parquet (when
+pyarrow, an optional dependency listed in requirements.txt, is installed). Nothing is kept in memory between pages, so memory stays
+flat however many listings a run produces. Excel and CSV are produced once, at
+the end or on demand, by streaming the JSONL file back (openpyxl write-only mode,
+csv.DictWriter).
+
+Every row carries `_page` (URL index) and `_url` next to the requested fields.
+A sink owns the files of one run and starts them afresh.
+"""
+import csv
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = None
+    pq = None
+
+JSONL_FILE = "listings.jsonl"
+PARQUET_FILE = "listings.parquet"
+META_COLUMNS = ["_page", "_url"]
+
+
+def _cell(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else str(value)
+
+
+class OutputSink:
+    def __init__(self, output_folder: str, fields: List[str], parquet: bool = True):
+        self.output_folder = output_folder
+        self.fields = list(fields)
+        self.columns = META_COLUMNS + self.fields
+        self.rows = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+        self.jsonl_path = os.path.join(output_folder, JSONL_FILE)
+        self._jsonl = open(self.jsonl_path, "w", encoding="utf-8")
+
+        self.parquet_path = None
+        self._parquet = None
+        if parquet and pa is not None:
+            self.parquet_path = os.path.join(output_folder, PARQUET_FILE)
+            schema = pa.schema([("_page", pa.int32())] + [(c, pa.string()) for c in self.columns[1:]])
+            self._parquet = pq.ParquetWriter(self.parquet_path, schema)
+        elif parquet:
+            logging.warning("pyarrow is not installed; writing JSONL only (pip install pyarrow for Parquet output)")
+
+    def write(self, index: int, url: str, listings: List[dict]) -> int:
+        """Append one page's listings; returns how many rows were written."""
+        rows = [
+            {"_page": index, "_url": url, **{field: _cell(listing.get(field)) for field in self.fields}}
+            for listing in listings
+        ]
+        with self._lock:
+            for row in rows:
+                self._jsonl.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._jsonl.flush()
+            if self._parquet is not None and rows:
+                table = pa.Table.from_pydict(
+                    {column: [row[column] for row in rows] for column in self.columns}, schema=self._parquet.schema
+                )
+                self._parquet.write_table(table)  # one row group per page
+            self.rows += len(rows)
+            self.pages += 1
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._jsonl.closed:
+                self._jsonl.close()
+            if self._parquet is not None:
+                self._parquet.close()
+                self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def summary(self) -> Dict[str, object]:
+        return {"pages": self.pages, "rows": self.rows, "jsonl": self.jsonl_path, "parquet": self.parquet_path}
+
+
+def iter_rows(jsonl_path: str) -> Iterator[dict]:
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _columns(jsonl_path: str) -> List[str]:
+    for row in iter_rows(jsonl_path):
+        return list(row)
+    return list(META_COLUMNS)
+
+
+def export_csv(jsonl_path: str, csv_path: Optional[str] = None) -> str:
+    """Stream listings.jsonl into a CSV file next to it (or `csv_path`)."""
+    csv_path = csv_path or os.path.splitext(jsonl_path)[0] + ".csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=_columns(jsonl_path), extrasaction="ignore")
+        writer.writeheader()
+        for row in iter_rows(jsonl_path):
+            writer.writerow(row)
+    return csv_path
+
+
+def export_excel(jsonl_path: str, excel_path: Optional[str] = None) -> str:
+    """Stream listings.jsonl into an .xlsx workbook (openpyxl write-only mode keeps memory flat)."""
+    excel_path = excel_path or os.path.splitext(jsonl_path)[0] + ".xlsx"
+    columns = _columns(jsonl_path)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("listings")
+    sheet.append(columns)
+    for row in iter_rows(jsonl_path):
+        sheet.append([row.get(column) for column in columns])
+    workbook.save(excel_path)
+    return excel_path
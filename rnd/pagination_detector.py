@@ -1,15 +1,14 @@
 import os
-import json
-from typing import List, Dict, Tuple, Union
+import time
+from typing import List, Dict, Optional, Tuple, Union
 from pydantic import BaseModel, Field, ValidationError
-import tiktoken
 from dotenv import load_dotenv
-from openai import OpenAI
-import google.generativeai as genai
 
-import openai
-from api_management import get_api_key
-from assets import PROMPT_PAGINATION, PRICING, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME
+from assets import PROMPT_PAGINATION, PRICING, MAX_INPUT_TOKENS
+from budget_governor import BudgetGovernor
+from llm_providers import get_provider
+from pagination_rules import detect_pagination_rules
+from token_budget import count_tokens, fit_to_prompt
 
 load_dotenv()
 import logging
@@ -26,104 +25,76 @@ def calculate_pagination_price(token_counts: Dict[str, int], model: str) -> floa
     
     return input_price + output_price
 
-def detect_pagination_elements(url: str, indications: str, selected_model: str, markdown_content: str) -> Tuple[Union[PaginationData, Dict, str], Dict, float]:
+def pagination_prompt(url: str, indications: str) -> str:
+    prompt_pagination = PROMPT_PAGINATION+"\n The url of the page to extract pagination from   "+url+"if the urls that you find are not complete combine them intelligently in a way that fit the pattern **ALWAYS GIVE A FULL URL**"
+    if indications != "":
+        prompt_pagination +="\n\n these are the users indications that, pay special attention to them: "+indications+"\n\n below are the markdowns of the website: \n\n"
+    else:
+        prompt_pagination +="\n There are no user indications in this case just apply the logic described. \n\n below are the markdowns of the website: \n\n"
+    return prompt_pagination
+
+def detect_pagination_elements(url: str, indications: str, selected_model: str, markdown_content: str,
+                               html: Optional[str] = None, stats: dict = None,
+                               governor: Optional[BudgetGovernor] = None) -> Tuple[Union[PaginationData, Dict, str], Dict, float]:
+    """
+    Page URLs from the rule-based detector (pagination_rules.py) when it finds a confident
+    pattern, otherwise from the LLM. `stats`, if given, receives the method used, the
+    detection time and, for rule hits, the pattern and the prompt tokens not sent.
+    With a budget `governor` the LLM request reserves its estimated cost first, like the
+    extraction requests, and is committed at its actual usage (also when the response is unusable).
+    """
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
     try:
-        prompt_pagination = PROMPT_PAGINATION+"\n The url of the page to extract pagination from   "+url+"if the urls that you find are not complete combine them intelligently in a way that fit the pattern **ALWAYS GIVE A FULL URL**"
-        if indications != "":
-            prompt_pagination +=PROMPT_PAGINATION+"\n\n these are the users indications that, pay special attention to them: "+indications+"\n\n below are the markdowns of the website: \n\n"
-        else:
-            prompt_pagination +=PROMPT_PAGINATION+"\n There are no user indications in this case just apply the logic described. \n\n below are the markdowns of the website: \n\n"
-
-        if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
-            client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
-            completion = client.beta.chat.completions.parse(
-                model=selected_model,
-                messages=[
-                    {"role": "system", "content": prompt_pagination},
-                    {"role": "user", "content": markdown_content},
-                ],
-                response_format=PaginationData
-            )
-
-            parsed_response = completion.choices[0].message.parsed
-
-            encoder = tiktoken.encoding_for_model(selected_model)
-            input_token_count = len(encoder.encode(markdown_content))
-            output_token_count = len(encoder.encode(json.dumps(parsed_response.dict())))
-            token_counts = {
-                "input_tokens": input_token_count,
-                "output_tokens": output_token_count
-            }
-
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return parsed_response, token_counts, pagination_price
-
-        elif selected_model == "gemini-1.5-flash":
-            genai.configure(api_key=get_api_key("GOOGLE_API_KEY"))
-            model = genai.GenerativeModel(
-                'gemini-1.5-flash',
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "response_schema": PaginationData
-                }
+        prompt_pagination = pagination_prompt(url, indications)
+        markdown_content = fit_to_prompt(prompt_pagination, markdown_content, MAX_INPUT_TOKENS[selected_model], selected_model)
+
+        match = detect_pagination_rules(url, html=html, markdown=markdown_content)
+        if match is not None:
+            stats.update(
+                method="rules",
+                pattern=match["pattern"],
+                evidence=match["evidence"],
+                tokens_saved=count_tokens(prompt_pagination + markdown_content, selected_model),
+                detect_seconds=round(time.perf_counter() - started, 3),
             )
-            prompt = f"{prompt_pagination}\n{markdown_content}"
-            input_tokens = model.count_tokens(prompt)
-            completion = model.generate_content(prompt)
-            usage_metadata = completion.usage_metadata
-            token_counts = {
-                "input_tokens": usage_metadata.prompt_token_count,
-                "output_tokens": usage_metadata.candidates_token_count
-            }
-            response_content = completion.text
-            
-            logging.info(f"Gemini Flash response type: {type(response_content)}")
-            logging.info(f"Gemini Flash response content: {response_content}")
-            
-            try:
-                parsed_data = json.loads(response_content)
-                if isinstance(parsed_data, dict) and 'page_urls' in parsed_data:
-                    pagination_data = PaginationData(**parsed_data)
+            return PaginationData(page_urls=match["page_urls"]), {"input_tokens": 0, "output_tokens": 0}, 0.0
+
+        model = selected_model
+        reservation = None
+        if governor is not None:
+            reservation = governor.reserve(selected_model, count_tokens(prompt_pagination + markdown_content, selected_model))
+            model = reservation.model
+        try:
+            result = get_provider(model).complete(prompt_pagination, markdown_content, PaginationData)
+        except Exception as e:
+            if reservation is not None:
+                billed = getattr(e, "token_counts", None)
+                if billed is None:
+                    governor.release(reservation)
                 else:
-                    pagination_data = PaginationData(page_urls=[])
-            except json.JSONDecodeError:
-                logging.error("Failed to parse Gemini Flash response as JSON")
-                pagination_data = PaginationData(page_urls=[])
-
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return pagination_data, token_counts, pagination_price
-
-        elif selected_model == "Llama3.1 8B":
-            openai.api_key = "lm-studio"
-            openai.api_base = "http://localhost:1234/v1"
-            response = openai.ChatCompletion.create(
-                model=LLAMA_MODEL_FULLNAME,
-                messages=[
-                    {"role": "system", "content": prompt_pagination},
-                    {"role": "user", "content": markdown_content},
-                ],
-                temperature=0.7,
-            )
-            response_content = response['choices'][0]['message']['content'].strip()
-            try:
-                pagination_data = json.loads(response_content)
-            except json.JSONDecodeError:
-                pagination_data = {"next_buttons": [], "page_urls": []}
-            token_counts = {
-                "input_tokens": response['usage']['prompt_tokens'],
-                "output_tokens": response['usage']['completion_tokens']
-            }
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return pagination_data, token_counts, pagination_price
-
+                    governor.commit(reservation, billed)
+            raise
+        pagination_data = result.data
+        if isinstance(pagination_data, dict):
+            # The model answered with JSON that does not match the schema
+            logging.info(f"{selected_model} pagination response did not match the schema: {result.text}")
+            pagination_data = PaginationData(page_urls=[
+                page_url for page_url in pagination_data.get("page_urls", []) if isinstance(page_url, str)
+            ])
+
+        token_counts = result.token_counts
+        if reservation is not None:
+            pagination_price = governor.commit(reservation, token_counts)
         else:
-            raise ValueError(f"Unsupported model: {selected_model}")
+            pagination_price = calculate_pagination_price(token_counts, model)
+        stats.update(method="llm", tokens_saved=0, detect_seconds=round(time.perf_counter() - started, 3))
+
+        return pagination_data, token_counts, pagination_price
 
     except Exception as e:
         logging.error(f"An error occurred in detect_pagination_elements: {e}")
+        stats.update(method="failed", tokens_saved=0, detect_seconds=round(time.perf_counter() - started, 3))
         return PaginationData(page_urls=[]), {"input_tokens": 0, "output_tokens": 0}, 0.0
 
 
@@ -0,0 +1,167 @@
+"""
+Rule-based pagination detection, run before the LLM detector.
+
+Links are collected from the page HTML (or its Markdown when no HTML is at hand)
+and grouped by URL template: the link with one of its numbers replaced by a slot,
+e.g. `https://shop.example/list?page={n}`. A template counts as pagination when
+a rel="next" / "Next" link fits it and its slot is named like a page parameter
+or its links are labelled with their page number, when several of its links are
+labelled with their own page number ("1 2 3 ... 12"), or when its slot has an
+unambiguous page name (page, pg, pageno, ...) and at least two page numbers are
+linked densely. Generic names (p, o, start, from, offset, ...) also name product
+paths and search offsets, so they need the next-link or labelled-link evidence.
+The full range is extrapolated from the smallest to the largest linked number, in
+steps of the common difference (so offset=0,20,40 patterns work too); a page URL
+without the number counts as the first page. Ranges without two adjacent pages,
+or spanning or starting beyond PAGINATION_RULE_MAX_SPAN steps, are rejected as
+made-up (ids, prices, years).
+
+When no template qualifies the caller falls back to the LLM.
+"""
+import re
+from functools import reduce
+from math import gcd
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import lxml.html
+from lxml import etree
+
+from assets import PAGINATION_RULE_MAX_PAGES, PAGINATION_RULE_MAX_SPAN
+
+# Names that mean "page" on their own
+PAGE_NAMES = {
+    "page", "pages", "pg", "paged", "pagenum", "pagenumber", "page_num", "pageno", "pn", "currentpage",
+}
+# Names that are pagination only with further evidence (also product paths /p/123, search offsets, ...)
+GENERIC_PAGE_NAMES = {"p", "o", "offset", "start", "from", "skip"}
+OFFSET_NAMES = {"o", "offset", "start", "from", "skip"}
+# A page-named pattern without labels or a next link must link at least this share of its range
+MIN_LINK_DENSITY = 0.25
+NEXT_LABEL = re.compile(
+    r"^\W*(next|next page|more results|siguiente|suivant|weiter|volgende|selanjutnya|berikutnya)\W*$", re.I
+)
+NEXT_ARROWS = {"›", "»", ">", "→", ">>", "›»"}
+
+_NUMBER = re.compile(r"\d+")
+_SLOT_NAME = re.compile(r"([A-Za-z_]+)[=/_-]?$")
+_MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\((\S+?)(?:\s+\"[^\"]*\")?\)")
+
+
+def _is_next(text: str, rel: str, hint: str) -> bool:
+    if "next" in rel.lower().split():
+        return True
+    text = text.strip()
+    if text in NEXT_ARROWS:
+        return True
+    if NEXT_LABEL.match(text):
+        return True
+    return bool(re.search(r"\bnext\b", hint, re.I))
+
+
+def extract_links(base_url: str, html: Optional[str] = None, markdown: Optional[str] = None) -> List[Tuple[str, str, bool]]:
+    """(absolute URL, link text, looks like a "next" link) for every link on the page."""
+    links = []
+    if html:
+        try:
+            root = lxml.html.fromstring(html)
+        except (ValueError, etree.ParserError):
+            root = None
+        if root is not None:
+            for el in root.iter("a", "link"):
+                href = el.get("href")
+                if not href or href.startswith(("javascript:", "mailto:", "#")):
+                    continue
+                text = el.text_content() if el.tag == "a" else ""
+                hint = " ".join(filter(None, [el.get("aria-label"), el.get("title"), el.get("class")]))
+                links.append((urljoin(base_url, href), text, _is_next(text, el.get("rel") or "", hint)))
+    if not links and markdown:
+        for text, href in _MARKDOWN_LINK.findall(markdown):
+            links.append((urljoin(base_url, href), text, _is_next(text, "", "")))
+    return [(urldefrag(link)[0], text, is_next) for link, text, is_next in links]
+
+
+def _slots(url: str) -> Iterator[Tuple[Tuple[str, str], int]]:
+    """((prefix, suffix), number) for every number in the URL after the host."""
+    offset = len(urlparse(url)._replace(path="", params="", query="", fragment="").geturl())
+    for match in _NUMBER.finditer(url, offset):
+        yield (url[:match.start()], url[match.end():]), int(match.group())
+
+
+def _slot_name(prefix: str) -> str:
+    match = _SLOT_NAME.search(prefix)
+    return match.group(1).lower() if match else ""
+
+
+def _current_number(url_numbers: Dict[Tuple[str, str], int], template: Tuple[str, str]) -> int:
+    """The page URL's number in `template`; a URL without it is the first page (offset=0, page=1)."""
+    if template in url_numbers:
+        return url_numbers[template]
+    return 0 if _slot_name(template[0]) in OFFSET_NAMES else 1
+
+
+def _page_range(numbers) -> Tuple[List[int], int]:
+    """Linked numbers in order and their common step."""
+    ordered = sorted(numbers)
+    step = reduce(gcd, (b - a for a, b in zip(ordered, ordered[1:])), 0) or 1
+    return ordered, step
+
+
+def _plausible(ordered: List[int], step: int) -> bool:
+    """
+    A range that could be page numbers (the current page included): two adjacent pages,
+    not too wide and not starting too far out.
+    """
+    if not any(b - a == step for a, b in zip(ordered, ordered[1:])):
+        return False
+    return (ordered[-1] - ordered[0]) // step < PAGINATION_RULE_MAX_SPAN and ordered[0] // step <= PAGINATION_RULE_MAX_SPAN
+
+
+def detect_pagination_rules(url: str, html: Optional[str] = None, markdown: Optional[str] = None,
+                            max_pages: int = PAGINATION_RULE_MAX_PAGES) -> Optional[Dict]:
+    """
+    Page URLs of the most convincing numeric pattern on the page, or None when there is
+    no confident pattern. Result: {"page_urls", "pattern", "evidence"}.
+    """
+    host = urlparse(url).netloc
+    groups: Dict[Tuple[str, str], Dict] = {}
+    for link, text, is_next in extract_links(url, html, markdown):
+        if urlparse(link).netloc != host:
+            continue
+        for template, number in _slots(link):
+            group = groups.setdefault(template, {"numbers": set(), "labelled": 0, "next": False})
+            group["numbers"].add(number)
+            group["labelled"] += text.strip() == str(number)
+            group["next"] = group["next"] or is_next
+
+    url_numbers = dict(_slots(url))
+    best, best_score, evidence = None, None, None
+    for template, group in groups.items():
+        name = _slot_name(template[0])
+        named = name in PAGE_NAMES
+        ordered, step = _page_range(group["numbers"] | {_current_number(url_numbers, template)})
+        if not _plausible(ordered, step):
+            continue
+        if group["next"] and (named or name in GENERIC_PAGE_NAMES or group["labelled"]):
+            reason = "next link"
+        elif group["labelled"] >= 2 and len(group["numbers"]) >= 3:
+            reason = "numbered links"
+        elif named and len(group["numbers"]) >= 2 and len(ordered) >= MIN_LINK_DENSITY * ((ordered[-1] - ordered[0]) // step + 1):
+            reason = f"'{name}' parameter"
+        else:
+            continue
+        score = (group["next"], named, group["labelled"], len(group["numbers"]))
+        if best_score is None or score > best_score:
+            best, best_score, evidence = template, score, reason
+    if best is None:
+        return None
+
+    current = _current_number(url_numbers, best)
+    ordered, step = _page_range(groups[best]["numbers"] | {current})
+    prefix, suffix = best
+    page_urls = [
+        f"{prefix}{number}{suffix}"
+        for number in range(ordered[0], ordered[-1] + 1, step)[:max_pages]
+        if number != current
+    ]
+    return {"page_urls": page_urls, "pattern": f"{prefix}{{n}}{suffix}", "evidence": evidence}
@@ -0,0 +1,172 @@
+"""
+Concurrent multi-URL scraping pipeline.
+
+Fetching (HTTP first, see fetcher.py; Chrome is bounded by the driver pool) and
+LLM extraction run on separate bounded pools, so page N+1 is loading while page N
+is being extracted.
+Before extraction the Markdown goes through the content reducer (repeated site
+blocks, link farms and image-only lines removed), one reducer per run; the full
+Markdown stays on the result for pagination detection.
+Results are yielded in completion order; token and cost totals are left to the
+caller, which aggregates them on its own thread.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from assets import FETCH_WORKERS, LLM_WORKERS, PAGINATION_MAX_PAGES, PAGINATION_WAVE_SIZE
+from budget_governor import BudgetGovernor
+from content_reducer import ContentReducer
+from fetcher import get_default_fetcher
+from llm_providers import max_in_flight
+from scraper import html_to_markdown_with_readability, listing_key, listings_of, save_raw_data, scrape_url
+
+
+def _fetch(index: int, url: str) -> Dict:
+    load_stats = {}
+    # Plain HTTP first; headless Chrome only when the page needs JavaScript
+    raw_html = get_default_fetcher().fetch(url, stats=load_stats)
+    markdown = html_to_markdown_with_readability(raw_html, base_url=url)
+    return {"index": index, "url": url, "html": raw_html, "markdown": markdown, "load_stats": load_stats}
+
+
+def _extract(item: Dict, fields: List[str], selected_model: str, output_folder: str, focus_listings: bool,
+             chunked: bool, governor: Optional[BudgetGovernor], reducer: ContentReducer) -> Dict:
+    started = time.perf_counter()
+    reduced, reduction = reducer.reduce(
+        item["markdown"], item["url"], focus_listings=focus_listings, model=selected_model
+    )
+    extract_stats = {}
+    input_tokens, output_tokens, cost, formatted_data = scrape_url(
+        item["url"], fields, selected_model, output_folder, item["index"], item["markdown"], chunked, extract_stats,
+        html=item["html"], governor=governor, reduced=reduced, focus_listings=focus_listings,
+    )
+    return {
+        **item,
+        "reduction": reduction,
+        "cached": extract_stats.get("cached", False),
+        "css_schema": extract_stats.get("css_schema", False),
+        "partial": extract_stats.get("partial", False),
+        "formatted_data": formatted_data,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": cost,
+        "extract_seconds": round(time.perf_counter() - started, 3),
+        "error": None if formatted_data is not None
+        else "budget exceeded" if extract_stats.get("budget_exceeded") else "extraction failed",
+    }
+
+
+def run_pipeline(
+    urls: List[str],
+    fields: List[str],
+    selected_model: str,
+    output_folder: str,
+    extract: bool = True,
+    focus_listings: bool = False,
+    chunked: bool = False,
+    fetch_workers: int = FETCH_WORKERS,
+    extract_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, str, str], None]] = None,
+    thread_initializer: Optional[Callable[[], None]] = None,
+    start_index: int = 1,
+    governor: Optional[BudgetGovernor] = None,
+    reducer: Optional[ContentReducer] = None,
+) -> Iterator[Dict]:
+    """
+    Scrape `urls` concurrently and yield one result dict per URL as soon as it finishes.
+    `on_progress(index, url, stage)` is called on the caller's thread with stage in
+    'fetching', 'extracting', 'done' or 'error'. URL indexes start at `start_index` (1),
+    matching the rawData_N.md / sorted_data_N.json file names. `focus_listings` additionally trims the
+    Markdown sent to the LLM to the repeated listing region; `chunked` extracts each page in
+    concurrent token-bounded chunks (see scraper.format_data). A shared budget `governor` limits
+    spend and tokens across the extraction workers (see budget_governor.py). Pass the run's
+    `reducer` when several calls belong to one run; otherwise each call gets a fresh one.
+    `extract_workers` defaults to LLM_WORKERS, or to the request limit of a local model if
+    that is higher, so its server's parallel slots stay busy.
+    """
+    progress = on_progress or (lambda index, url, stage: None)
+    reducer = reducer or ContentReducer()
+    extract_workers = extract_workers or max(LLM_WORKERS, max_in_flight(selected_model) or 0)
+
+    with ThreadPoolExecutor(fetch_workers, thread_name_prefix="fetch", initializer=thread_initializer) as fetch_pool, \
+            ThreadPoolExecutor(extract_workers, thread_name_prefix="extract", initializer=thread_initializer) as extract_pool:
+        pending = {}
+        for index, url in enumerate(urls, start=start_index):
+            pending[fetch_pool.submit(_fetch, index, url)] = ("fetch", index, url)
+            progress(index, url, "fetching")
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, index, url = pending.pop(future)
+                    try:
+                        item = future.result()
+                    except Exception as e:
+                        progress(index, url, "error")
+                        yield {"index": index, "url": url, "error": str(e), "formatted_data": None,
+                               "input_tokens": 0, "output_tokens": 0, "cost": 0}
+                        continue
+
+                    if stage == "fetch" and extract:
+                        pending[extract_pool.submit(_extract, item, fields, selected_model, output_folder, focus_listings, chunked, governor, reducer)] = ("extract", index, url)
+                        progress(index, url, "extracting")
+                        continue
+                    if stage == "fetch":
+                        save_raw_data(item["markdown"], output_folder, f"rawData_{index}.md")
+                        item.update(formatted_data=None, input_tokens=0, output_tokens=0, cost=0, error=None)
+
+                    progress(index, url, "error" if item.get("error") else "done")
+                    yield item
+        finally:
+            # Closing the generator early (the caller stopped reading) drops work that has not started
+            for future in pending:
+                future.cancel()
+
+
+def follow_pagination(
+    page_urls: List[str],
+    fields: List[str],
+    selected_model: str,
+    output_folder: str,
+    seen_keys: Set[tuple],
+    start_index: int = 2,
+    max_pages: int = PAGINATION_MAX_PAGES,
+    wave_size: int = PAGINATION_WAVE_SIZE,
+    **pipeline_kwargs,
+) -> Iterator[Dict]:
+    """
+    Scrape detected pagination pages through run_pipeline, `wave_size` pages at a time, and
+    yield their results with `new_listings` (listings not in `seen_keys`, which is updated).
+    Stops after the wave in which a page added no new listings, or after `max_pages` pages;
+    the last yielded item then has `stop_reason` set. Pages get indexes from `start_index`.
+    """
+    urls = list(dict.fromkeys(page_urls))[:max_pages]
+    pipeline_kwargs.setdefault("reducer", ContentReducer())  # shared by the waves
+    for wave_start in range(0, len(urls), wave_size):
+        wave = urls[wave_start:wave_start + wave_size]
+        results = sorted(
+            run_pipeline(wave, fields, selected_model, output_folder, start_index=start_index + wave_start,
+                         **pipeline_kwargs),
+            key=lambda item: item["index"],
+        )
+        exhausted = False
+        for item in results:
+            new_listings = []
+            if not item.get("error"):
+                for listing in listings_of(item["formatted_data"]):
+                    key = listing_key(listing)
+                    if key not in seen_keys:
+                        seen_keys.add(key)
+                        new_listings.append(listing)
+                # Pages past the end of a listing usually repeat the last page or come back empty
+                exhausted = exhausted or not new_listings
+            item["new_listings"] = new_listings
+        if exhausted:
+            results[-1]["stop_reason"] = "no_new_listings"
+        elif wave_start + wave_size >= len(urls) and len(set(page_urls)) > max_pages:
+            results[-1]["stop_reason"] = "max_pages"
+        yield from results
+        if exhausted:
+            return
@@ -0,0 +1,106 @@
+"""
+Registry of named CSS extraction schemas for the LLM-free extraction path (main.py).
+
+Each rnd/schemas/<name>.json file holds one crawl4ai JsonCssExtractionStrategy
+schema plus a "match" block saying which URLs it applies to:
+
+    {
+        "name": "Shop category pages",
+        "match": {"domains": ["shop.example"], "patterns": ["^https?://(www\\.)?shop\\.example/c/"]},
+        "baseSelector": "...",
+        "fields": [{"name": "title", "selector": "h2", "type": "text"}, ...]
+    }
+
+A URL matches a domain when its host is the domain or a subdomain of it, and a
+pattern when the regular expression is found in the full URL. Pattern matches win
+over domain matches, and more specific (longer) domains over shorter ones.
+"""
+import glob
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+
+def crawl_schema(schema: dict) -> dict:
+    """The schema as JsonCssExtractionStrategy expects it (registry metadata removed)."""
+    return {key: value for key, value in schema.items() if key != "match"}
+
+
+class SchemaRegistry:
+    def __init__(self, schemas_dir: str = SCHEMAS_DIR):
+        self.schemas_dir = schemas_dir
+        self.schemas: Dict[str, dict] = {}
+        self._patterns: Dict[str, List[re.Pattern]] = {}
+        for path in sorted(glob.glob(os.path.join(schemas_dir, "*.json"))):
+            self._load(path)
+
+    def _load(self, path: str) -> None:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            schema = json.load(f)
+        if not schema.get("baseSelector") or not isinstance(schema.get("fields"), list):
+            raise ValueError(f"Schema {path} needs a baseSelector and a fields list")
+        match = schema.get("match") or {}
+        try:
+            self._patterns[name] = [re.compile(pattern) for pattern in match.get("patterns", [])]
+        except re.error as e:
+            raise ValueError(f"Schema {path} has an invalid URL pattern: {e}") from e
+        schema["match"] = {"domains": [d.lower().lstrip(".") for d in match.get("domains", [])],
+                           "patterns": match.get("patterns", [])}
+        self.schemas[name] = schema
+
+    def names(self) -> List[str]:
+        return list(self.schemas)
+
+    def get(self, name: str) -> dict:
+        if name not in self.schemas:
+            raise KeyError(f"Unknown schema '{name}' (available: {', '.join(self.schemas) or 'none'})")
+        return self.schemas[name]
+
+    def match(self, url: str) -> Optional[Tuple[str, dict]]:
+        """(name, schema) of the best schema for `url`, or None."""
+        host = (urlparse(url).hostname or "").lower()
+        best, best_score = None, None
+        for name, schema in self.schemas.items():
+            if any(pattern.search(url) for pattern in self._patterns[name]):
+                score = (2, 0)
+            else:
+                domains = [d for d in schema["match"]["domains"] if host == d or host.endswith("." + d)]
+                if not domains:
+                    continue
+                score = (1, max(len(d) for d in domains))
+            if best_score is None or score > best_score:
+                best, best_score = name, score
+        return (best, self.schemas[best]) if best is not None else None
+
+
+def group_by_schema(urls, registry: SchemaRegistry, schema_name: str = None):
+    """
+    ({schema name: [(index, url)]}, unmatched URLs) for de-duplicated `urls`, indexed from 1
+    in input order; `schema_name` forces one schema for every URL.
+    """
+    groups, unmatched = {}, []
+    for index, url in enumerate(dict.fromkeys(urls), start=1):
+        matched = (schema_name, registry.get(schema_name)) if schema_name else registry.match(url)
+        if matched is None:
+            unmatched.append(url)
+        else:
+            groups.setdefault(matched[0], []).append((index, url))
+    return groups, unmatched
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry() -> SchemaRegistry:
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = SchemaRegistry()
+        return _default_registry
@@ -0,0 +1,352 @@
+"""
+Scrape runs on a background thread.
+
+The Streamlit script starts a ScrapeJob, keeps it in st.session_state and polls
+snapshot() from a periodically refreshing fragment, so widget interactions rerun
+the script without blocking on, restarting or losing the scrape. The job does
+what the app used to do inline: the pipeline (or the attended-mode browser for the
+first page), pagination detection and follow-through, the output sink and the
+final CSV/Excel export. It never touches Streamlit; API keys captured from the
+sidebar are installed on the job's threads with api_management.use_api_keys.
+
+Listings go to the output sink only: the job keeps counters plus the latest
+JOB_LIVE_ROWS rows and JOB_LIVE_PAGES page statuses for the live view, so its
+memory stays flat however many pages a run scrapes. Results are read back from
+the sink files.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from api_management import use_api_keys
+from assets import JOB_LIVE_PAGES, JOB_LIVE_ROWS, PAGINATION_MAX_PAGES
+from budget_governor import BudgetGovernor
+from content_reducer import ContentReducer
+from output_sink import META_COLUMNS, OutputSink, export_csv, export_excel, iter_rows
+from pagination_detector import detect_pagination_elements
+from pipeline import follow_pagination, run_pipeline
+from scraper import (
+    calculate_price,
+    create_dynamic_listing_model,
+    create_listings_container_model,
+    extract_listings,
+    fetch_html_selenium,
+    html_to_markdown_with_readability,
+    listing_key,
+    listings_of,
+    save_formatted_data,
+    save_raw_data,
+)
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ScrapeJob:
+    def __init__(
+        self,
+        urls: List[str],
+        fields: List[str],
+        selected_model: str,
+        output_folder: str,
+        extract: bool = True,
+        focus_listings: bool = False,
+        chunked: bool = False,
+        use_pagination: bool = False,
+        pagination_details: str = "",
+        follow_pages: bool = False,
+        max_pages: int = PAGINATION_MAX_PAGES,
+        driver=None,
+        api_keys: Optional[Dict[str, str]] = None,
+        governor: Optional[BudgetGovernor] = None,
+    ):
+        self.id = uuid.uuid4().hex[:8]
+        self.urls = list(urls)
+        self.fields = list(fields)
+        self.selected_model = selected_model
+        self.output_folder = output_folder
+        self.extract = extract
+        self.focus_listings = focus_listings
+        self.chunked = chunked
+        self.use_pagination = use_pagination
+        self.pagination_details = pagination_details
+        self.follow_pages = follow_pages
+        self.max_pages = max_pages
+        self.driver = driver  # attended mode: the user's browser, quit when the job ends
+        self.api_keys = dict(api_keys or {})
+        self.governor = governor  # spend / token limits shared by every extraction of the run
+        self.reducer = ContentReducer()  # repeated-block memory of this run only
+
+        self.status = "pending"
+        self.error = None
+        self.results = None
+        self.page_loads = []
+        self.reductions = []
+        self.pagination_info = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._stages: Dict[int, Dict] = {}
+        self._pages: "OrderedDict[int, Dict]" = OrderedDict()  # latest finished pages, without their listings
+        self._rows = deque(maxlen=JOB_LIVE_ROWS)
+        self._totals = {"input_tokens": 0, "output_tokens": 0, "cost": 0.0, "cache_hits": 0, "schema_hits": 0,
+                        "pages": 0, "listings": 0}
+        self._thread = threading.Thread(target=self._run, name=f"scrape-job-{self.id}", daemon=True)
+
+    # -- control ---------------------------------------------------------------
+
+    def start(self) -> "ScrapeJob":
+        self.started_at = time.time()
+        self.status = "running"
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        """Stop after the pages in flight; queued pages are dropped."""
+        self._cancelled.set()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def snapshot(self) -> Dict:
+        """Copy of the live state for rendering: per-URL stages, latest pages and rows, running totals."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "elapsed": (self.finished_at or time.time()) - (self.started_at or time.time()),
+                "total": len(self.urls),
+                "stages": {index: dict(stage) for index, stage in self._stages.items()},
+                "pages": [dict(self._pages[index]) for index in sorted(self._pages)],
+                "rows": list(self._rows),
+                "totals": dict(self._totals),
+                "budget": self.governor.stats() if self.governor is not None else None,
+            }
+
+    # -- bookkeeping -------------------------------------------------------------
+
+    def _check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def _stage(self, index: int, url: str, stage: str) -> None:
+        with self._lock:
+            self._stages[index] = {"url": url, "stage": stage}
+
+    def _page_done(self, index: int, url: str, listings=None, input_tokens=0, output_tokens=0, cost=0.0,
+                   cached=False, css_schema=False, error=None, partial=False) -> None:
+        listings = listings or []
+        with self._lock:
+            self._pages[index] = {"index": index, "url": url, "listings": len(listings), "cost": cost,
+                                  "cached": cached, "css_schema": css_schema, "error": error, "partial": partial}
+            self._pages.move_to_end(index)
+            while len(self._pages) > JOB_LIVE_PAGES:
+                self._pages.popitem(last=False)
+            self._rows.extend({"_page": index, **listing} for listing in listings[-JOB_LIVE_ROWS:])
+            self._totals["pages"] += 1
+            self._totals["listings"] += len(listings)
+            self._totals["input_tokens"] += input_tokens
+            self._totals["output_tokens"] += output_tokens
+            self._totals["cost"] += cost
+            self._totals["cache_hits"] += int(cached)
+            self._totals["schema_hits"] += int(css_schema)
+
+    def _initialize_thread(self) -> None:
+        use_api_keys(self.api_keys)
+
+    # -- the run -----------------------------------------------------------------
+
+    def _run(self) -> None:
+        # Whatever fails, including the final export, the job ends in a terminal status
+        status = "failed"
+        try:
+            self._initialize_thread()
+            # Listings are streamed to JSONL/Parquet as pages finish; CSV and Excel are built once at the end
+            sink = OutputSink(self.output_folder, self.fields) if self.extract else None
+            try:
+                if self.driver is not None:
+                    self._scrape_attended(sink)
+                else:
+                    self._scrape_pipeline(sink)
+                if self.follow_pages and self.extract and self.pagination_info and self.pagination_info["page_urls"]:
+                    self._follow(sink)
+                status = "completed"
+            except JobCancelled:
+                status = "cancelled"
+            except Exception as e:
+                self.error = f"{e}\n{traceback.format_exc()}"
+            finally:
+                if self.driver is not None:
+                    self.driver.quit()
+            # Failed and cancelled runs still export the pages that finished
+            self._collect_results(sink)
+        except Exception as e:
+            status = "failed"
+            self.error = (self.error or "") + f"{e}\n{traceback.format_exc()}"
+        finally:
+            with self._lock:
+                self.finished_at = time.time()
+                self.status = status
+
+    def _collect_results(self, sink: Optional[OutputSink]) -> None:
+        listing_files = {}
+        if sink is not None:
+            sink.close()
+            listing_files = {
+                "csv": export_csv(sink.jsonl_path),
+                "xlsx": export_excel(sink.jsonl_path),
+                "jsonl": sink.jsonl_path,
+                "parquet": sink.parquet_path,
+            }
+        totals = self.snapshot()["totals"]
+        self.results = {
+            'pages': totals['pages'],
+            'listings': totals['listings'],
+            'input_tokens': totals['input_tokens'],
+            'output_tokens': totals['output_tokens'],
+            'total_cost': totals['cost'],
+            'output_folder': self.output_folder,
+            'pagination_info': self.pagination_info,
+            'page_loads': self.page_loads,
+            'reductions': self.reductions,
+            'cache_hits': totals['cache_hits'],
+            'schema_hits': totals['schema_hits'],
+            'listing_files': listing_files,
+            'budget': self.governor.stats() if self.governor is not None else None,
+        }
+
+    def _detect_pagination(self, url: str, markdown: str, html: str) -> None:
+        detection_stats = {}
+        pagination_data, token_counts, pagination_price = detect_pagination_elements(
+            url, self.pagination_details, self.selected_model, markdown, html=html, stats=detection_stats,
+            governor=self.governor,
+        )
+        if isinstance(pagination_data, dict):
+            page_urls = pagination_data.get("page_urls", [])
+        else:
+            page_urls = pagination_data.page_urls
+        self.pagination_info = {
+            "page_urls": page_urls,
+            "token_counts": token_counts,
+            "price": pagination_price,
+            "detection": detection_stats,
+        }
+
+    def _scrape_attended(self, sink: Optional[OutputSink]) -> None:
+        self._stage(1, self.urls[0], "fetching")
+        load_stats = {}
+        raw_html = fetch_html_selenium(self.urls[0], attended_mode=True, driver=self.driver, stats=load_stats)
+        current_url = self.driver.current_url  # the page the user navigated to
+        self.page_loads.append({"url": current_url, **load_stats})
+        markdown = html_to_markdown_with_readability(raw_html, base_url=current_url)
+        save_raw_data(markdown, self.output_folder, 'rawData_1.md')
+
+        if self.use_pagination:
+            self._detect_pagination(current_url, markdown, raw_html)
+        if not self.extract:
+            self._stage(1, current_url, "done")
+            return
+
+        self._stage(1, current_url, "extracting")
+        DynamicListingModel = create_dynamic_listing_model(self.fields)
+        DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
+        reduced, reduction = self.reducer.reduce(
+            markdown, current_url, focus_listings=self.focus_listings, model=self.selected_model
+        )
+        self.reductions.append(reduction)
+        formatted_data, token_counts, cached = extract_listings(
+            reduced, self.fields, DynamicListingsContainer, DynamicListingModel, self.selected_model,
+            chunked=self.chunked, url=current_url, governor=self.governor, source_markdown=markdown,
+            focus_listings=self.focus_listings
+        )
+        input_tokens, output_tokens, cost = calculate_price(token_counts, self.selected_model)
+        save_formatted_data(formatted_data, self.output_folder, 'sorted_data_1.json')
+        listings = listings_of(formatted_data)
+        sink.write(1, current_url, listings)
+        self._page_done(1, current_url, listings, input_tokens, output_tokens, cost, cached=cached,
+                        partial=bool(token_counts.get("partial")))
+        self._stage(1, current_url, "done")
+
+    def _scrape_pipeline(self, sink: Optional[OutputSink]) -> None:
+        # Fetch and LLM extraction run on separate bounded pools; results stream in per URL
+        for item in run_pipeline(
+            self.urls,
+            self.fields,
+            self.selected_model,
+            self.output_folder,
+            extract=self.extract,
+            focus_listings=self.focus_listings,
+            chunked=self.chunked,
+            on_progress=self._stage,
+            thread_initializer=self._initialize_thread,
+            governor=self.governor,
+            reducer=self.reducer,
+        ):
+            self._check_cancelled()
+            i, url = item['index'], item['url']
+            if item.get('load_stats'):
+                self.page_loads.append({"url": url, **item['load_stats']})
+            if item.get('reduction'):
+                self.reductions.append(item['reduction'])
+            if item.get('error'):
+                self._page_done(i, url, None, error=item['error'])
+                continue
+
+            if self.use_pagination and i == 1:
+                self._detect_pagination(url, item['markdown'], item['html'])
+            listings = listings_of(item['formatted_data']) if self.extract else None
+            if self.extract:
+                sink.write(i, url, listings)
+            self._page_done(i, url, listings, item['input_tokens'], item['output_tokens'], item['cost'],
+                            cached=item.get('cached', False), css_schema=item.get('css_schema', False),
+                            partial=item.get('partial', False))
+
+    def _follow(self, sink: OutputSink) -> None:
+        # Detected pages go through the same pipeline; their listings join the first page's result set
+        seen_keys = {listing_key({k: v for k, v in row.items() if k not in META_COLUMNS})
+                     for row in iter_rows(sink.jsonl_path)}
+        first_url = self.driver.current_url if self.driver is not None else self.urls[0]
+        page_urls = [u for u in self.pagination_info['page_urls'] if u != first_url]
+        followed = []
+        self.pagination_info['followed'] = followed
+        for item in follow_pagination(
+            page_urls,
+            self.fields,
+            self.selected_model,
+            self.output_folder,
+            seen_keys,
+            max_pages=self.max_pages,
+            focus_listings=self.focus_listings,
+            chunked=self.chunked,
+            on_progress=self._stage,
+            thread_initializer=self._initialize_thread,
+            governor=self.governor,
+            reducer=self.reducer,
+        ):
+            i, url = item['index'], item['url']
+            if item.get('load_stats'):
+                self.page_loads.append({"url": url, **item['load_stats']})
+            if item.get('reduction'):
+                self.reductions.append(item['reduction'])
+            page = {"page": i, "url": url, "new_listings": len(item['new_listings']), "cost": item.get('cost', 0.0)}
+            if item.get('error'):
+                page["error"] = item['error']
+                self._page_done(i, url, None, error=item['error'])
+            else:
+                sink.write(i, url, item['new_listings'])
+                self._page_done(i, url, item['new_listings'], item['input_tokens'],
+                                item['output_tokens'], item['cost'], cached=item.get('cached', False),
+                                css_schema=item.get('css_schema', False), partial=item.get('partial', False))
+            followed.append(page)
+            if item.get('stop_reason'):
+                self.pagination_info['stop_reason'] = item['stop_reason']
+            self._check_cancelled()
@@ -1,124 +1,124 @@
+import logging
 import os
-import random
 import time
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Type
 
 import pandas as pd
-from bs4 import BeautifulSoup
 from pydantic import BaseModel, Field, create_model
-import html2text
-import tiktoken
-import streamlit as st
 
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
 
-from openai import OpenAI
-import google.generativeai as genai
-
-from api_management import get_api_key
-from assets import USER_AGENTS,PRICING,HEADLESS_OPTIONS,SYSTEM_MESSAGE,USER_MESSAGE,LLAMA_MODEL_FULLNAME,GROQ_LLAMA_MODEL_FULLNAME,HEADLESS_OPTIONS_DOCKER
+from assets import USER_AGENTS,PRICING,SYSTEM_MESSAGE,USER_MESSAGE,GROQ_LLAMA_MODEL_FULLNAME,MAX_INPUT_TOKENS,EXPECTED_OUTPUT_TOKENS
+from assets import EXTRACT_CHUNK_TOKENS,EXTRACT_CHUNK_WORKERS,CHUNK_BORDER_LISTINGS
+from assets import NUMBER_SCROLL,SCROLL_MAX_WAIT,SCROLL_POLL_INTERVAL,SCROLL_STABLE_POLLS
+from token_budget import count_tokens, estimate_cost, split_to_budget, truncate_to_budget
+from driver_pool import create_driver, get_default_pool
+from markdown_converter import html_to_markdown
+from llm_providers import get_provider
+from llm_json import parse_llm_json
+from extraction_cache import extraction_variant, get_default_cache
+from css_schema import get_default_schema_store
+from budget_governor import BudgetExceeded
 load_dotenv()
 
 
-# Set up the Chrome WebDriver options
-
-
-def is_running_in_docker():
-    """
-    Detect if the app is running inside a Docker container.
-    This checks if the '/proc/1/cgroup' file contains 'docker'.
-    """
-    try:
-        with open("/proc/1/cgroup", "rt") as file:
-            return "docker" in file.read()
-    except Exception:
-        return False
-
 def setup_selenium(attended_mode=False):
-    options = Options()
-    service = Service(ChromeDriverManager().install())
-
-    # Apply headless options based on whether the code is running in Docker
-    if is_running_in_docker():
-        # Running inside Docker, use Docker-specific headless options
-        for option in HEADLESS_OPTIONS_DOCKER:
-            options.add_argument(option)
-    else:
-        # Not running inside Docker, use the normal headless options
-        for option in HEADLESS_OPTIONS:
-            options.add_argument(option)
+    """Create a dedicated driver (attended mode); unattended fetches use the shared pool."""
+    return create_driver()
 
-    # Initialize the WebDriver
-    driver = webdriver.Chrome(service=service, options=options)
-    return driver
 
+_PAGE_STATE_JS = """
+return [
+    document.body ? document.body.scrollHeight : 0,
+    document.getElementsByTagName('*').length,
+    performance.getEntriesByType('resource').length,
+    document.readyState
+];
+"""
 
 
-
-def fetch_html_selenium(url, attended_mode=False, driver=None):
+def scroll_until_stable(driver, max_scrolls=NUMBER_SCROLL, max_wait=SCROLL_MAX_WAIT,
+                        poll_interval=SCROLL_POLL_INTERVAL, stable_polls=SCROLL_STABLE_POLLS):
+    """
+    Scroll to the bottom while the page keeps growing, and return once the scroll height,
+    DOM node count and number of network requests stop changing (or max_wait is reached).
+    At most `max_scrolls` scrolls are performed.
+    """
+    started = time.perf_counter()
+    deadline = started + max_wait
+    scrolls = 0
+    stable = 0
+    reason = "timeout"
+    last_state = driver.execute_script(_PAGE_STATE_JS)
+    scrolled_height = None
+
+    while time.perf_counter() < deadline:
+        height = last_state[0]
+        if scrolls < max_scrolls and height != scrolled_height:
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            scrolled_height = height
+            scrolls += 1
+        time.sleep(poll_interval)
+
+        state = driver.execute_script(_PAGE_STATE_JS)
+        if state[:3] == last_state[:3] and state[3] == "complete":
+            stable += 1
+            if stable >= stable_polls:
+                reason = "stable"
+                break
+        else:
+            stable = 0
+        last_state = state
+
+    return {
+        "settle_seconds": round(time.perf_counter() - started, 3),
+        "scrolls": scrolls,
+        "reason": reason,
+        "dom_nodes": last_state[1],
+    }
+
+
+def fetch_html_selenium(url, attended_mode=False, driver=None, stats=None):
+    """
+    Load `url` and return its HTML. When `stats` is a dict it receives the page load
+    measurements (load_seconds, scrolls, reason, dom_nodes).
+    """
     if driver is None:
-        driver = setup_selenium(attended_mode)
-        should_quit = True
-        if not attended_mode:
-            driver.get(url)
+        # Borrow a browser from the shared pool instead of launching Chrome per URL
+        with get_default_pool().driver() as pooled_driver:
+            return fetch_html_selenium(url, attended_mode=attended_mode, driver=pooled_driver, stats=stats)
+
+    started = time.perf_counter()
+    # Do not navigate to the URL if in attended mode and driver is already initialized
+    if not attended_mode:
+        driver.get(url)
+        # Scroll until lazy-loaded content stops arriving instead of fixed random sleeps
+        load_stats = scroll_until_stable(driver)
     else:
-        should_quit = False
-        # Do not navigate to the URL if in attended mode and driver is already initialized
-        if not attended_mode:
-            driver.get(url)
+        load_stats = {"scrolls": 0, "reason": "attended"}
+    # Get the page source from the current page
+    html = driver.page_source
+    load_stats["load_seconds"] = round(time.perf_counter() - started, 3)
+    logging.info(f"Loaded {url} in {load_stats['load_seconds']}s ({load_stats['reason']}, {load_stats['scrolls']} scrolls)")
+    if stats is not None:
+        stats.update(load_stats)
+    return html
 
-    try:
-        if not attended_mode:
-            # Add more realistic actions like scrolling
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-            time.sleep(random.uniform(1.1, 1.8))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/1.2);")
-            time.sleep(random.uniform(1.1, 1.8))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/1);")
-            time.sleep(random.uniform(1.1, 1.8))
-        # Get the page source from the current page
-        html = driver.page_source
-        return html
-    finally:
-        if should_quit:
-            driver.quit()
-
-
-
-
-def clean_html(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Remove headers and footers based on common HTML tags or classes
-    for element in soup.find_all(['header', 'footer']):
-        element.decompose()  # Remove these tags and their content
 
-    return str(soup)
 
 
-def html_to_markdown_with_readability(html_content):
-
-    
-    cleaned_html = clean_html(html_content)  
-    
-    # Convert to markdown
-    markdown_converter = html2text.HTML2Text()
-    markdown_converter.ignore_links = False
-    markdown_content = markdown_converter.handle(cleaned_html)
-    
-    return markdown_content
+def html_to_markdown_with_readability(html_content, base_url=None):
+    # Single lxml pass: drops header/footer, keeps the main content region
+    return html_to_markdown(html_content, base_url=base_url)
 
 
     
@@ -153,12 +153,13 @@ def create_listings_container_model(listing_model: Type[BaseModel]) -> Type[Base
 
 
 def trim_to_token_limit(text, model, max_tokens=120000):
-    encoder = tiktoken.encoding_for_model(model)
-    tokens = encoder.encode(text)
-    if len(tokens) > max_tokens:
-        trimmed_text = encoder.decode(tokens[:max_tokens])
-        return trimmed_text
-    return text
+    return truncate_to_budget(text, max_tokens, model)
+
+
+def estimate_request_cost(data: str, selected_model: str) -> float:
+    """Estimate the cost of extracting `data` before the request is sent."""
+    input_tokens = count_tokens(SYSTEM_MESSAGE + USER_MESSAGE + data, selected_model, exact=False)
+    return estimate_cost(input_tokens, EXPECTED_OUTPUT_TOKENS, PRICING[selected_model])
 
 def generate_system_message(listing_model: BaseModel) -> str:
     """
@@ -198,125 +199,184 @@ def generate_system_message(listing_model: BaseModel) -> str:
 
 
 
-def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_model):
-    token_counts = {}
-    
-    if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
-        # Use OpenAI API
-        client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
-        completion = client.beta.chat.completions.parse(
-            model=selected_model,
-            messages=[
-                {"role": "system", "content": SYSTEM_MESSAGE},
-                {"role": "user", "content": USER_MESSAGE + data},
-            ],
-            response_format=DynamicListingsContainer
-        )
-        # Calculate tokens using tiktoken
-        encoder = tiktoken.encoding_for_model(selected_model)
-        input_token_count = len(encoder.encode(USER_MESSAGE + data))
-        output_token_count = len(encoder.encode(json.dumps(completion.choices[0].message.parsed.dict())))
-        token_counts = {
-            "input_tokens": input_token_count,
-            "output_tokens": output_token_count
-        }
-        return completion.choices[0].message.parsed, token_counts
-
-    elif selected_model == "gemini-1.5-flash":
-        # Use Google Gemini API
-        genai.configure(api_key=get_api_key("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel('gemini-1.5-flash',
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "response_schema": DynamicListingsContainer
-                })
-        prompt = SYSTEM_MESSAGE + "\n" + USER_MESSAGE + data
-        # Count input tokens using Gemini's method
-        input_tokens = model.count_tokens(prompt)
-        completion = model.generate_content(prompt)
-        # Extract token counts from usage_metadata
-        usage_metadata = completion.usage_metadata
-        token_counts = {
-            "input_tokens": usage_metadata.prompt_token_count,
-            "output_tokens": usage_metadata.candidates_token_count
-        }
-        return completion.text, token_counts
-    
-    elif selected_model == "Llama3.1 8B":
-
-        # Dynamically generate the system message based on the schema
-        sys_message = generate_system_message(DynamicListingModel)
-        # print(SYSTEM_MESSAGE)
-        # Point to the local server
-        client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
-
-        completion = client.chat.completions.create(
-            model=LLAMA_MODEL_FULLNAME, #change this if needed (use a better model)
-            messages=[
-                {"role": "system", "content": sys_message},
-                {"role": "user", "content": USER_MESSAGE + data}
-            ],
-            temperature=0.7,
-            
-        )
+def listings_of(formatted_data) -> List[dict]:
+    """The `listings` array of one extraction result (parsed model, dict or JSON string)."""
+    if isinstance(formatted_data, str):
+        formatted_data = parse_llm_json(formatted_data)
+    if hasattr(formatted_data, 'dict'):
+        formatted_data = formatted_data.dict()
+    if isinstance(formatted_data, dict):
+        listings = formatted_data.get('listings', [])
+    else:
+        listings = formatted_data or []
+    return [item.dict() if hasattr(item, 'dict') else item for item in listings]
 
-        # Extract the content from the response
-        response_content = completion.choices[0].message.content
-        print(response_content)
-        # Convert the content from JSON string to a Python dictionary
-        parsed_response = json.loads(response_content)
-        
-        # Extract token usage
-        token_counts = {
-            "input_tokens": completion.usage.prompt_tokens,
-            "output_tokens": completion.usage.completion_tokens
-        }
-
-        return parsed_response, token_counts
-    # elif selected_model== "Groq Llama3.1 70b":
-        
-    #     # Dynamically generate the system message based on the schema
-    #     sys_message = generate_system_message(DynamicListingModel)
-    #     # print(SYSTEM_MESSAGE)
-    #     # Point to the local server
-    #     client = Groq(api_key=get_api_key("GROQ_API_KEY"),)
-
-    #     completion = client.chat.completions.create(
-    #     messages=[
-    #         {"role": "system","content": sys_message},
-    #         {"role": "user","content": USER_MESSAGE + data}
-    #     ],
-    #     model=GROQ_LLAMA_MODEL_FULLNAME,
-    # )
-
-        # Extract the content from the response
-        response_content = completion.choices[0].message.content
-        
-        # Convert the content from JSON string to a Python dictionary
-        parsed_response = json.loads(response_content)
-        
-        # completion.usage
-        token_counts = {
-            "input_tokens": completion.usage.prompt_tokens,
-            "output_tokens": completion.usage.completion_tokens
-        }
 
-        return parsed_response, token_counts
-    else:
-        raise ValueError(f"Unsupported model: {selected_model}")
+def _normalized(value) -> str:
+    return re.sub(r'\s+', ' ', str(value)).strip().lower() if value is not None else ""
+
+
+def listing_key(item: dict) -> tuple:
+    """Identity of a listing for de-duplication: its normalized field values."""
+    return tuple(sorted((k, _normalized(v)) for k, v in item.items()))
+
+
+def _same_listing(a: dict, b: dict) -> bool:
+    """True when the fields both listings have filled in agree (one may be a cut-off copy of the other)."""
+    shared = [k for k in a.keys() & b.keys() if _normalized(a[k]) and _normalized(b[k])]
+    return bool(shared) and all(_normalized(a[k]) == _normalized(b[k]) for k in shared)
+
+
+def merge_listings(chunk_listings: List[List[dict]], border: int = CHUNK_BORDER_LISTINGS) -> List[dict]:
+    """
+    Concatenate per-chunk listings in page order. The chunks overlap, so an item near a
+    border is extracted from both sides, possibly cut off on one: the first `border`
+    listings of a chunk are merged into a matching one among the last `border` listings
+    of the previous chunk (same filled fields, or identical). Identical listings elsewhere
+    on the page are kept; they can be genuinely distinct items.
+    """
+    merged: List[dict] = []
+    previous_start = 0
+    for listings in chunk_listings:
+        boundary = len(merged)
+        window = merged[max(previous_start, boundary - border):boundary]
+        for position, item in enumerate(listings):
+            if position < border:
+                key = listing_key(item)
+                match = next((m for m in window if listing_key(m) == key or _same_listing(m, item)), None)
+                if match is not None:
+                    window = [m for m in window if m is not match]  # each absorbs at most one copy
+                    match.update({k: v for k, v in item.items() if _normalized(v) and not _normalized(match.get(k))})
+                    continue
+            merged.append(dict(item))
+        previous_start = boundary
+    return merged
+
+
+def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_model, chunked=False, governor=None):
+    """
+    Extract listings from the page Markdown `data`.
+
+    Pages that do not fit the model's input budget (every page when `chunked`) are split
+    into token-bounded chunks on structural boundaries instead of being truncated; chunks
+    are extracted concurrently and their listings merged, with token counts summed.
+    With a budget `governor` every chunk reserves its estimated cost first (and may be sent
+    to a cheaper model); token_counts then also carry the actual "cost" and the "model" used.
+    When some chunks fail, the others' listings and usage are still returned, with
+    token_counts["partial"] set; only when every chunk fails is the first error raised.
+    A failed chunk whose response was billed (LLMOutputError with token_counts) is committed
+    to the governor at its actual usage and counted in the totals; only requests that never
+    got a response release their reservation.
+    """
+    budget = MAX_INPUT_TOKENS[selected_model] - count_tokens(SYSTEM_MESSAGE + USER_MESSAGE, selected_model)
+    chunk_tokens = min(EXTRACT_CHUNK_TOKENS, budget) if chunked else budget
+    # Carry no more lines across a border than merge_listings checks there
+    chunks = split_to_budget(data, chunk_tokens, selected_model, overlap=CHUNK_BORDER_LISTINGS) or [""]
+    estimated = sum(estimate_request_cost(chunk, selected_model) for chunk in chunks)
+    logging.info(f"Estimated cost for {selected_model}: ${estimated:.4f} ({len(chunks)} chunk(s))")
+
+    # Long-lived providers, looked up on the calling thread (API keys come from the Streamlit session)
+    models = governor.models_for(selected_model) if governor is not None else [selected_model]
+    providers = {model: get_provider(model) for model in models}
+
+    def extract_chunk(chunk):
+        if governor is None:
+            return format_chunk(chunk, DynamicListingsContainer, DynamicListingModel, providers[selected_model])
+        reservation = governor.reserve(selected_model, count_tokens(SYSTEM_MESSAGE + USER_MESSAGE + chunk, selected_model))
+        if reservation.downgraded:
+            logging.warning(f"Budget running low: sending chunk to {reservation.model} instead of {selected_model}")
+        try:
+            formatted, counts = format_chunk(chunk, DynamicListingsContainer, DynamicListingModel, providers[reservation.model])
+        except Exception as e:
+            billed = getattr(e, "token_counts", None)
+            if billed is None:
+                governor.release(reservation)
+            else:
+                e.token_counts = {**billed, "cost": governor.commit(reservation, billed), "model": reservation.model}
+            raise
+        return formatted, {**counts, "cost": governor.commit(reservation, counts), "model": reservation.model}
+
+    if len(chunks) == 1:
+        return extract_chunk(chunks[0])
+
+    with ThreadPoolExecutor(min(EXTRACT_CHUNK_WORKERS, len(chunks)), thread_name_prefix="chunk") as pool:
+        futures = [pool.submit(extract_chunk, chunk) for chunk in chunks]
+    # Chunks that finished were paid for: keep their results (and cost) when another chunk fails
+    results, errors = [], []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if not results:
+        raise errors[0]
+    listings = merge_listings([listings_of(formatted) for formatted, _ in results])
+    # Failed chunks whose responses were billed count towards the page's usage too
+    usage = [counts for _, counts in results] + [e.token_counts for e in errors if getattr(e, "token_counts", None)]
+    token_counts = {
+        "input_tokens": sum(counts["input_tokens"] for counts in usage),
+        "output_tokens": sum(counts["output_tokens"] for counts in usage)
+    }
+    if governor is not None:
+        used = {counts["model"] for counts in usage}
+        token_counts["cost"] = sum(counts["cost"] for counts in usage)
+        token_counts["model"] = used.pop() if len(used) == 1 else "mixed"
+    if errors:
+        token_counts["partial"] = True
+        logging.warning(f"{len(errors)} of {len(chunks)} chunks failed, page is partial: {errors[0]}")
+    logging.info(f"Merged {sum(len(listings_of(f)) for f, _ in results)} chunk listings into {len(listings)}")
+    return {"listings": listings}, token_counts
+
+
+def extract_listings(markdown, fields, DynamicListingsContainer, DynamicListingModel, selected_model,
+                     chunked=False, url=None, governor=None, source_markdown=None, focus_listings=False):
+    """
+    format_data behind the extraction cache. Returns (formatted_data, token_counts, cached);
+    cached results report zero tokens, so they add nothing to calculate_price totals.
+    `markdown` is what the LLM gets; entries are keyed by the page's `source_markdown` (before
+    content reduction, with `focus_listings`) when given, plus the prompt and `chunked` settings.
+    Results a budget governor downgraded to another model are not cached under `selected_model`.
+    """
+    cache = get_default_cache()
+    key_markdown = source_markdown if source_markdown is not None else markdown
+    variant = extraction_variant(system_message_for(get_provider(selected_model), DynamicListingModel),
+                                 chunked, focus_listings)
+    cached = cache.get(key_markdown, fields, selected_model, variant)
+    if cached is not None:
+        print(f"Extraction cache hit for {url or 'page'}")
+        return cached[0], {"input_tokens": 0, "output_tokens": 0}, True
 
+    formatted_data, token_counts = format_data(
+        markdown, DynamicListingsContainer, DynamicListingModel, selected_model, chunked, governor
+    )
+    # Partial (some chunks failed) and downgraded results are not cached under `selected_model`
+    if token_counts.get("model", selected_model) == selected_model and not token_counts.get("partial"):
+        cache.put(key_markdown, fields, selected_model, formatted_data, token_counts, url=url, variant=variant)
+    return formatted_data, token_counts, False
 
 
-def save_formatted_data(formatted_data, output_folder: str, json_file_name: str, excel_file_name: str):
-    """Save formatted data as JSON and Excel in the specified output folder."""
+def system_message_for(provider, DynamicListingModel) -> str:
+    # Local / OpenAI-compatible servers cannot enforce a schema: describe it in the system message
+    return generate_system_message(DynamicListingModel) if provider.schema_in_prompt else SYSTEM_MESSAGE
+
+
+def format_chunk(data, DynamicListingsContainer, DynamicListingModel, provider):
+    system_message = system_message_for(provider, DynamicListingModel)
+    result = provider.complete(system_message, USER_MESSAGE + data, DynamicListingsContainer)
+    return result.data, result.token_counts
+
+
+
+def save_formatted_data(formatted_data, output_folder: str, json_file_name: str, excel_file_name: str = None):
+    """
+    Save one page's formatted data as JSON in the specified output folder. Excel is only
+    written when `excel_file_name` is given; combined Excel/CSV for a run come from output_sink.
+    """
     os.makedirs(output_folder, exist_ok=True)
     
-    # Parse the formatted data if it's a JSON string (from Gemini API)
+    # Providers return parsed models; strings only come from older callers
     if isinstance(formatted_data, str):
-        try:
-            formatted_data_dict = json.loads(formatted_data)
-        except json.JSONDecodeError:
-            raise ValueError("The provided formatted data is a string but not valid JSON.")
+        formatted_data_dict = parse_llm_json(formatted_data)
     else:
         # Handle data from OpenAI or other sources
         formatted_data_dict = formatted_data.dict() if hasattr(formatted_data, 'dict') else formatted_data
@@ -327,6 +387,9 @@ def save_formatted_data(formatted_data, output_folder: str, json_file_name: str,
         json.dump(formatted_data_dict, f, indent=4)
     print(f"Formatted data saved to JSON at {json_output_path}")
 
+    if excel_file_name is None:
+        return formatted_data_dict
+
     # Prepare data for DataFrame
     if isinstance(formatted_data_dict, dict):
         # If the data is a dictionary containing lists, assume these lists are records
@@ -355,6 +418,10 @@ def calculate_price(token_counts, model):
     input_token_count = token_counts.get("input_tokens", 0)
     output_token_count = token_counts.get("output_tokens", 0)
     
+    if "cost" in token_counts:
+        # Priced by the budget governor, per request and model actually used
+        return input_token_count, output_token_count, token_counts["cost"]
+
     # Calculate the costs
     input_cost = input_token_count * PRICING[model]["input"]
     output_cost = output_token_count * PRICING[model]["output"]
@@ -369,28 +436,59 @@ def generate_unique_folder_name(url):
     return f"{url_name}_{timestamp}"
 
 
-def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, markdown: str):
-    """Scrape a single URL and save the results."""
+def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, markdown: str,
+               chunked: bool = False, stats: dict = None, html: str = None, governor=None, reduced: str = None,
+               focus_listings: bool = False):
+    """
+    Scrape a single URL and save the results. rawData_N.md keeps the full page `markdown`;
+    the LLM gets the `reduced` Markdown when given. `stats['cached']` tells whether the extraction
+    cache answered, `stats['css_schema']` whether a learned CSS schema did (needs `html`),
+    `stats['budget_exceeded']` whether the budget `governor` refused the extraction and
+    `stats['partial']` whether some chunks of the page failed.
+    """
     try:
         # Save raw data
         save_raw_data(markdown, output_folder, f'rawData_{file_number}.md')
 
+        # Pages of a template seen before are extracted with its learned CSS schema, without the LLM
+        schema_store = get_default_schema_store()
+        listings = schema_store.extract(url, fields, html) if html else None
+        if stats is not None:
+            stats["css_schema"] = listings is not None
+        if listings is not None:
+            formatted_data = {"listings": listings}
+            save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json')
+            return 0, 0, 0.0, formatted_data
+
         # Create the dynamic listing model
         DynamicListingModel = create_dynamic_listing_model(fields)
 
         # Create the container model that holds a list of the dynamic listing models
         DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
         
-        # Format data
-        formatted_data, token_counts = format_data(markdown, DynamicListingsContainer, DynamicListingModel, selected_model)
+        # Format data (answered from the extraction cache when the page and fields are unchanged)
+        formatted_data, token_counts, cached = extract_listings(
+            markdown if reduced is None else reduced, fields, DynamicListingsContainer, DynamicListingModel,
+            selected_model, chunked, url, governor, source_markdown=markdown, focus_listings=focus_listings
+        )
+        if stats is not None:
+            stats["cached"] = cached
+            stats["partial"] = bool(token_counts.get("partial"))
+        if html:
+            schema_store.learn(url, fields, html, listings_of(formatted_data))
         
         # Save formatted data
-        save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json', f'sorted_data_{file_number}.xlsx')
+        save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json')
 
         # Calculate and return token usage and cost
         input_tokens, output_tokens, total_cost = calculate_price(token_counts, selected_model)
         return input_tokens, output_tokens, total_cost, formatted_data
 
+    except BudgetExceeded as e:
+        print(f"Skipped {url}: {e}")
+        if stats is not None:
+            stats["budget_exceeded"] = True
+        return 0, 0, 0, None
     except Exception as e:
         print(f"An error occurred while processing {url}: {e}")
         return 0, 0, 0, None
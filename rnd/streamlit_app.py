@@ -4,33 +4,98 @@ import pandas as pd
 import json
 from datetime import datetime
 from scraper import (
-    fetch_html_selenium,
-    save_raw_data,
-    format_data,
-    save_formatted_data,
-    calculate_price,
-    html_to_markdown_with_readability,
-    create_dynamic_listing_model,
-    create_listings_container_model,
-    scrape_url,
     setup_selenium,
     generate_unique_folder_name
 )
-from rnd.pagination_detector import detect_pagination_elements
+from api_management import SESSION_KEYS
+from css_schema import get_default_schema_store
+from extraction_cache import get_default_cache
+from fetcher import get_default_fetcher
+from scrape_jobs import ScrapeJob
+from budget_governor import BudgetGovernor
+from output_sink import iter_rows
+from llm_providers import LOCAL_MODELS, max_in_flight, set_max_in_flight
 import re
 from urllib.parse import urlparse
-from assets import PRICING
+from assets import METRICS_PORT_ENV, PAGINATION_MAX_PAGES, PRICING
 import os
 
 st.set_page_config(page_title="Universal Web Scraper", page_icon="🦑")
 st.title("Universal Web Scraper 🦑")
 
+
+@st.cache_resource
+def shared_resources():
+    """
+    Process-wide resources, created once and reused by every rerun and session: the tiered
+    fetcher with its HTTP client and Chrome driver pool, the extraction cache and the CSS
+    schema store (content reducers are per run). LLM clients are kept per model and API key
+    by llm_providers. With SCRAPER_METRICS_PORT set, Prometheus /metrics is served on that port.
+    """
+    if os.getenv(METRICS_PORT_ENV):
+        try:
+            from prometheus_client import start_http_server
+            start_http_server(int(os.environ[METRICS_PORT_ENV]))
+        except ImportError:
+            st.warning(f"{METRICS_PORT_ENV} is set but prometheus_client is not installed")
+    return {
+        "fetcher": get_default_fetcher(),
+        "cache": get_default_cache(),
+        "schemas": get_default_schema_store(),
+    }
+
+
+@st.fragment(run_every=1.0)
+def live_job_view():
+    """Render the running job's progress and finished pages; switch to the results once it ends."""
+    job = st.session_state.get('job')
+    if job is None:
+        return
+    snapshot = job.snapshot()
+    if job.done:
+        st.session_state['results'] = job.results
+        st.session_state['scraping_state'] = 'completed'
+        st.session_state['job'] = None
+        st.session_state['driver'] = None  # the job quit the attended-mode browser
+        if snapshot['status'] == 'failed':
+            st.session_state['job_error'] = snapshot['error']
+        st.rerun(scope="app")
+
+    totals = snapshot['totals']
+    finished = totals['pages']
+    total = max(snapshot['total'], finished)
+    st.progress(min(finished / total, 1.0), text=f"{finished}/{total} pages done in {snapshot['elapsed']:.0f}s "
+                                                 f"(${totals['cost']:.4f} so far)")
+    budget = snapshot['budget']
+    if budget:
+        limit = f" of ${budget['max_cost']:.4f}" if budget['max_cost'] else ""
+        st.caption(f"Spend: ${budget['spent']:.4f}{limit} (+${budget['in_flight_cost']:.4f} in flight), "
+                   f"{budget['spend_per_minute'] * 60:.2f} $/h, {budget['tokens_per_minute']:,} tokens/min"
+                   + (f", {budget['downgrades']} downgraded" if budget['downgrades'] else "")
+                   + (f", {budget['refused']} refused" if budget['refused'] else ""))
+    for index, stage in sorted(snapshot['stages'].items()):
+        if stage['stage'] in ('fetching', 'extracting'):
+            st.write(f"**URL {index}** `{stage['url']}`: {stage['stage']}")
+    for page in snapshot['pages']:
+        if page['error']:
+            st.error(f"URL {page['index']} `{page['url']}`: {page['error']}")
+            continue
+        source = "CSS schema ($0)" if page['css_schema'] else "cached ($0)" if page['cached'] else f"done (${page['cost']:.4f})"
+        partial = " (partial: some chunks failed)" if page['partial'] else ""
+        st.write(f"**URL {page['index']}** `{page['url']}`: {page['listings']} listings, {source}{partial}")
+    if snapshot['rows']:
+        st.caption(f"Latest {len(snapshot['rows'])} of {totals['listings']} listings")
+        st.dataframe(pd.DataFrame(snapshot['rows']), use_container_width=True)
+
+
 if 'scraping_state' not in st.session_state:
     st.session_state['scraping_state'] = 'idle'  # Possible states: 'idle', 'waiting', 'scraping', 'completed'
 if 'results' not in st.session_state:
     st.session_state['results'] = None
 if 'driver' not in st.session_state:
     st.session_state['driver'] = None
+if 'job' not in st.session_state:
+    st.session_state['job'] = None
 
 st.sidebar.title("Web Scraper Settings")
 
@@ -40,6 +105,14 @@ with st.sidebar.expander("API Keys", expanded=False):
     st.session_state['groq_api_key'] = st.text_input("Groq API Key", type="password")
 
 model_selection = st.sidebar.selectbox("Select Model", options=list(PRICING.keys()), index=0)
+if model_selection in LOCAL_MODELS:
+    # Shared by every session: the local server's parallel slots are a machine-wide resource
+    local_requests = st.sidebar.number_input(
+        "Parallel Local Requests", min_value=1, max_value=64, value=max_in_flight(model_selection) or 1,
+        help="Requests in flight to the local server at once; set it to the server's parallel slots. Further requests wait in a queue."
+    )
+    if local_requests != max_in_flight(model_selection):
+        set_max_in_flight(model_selection, int(local_requests))
 
 url_input = st.sidebar.text_input("Enter URL(s) separated by whitespace")
 urls = url_input.strip().split()
@@ -55,6 +128,27 @@ if show_tags:
         maxtags=-1,
         key='fields_input'
     )
+    focus_listings = st.sidebar.toggle(
+        "Focus on Listings",
+        help="Send only the region with repeated listing-like lines to the LLM"
+    )
+    chunked_extraction = st.sidebar.toggle(
+        "Chunked Extraction",
+        help="Split long pages into chunks extracted concurrently (pages over the model's limit are always chunked)"
+    )
+    with st.sidebar.expander("Budget", expanded=False):
+        max_spend = st.number_input("Max Spend per Run ($, 0 = no limit)", min_value=0.0, value=0.0, step=0.1, format="%.2f")
+        max_tokens = st.number_input("Max Tokens per Run (0 = no limit)", min_value=0, value=0, step=100_000)
+        downgrade_model = st.toggle(
+            "Downgrade When Budget Runs Low", value=True,
+            help="Switch to a cheaper model of the same provider once little budget is left"
+        )
+else:
+    focus_listings = False
+    chunked_extraction = False
+    max_spend = 0.0
+    max_tokens = 0
+    downgrade_model = True
 
 st.sidebar.markdown("---")
 
@@ -66,12 +160,24 @@ if num_urls <= 1:
             "Enter Pagination Details (optional)",
             help="Describe how to navigate through pages (e.g., 'Next' button class, URL pattern)"
         )
+    follow_pages = False
+    max_pages = PAGINATION_MAX_PAGES
+    if use_pagination and show_tags:
+        follow_pages = st.sidebar.toggle(
+            "Follow Pagination",
+            help="Scrape the detected pages too; stops at the first page without new listings"
+        )
+        if follow_pages:
+            max_pages = st.sidebar.number_input("Max Pages to Follow", min_value=1, value=PAGINATION_MAX_PAGES)
 
     st.sidebar.markdown("---")
 
     attended_mode = st.sidebar.toggle("Enable Attended Mode")
 else:
     use_pagination = False
+    pagination_details = ""
+    follow_pages = False
+    max_pages = PAGINATION_MAX_PAGES
     attended_mode = False
     st.sidebar.info("Pagination and Attended Mode are disabled when multiple URLs are entered.")
 
@@ -89,6 +195,13 @@ if st.sidebar.button("LAUNCH SCRAPER", type="primary"):
         st.session_state['attended_mode'] = attended_mode
         st.session_state['use_pagination'] = use_pagination
         st.session_state['pagination_details'] = pagination_details
+        st.session_state['follow_pages'] = follow_pages
+        st.session_state['max_pages'] = int(max_pages)
+        st.session_state['focus_listings'] = focus_listings
+        st.session_state['chunked_extraction'] = chunked_extraction
+        st.session_state['show_tags'] = show_tags
+        st.session_state['budget'] = {"max_cost": max_spend, "max_tokens": int(max_tokens), "downgrade": downgrade_model}
+        st.session_state['job_error'] = None
         st.session_state['scraping_state'] = 'waiting' if attended_mode else 'scraping'
 
 if st.session_state['scraping_state'] == 'waiting':
@@ -106,167 +219,113 @@ if st.session_state['scraping_state'] == 'waiting':
         st.rerun()
 
 elif st.session_state['scraping_state'] == 'scraping':
-    with st.spinner('Scraping in progress...'):
-        output_folder = os.path.join('output', generate_unique_folder_name(st.session_state['urls'][0]))
-        os.makedirs(output_folder, exist_ok=True)
-
-        total_input_tokens = 0
-        total_output_tokens = 0
-        total_cost = 0
-        all_data = []
-        pagination_info = None
-
-        driver = st.session_state.get('driver', None)
-        if st.session_state['attended_mode'] and driver is not None:
-            raw_html = fetch_html_selenium(st.session_state['urls'][0], attended_mode=True, driver=driver)
-            markdown = html_to_markdown_with_readability(raw_html)
-            save_raw_data(markdown, output_folder, f'rawData_1.md')
-
-            current_url = driver.current_url  # Use the current URL for logging and saving purposes
-
-            if st.session_state['use_pagination']:
-                pagination_data, token_counts, pagination_price = detect_pagination_elements(
-                    current_url, st.session_state['pagination_details'], st.session_state['model_selection'], markdown
-                )
-                if isinstance(pagination_data, dict):
-                    page_urls = pagination_data.get("page_urls", [])
-                else:
-                    page_urls = pagination_data.page_urls
-                
-                pagination_info = {
-                    "page_urls": page_urls,
-                    "token_counts": token_counts,
-                    "price": pagination_price
-                }
-            if show_tags:
-                DynamicListingModel = create_dynamic_listing_model(st.session_state['fields'])
-                DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
-                formatted_data, token_counts = format_data(
-                    markdown, DynamicListingsContainer, DynamicListingModel, st.session_state['model_selection']
-                )
-                input_tokens, output_tokens, cost = calculate_price(token_counts, st.session_state['model_selection'])
-                total_input_tokens += input_tokens
-                total_output_tokens += output_tokens
-                total_cost += cost
-                df = save_formatted_data(formatted_data, output_folder, f'sorted_data_1.json', f'sorted_data_1.xlsx')
-                all_data.append(formatted_data)
-        else:
-            for i, url in enumerate(st.session_state['urls'], start=1):
-                raw_html = fetch_html_selenium(url, attended_mode=False)
-                markdown = html_to_markdown_with_readability(raw_html)
-                save_raw_data(markdown, output_folder, f'rawData_{i}.md')
-
-                if st.session_state['use_pagination'] and i == 1:
-                    pagination_data, token_counts, pagination_price = detect_pagination_elements(
-                        url, st.session_state['pagination_details'], st.session_state['model_selection'], markdown
-                    )
-                    if isinstance(pagination_data, dict):
-                        page_urls = pagination_data.get("page_urls", [])
-                    else:
-                        page_urls = pagination_data.page_urls
-                    
-                    pagination_info = {
-                        "page_urls": page_urls,
-                        "token_counts": token_counts,
-                        "price": pagination_price
-                    }
-                if show_tags:
-                    DynamicListingModel = create_dynamic_listing_model(st.session_state['fields'])
-                    DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
-                    formatted_data, token_counts = format_data(
-                        markdown, DynamicListingsContainer, DynamicListingModel, st.session_state['model_selection']
-                    )
-                    input_tokens, output_tokens, cost = calculate_price(token_counts, st.session_state['model_selection'])
-                    total_input_tokens += input_tokens
-                    total_output_tokens += output_tokens
-                    total_cost += cost
-                    df = save_formatted_data(formatted_data, output_folder, f'sorted_data_{i}.json', f'sorted_data_{i}.xlsx')
-                    all_data.append(formatted_data)
-
-        if driver:
-            driver.quit()
-            st.session_state['driver'] = None
-
-        st.session_state['results'] = {
-            'data': all_data,
-            'input_tokens': total_input_tokens,
-            'output_tokens': total_output_tokens,
-            'total_cost': total_cost,
-            'output_folder': output_folder,
-            'pagination_info': pagination_info
-        }
-        st.session_state['scraping_state'] = 'completed'
+    job = st.session_state.get('job')
+    if job is None:
+        # The scrape runs on a background thread; reruns only poll it, so widgets stay responsive
+        shared_resources()
+        job = ScrapeJob(
+            st.session_state['urls'],
+            st.session_state['fields'],
+            st.session_state['model_selection'],
+            os.path.join('output', generate_unique_folder_name(st.session_state['urls'][0])),
+            extract=st.session_state['show_tags'],
+            focus_listings=st.session_state['focus_listings'],
+            chunked=st.session_state['chunked_extraction'],
+            use_pagination=st.session_state['use_pagination'],
+            pagination_details=st.session_state['pagination_details'],
+            follow_pages=st.session_state.get('follow_pages', False),
+            max_pages=st.session_state.get('max_pages', PAGINATION_MAX_PAGES),
+            driver=st.session_state['driver'] if st.session_state['attended_mode'] else None,
+            api_keys={name: st.session_state.get(key) for name, key in SESSION_KEYS.items()},
+            governor=BudgetGovernor(**st.session_state['budget']) if st.session_state['show_tags'] else None,
+        ).start()
+        st.session_state['job'] = job
+        st.session_state['jobs'] = st.session_state.get('jobs', []) + [job.id]
+
+    if st.button("Cancel Scraping"):
+        job.cancel()
+    live_job_view()
+
 if st.session_state['scraping_state'] == 'completed' and st.session_state['results']:
     results = st.session_state['results']
-    all_data = results['data']
+    if st.session_state.get('job_error'):
+        st.error(f"Scraping failed: {st.session_state['job_error']}")
     total_input_tokens = results['input_tokens']
     total_output_tokens = results['output_tokens']
     total_cost = results['total_cost']
     output_folder = results['output_folder']
     pagination_info = results['pagination_info']
+    page_loads = results.get('page_loads', [])
+    reductions = results.get('reductions', [])
+
+    if page_loads:
+        st.sidebar.markdown("---")
+        st.sidebar.markdown("### Page Load Times")
+        loads_df = pd.DataFrame(page_loads).reindex(columns=["url", "tier", "load_seconds", "scrolls", "escalation"])
+        st.sidebar.dataframe(loads_df, use_container_width=True)
+        st.sidebar.markdown(f"*Total load time:* {loads_df['load_seconds'].sum():.2f}s")
+        tiers = loads_df.groupby(loads_df['tier'].fillna('browser'))['load_seconds'].agg(['count', 'mean'])
+        for tier, row in tiers.iterrows():
+            st.sidebar.markdown(f"*{tier}:* {int(row['count'])} pages, avg {row['mean']:.2f}s")
+
+    if reductions:
+        st.sidebar.markdown("---")
+        st.sidebar.markdown("### Input Reduction")
+        reduction_df = pd.DataFrame(reductions).reindex(
+            columns=["url", "tokens_before", "tokens_after", "tokens_saved", "repeated_blocks", "link_farms", "image_lines"]
+        )
+        st.sidebar.dataframe(reduction_df, use_container_width=True)
+        saved, before = reduction_df['tokens_saved'].sum(), reduction_df['tokens_before'].sum()
+        st.sidebar.markdown(f"*Tokens saved:* {saved} ({saved / before:.0%} of page input)" if before else "*Tokens saved:* 0")
 
+    listing_files = results.get('listing_files', {})
     if show_tags:
         st.subheader("Scraping Results")
-        for i, data in enumerate(all_data, start=1):
-            st.write(f"Data from URL {i}:")
-            
-            if isinstance(data, str):
-                try:
-                    data = json.loads(data)
-                except json.JSONDecodeError:
-                    st.error(f"Failed to parse data as JSON for URL {i}")
-                    continue
-            
-            if isinstance(data, dict):
-                if 'listings' in data and isinstance(data['listings'], list):
-                    df = pd.DataFrame(data['listings'])
-                else:
-                    df = pd.DataFrame([data])
-            elif hasattr(data, 'listings') and isinstance(data.listings, list):
-                listings = [item.dict() for item in data.listings]
-                df = pd.DataFrame(listings)
+        if listing_files:
+            # Listings are read back from the output sink; the job kept none of them in memory
+            listings_df = pd.DataFrame(list(iter_rows(listing_files['jsonl'])))
+            if listings_df.empty:
+                st.write("No listings found.")
             else:
-                st.error(f"Unexpected data format for URL {i}")
-                continue
-            st.dataframe(df, use_container_width=True)
+                for (page, url), page_df in listings_df.groupby(['_page', '_url'], sort=True):
+                    st.write(f"Data from URL {page} `{url}`:")
+                    st.dataframe(page_df.drop(columns=['_page', '_url']), use_container_width=True)
 
         st.sidebar.markdown("---")
         st.sidebar.markdown("### Scraping Details")
         st.sidebar.markdown("#### Token Usage")
         st.sidebar.markdown(f"*Input Tokens:* {total_input_tokens}")
         st.sidebar.markdown(f"*Output Tokens:* {total_output_tokens}")
+        if results.get('cache_hits'):
+            st.sidebar.markdown(f"*Cached URLs:* {results['cache_hits']} (no LLM cost)")
+        if results.get('schema_hits'):
+            st.sidebar.markdown(f"*CSS schema URLs:* {results['schema_hits']} (no LLM cost)")
         st.sidebar.markdown(f"**Total Cost:** :green-background[**${total_cost:.4f}**]")
+        budget = results.get('budget')
+        if budget and (budget['max_cost'] or budget['max_tokens']):
+            st.sidebar.markdown("#### Budget")
+            if budget['max_cost']:
+                st.sidebar.markdown(f"*Spent:* ${budget['spent']:.4f} of ${budget['max_cost']:.4f}")
+            if budget['max_tokens']:
+                st.sidebar.markdown(f"*Tokens:* {budget['tokens']:,} of {budget['max_tokens']:,}")
+            if budget['downgrades']:
+                st.sidebar.markdown(f"*Downgraded requests:* {budget['downgrades']}")
+            if budget['refused']:
+                st.sidebar.warning(f"{budget['refused']} request(s) refused: budget exhausted")
 
         st.subheader("Download Extracted Data")
-        col1, col2 = st.columns(2)
-        with col1:
-            json_data = json.dumps(all_data, default=lambda o: o.dict() if hasattr(o, 'dict') else str(o), indent=4)
-            st.download_button(
-                "Download JSON",
-                data=json_data,
-                file_name="scraped_data.json"
-            )
-        with col2:
-            all_listings = []
-            for data in all_data:
-                if isinstance(data, str):
-                    try:
-                        data = json.loads(data)
-                    except json.JSONDecodeError:
-                        continue
-                if isinstance(data, dict) and 'listings' in data:
-                    all_listings.extend(data['listings'])
-                elif hasattr(data, 'listings'):
-                    all_listings.extend([item.dict() for item in data.listings])
-                else:
-                    all_listings.append(data)
-            
-            combined_df = pd.DataFrame(all_listings)
-            st.download_button(
-                "Download CSV",
-                data=combined_df.to_csv(index=False),
-                file_name="scraped_data.csv"
-            )
+        col1, col2, col3 = st.columns(3)
+        if listing_files:
+            # Combined files were written once by the output sink when scraping finished
+            with col1:
+                with open(listing_files['jsonl'], 'rb') as f:
+                    st.download_button("Download JSON Lines", data=f.read(), file_name="scraped_data.jsonl")
+            with col2:
+                with open(listing_files['csv'], 'rb') as f:
+                    st.download_button("Download CSV", data=f.read(), file_name="scraped_data.csv")
+            with col3:
+                with open(listing_files['xlsx'], 'rb') as f:
+                    st.download_button("Download Excel", data=f.read(), file_name="scraped_data.xlsx")
 
         st.success(f"Scraping completed. Results saved in {output_folder}")
 
@@ -281,6 +340,12 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
         st.sidebar.markdown(f"*Input Tokens:* {pagination_info['token_counts']['input_tokens']}")
         st.sidebar.markdown(f"*Output Tokens:* {pagination_info['token_counts']['output_tokens']}")
         st.sidebar.markdown(f"**Pagination Cost:** :blue-background[**${pagination_info['price']:.4f}**]")
+        detection = pagination_info.get('detection', {})
+        if detection:
+            st.sidebar.markdown(f"*Detected by:* {detection['method']} in {detection['detect_seconds']:.3f}s")
+            if detection['method'] == 'rules':
+                st.sidebar.markdown(f"*Pattern:* `{detection['pattern']}` ({detection['evidence']})")
+                st.sidebar.markdown(f"*Tokens saved:* {detection['tokens_saved']} (no LLM call)")
 
 
         st.write("**Page URLs:**")
@@ -293,6 +358,15 @@ if st.session_state['scraping_state'] == 'completed' and st.session_state['resul
             },use_container_width=True
         )
 
+        if pagination_info.get('followed'):
+            st.write("**Followed Pages:**")
+            st.dataframe(pd.DataFrame(pagination_info['followed']), use_container_width=True)
+            stop_reason = pagination_info.get('stop_reason')
+            if stop_reason == 'no_new_listings':
+                st.caption("Stopped early: a page returned no new listings.")
+            elif stop_reason == 'max_pages':
+                st.caption("Stopped at the max-pages cap.")
+
         st.subheader("Download Pagination URLs")
         col1, col2 = st.columns(2)
         with col1:
@@ -0,0 +1,169 @@
+"""
+Shared token budgeting for LLM prompts.
+
+Used by the rnd extraction path (scraper.py, pagination_detector.py) and by the
+app/ summarizers. Encoders are loaded once per model and cached; a cheap
+character-based estimate decides whether exact counting is needed at all, and
+truncation cuts at sentence boundaries instead of mid-word.
+
+This module must not import other rnd modules: app/ imports it as
+`rnd.token_budget`.
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+FALLBACK_ENCODING = "cl100k_base"
+
+# Upper-leaning estimate: ASCII text averages ~4 chars/token, most non-ASCII
+# scripts (CJK, Thai, ...) are closer to one token per character.
+ASCII_CHARS_PER_TOKEN = 3.5
+NON_ASCII_TOKENS_PER_CHAR = 1.0
+
+# A single token rarely spans more than this many characters; used to bound how
+# much text has to be encoded when truncating.
+MAX_CHARS_PER_TOKEN = 12
+
+_SENTENCE_END = re.compile(r"(?:[.!?](?=\s)|[。！？]|\n\s*\n)")
+_BLOCK_BREAK = re.compile(r"\n\s*\n|\n(?=#{1,6} )")
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str) -> Optional[tiktoken.Encoding]:
+    """tiktoken encoder for `model`, cached; None when no encoding can be loaded (offline)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception:
+        return None
+
+
+def approx_tokens(text: str) -> int:
+    """Fast token estimate without encoding."""
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    non_ascii_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN + non_ascii_chars * NON_ASCII_TOKENS_PER_CHAR)
+
+
+def count_tokens(text: str, model: str, exact: bool = True) -> int:
+    """Exact count with the model's encoder, falling back to approx_tokens."""
+    if not text:
+        return 0
+    encoder = get_encoder(model) if exact else None
+    if encoder is None:
+        return approx_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def _cut_at_sentence(text: str) -> str:
+    """Drop the trailing partial sentence, unless that would lose more than half the text."""
+    last_end = None
+    for match in _SENTENCE_END.finditer(text):
+        last_end = match.end()
+    if last_end and last_end >= len(text) // 2:
+        return text[:last_end].rstrip()
+    space = text.rfind(" ")
+    return text[:space].rstrip() if space >= len(text) // 2 else text
+
+
+def truncate_to_budget(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Return `text` cut to at most `max_tokens` tokens, ending on a sentence boundary."""
+    if not text or max_tokens <= 0:
+        return "" if max_tokens <= 0 else text
+    if approx_tokens(text) <= max_tokens:
+        return text
+
+    encoder = get_encoder(model)
+    if encoder is None:
+        ratio = max_tokens / approx_tokens(text)
+        return _cut_at_sentence(text[: int(len(text) * ratio)])
+
+    # Only the prefix that can possibly fit needs encoding.
+    head = text[: max_tokens * MAX_CHARS_PER_TOKEN]
+    tokens = encoder.encode(head, disallowed_special=())
+    if len(tokens) <= max_tokens and len(head) == len(text):
+        return text
+    return _cut_at_sentence(encoder.decode(tokens[:max_tokens]))
+
+
+def fit_to_prompt(prompt: str, content: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Truncate `content` so that `prompt + content` stays within `max_tokens`."""
+    remaining = max_tokens - count_tokens(prompt, model)
+    return truncate_to_budget(content, remaining, model)
+
+
+def _pieces(text: str, max_tokens: int, model: str) -> List[Tuple[str, str]]:
+    """
+    Structural pieces of `text` that each fit `max_tokens` (blocks, then lines, then
+    truncated lines), each with the separator that preceded it.
+    """
+    pieces = []
+    for block in _BLOCK_BREAK.split(text):
+        if not block.strip():
+            continue
+        if count_tokens(block, model) <= max_tokens:
+            pieces.append((block.strip("\n"), "\n\n"))
+            continue
+        lines = [line for line in block.splitlines() if line.strip()]
+        for i, line in enumerate(lines):
+            pieces.append((truncate_to_budget(line, max_tokens, model), "\n\n" if i == 0 else "\n"))
+    return pieces
+
+
+def _join(pieces: List[Tuple[str, str]]) -> str:
+    return "".join(sep + piece if i else piece for i, (piece, sep) in enumerate(pieces))
+
+
+def _tail_lines(pieces: List[Tuple[str, str]], lines: int) -> List[Tuple[str, str]]:
+    """The last `lines` non-blank lines of `pieces`, as one piece."""
+    tail: List[str] = []
+    for piece, _ in reversed(pieces):
+        tail[:0] = [line for line in piece.splitlines() if line.strip()][-(lines - len(tail)):]
+        if len(tail) >= lines:
+            break
+    return [("\n".join(tail), "\n\n")] if tail else []
+
+
+def split_to_budget(text: str, max_tokens: int, model: str = "gpt-4o-mini", overlap: int = 1) -> List[str]:
+    """
+    Split `text` into chunks of at most `max_tokens` tokens on structural boundaries
+    (blank lines and headings, then single lines). The last `overlap` lines of a chunk
+    are repeated at the start of the next one so items on a border appear whole in one of
+    them; only lines are carried, never a whole block, so the repeated part stays small.
+    """
+    if not text or max_tokens <= 0:
+        return [text] if text else []
+    if approx_tokens(text) <= max_tokens and count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    chunks: List[str] = []
+    current: List[Tuple[str, str]] = []
+    current_tokens = 0
+    for piece, sep in _pieces(text, max_tokens, model):
+        tokens = count_tokens(piece, model) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(_join(current))
+            carried = _tail_lines(current, overlap) if overlap else []
+            carried_tokens = sum(count_tokens(p, model) + 1 for p, _ in carried)
+            # Never let the overlap alone fill the next chunk
+            current, current_tokens = (carried, carried_tokens) if carried_tokens + tokens <= max_tokens else ([], 0)
+        current.append((piece, sep))
+        current_tokens += tokens
+    if current:
+        chunks.append(_join(current))
+    return chunks
+
+
+def estimate_cost(input_tokens: int, expected_output_tokens: int, pricing: Dict[str, float]) -> float:
+    """Cost in dollars given per-token `pricing` ({"input": ..., "output": ...})."""
+    return input_tokens * pricing["input"] + expected_output_tokens * pricing["output"]
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# rnd/ modules import each other by their bare names (the app is run from rnd/)
+RND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rnd")
+sys.path.insert(0, RND_DIR)
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+import pagination_detector
+from budget_governor import BudgetExceeded, BudgetGovernor
+from llm_json import LLMOutputError
+
+
+def test_reserve_then_commit_replaces_the_estimate_with_actual_cost():
+    governor = BudgetGovernor(max_cost=1.0)
+    reservation = governor.reserve("gpt-4o-mini", 1_000)
+    assert governor.stats()["in_flight_cost"] == pytest.approx(reservation.cost, abs=1e-6)
+    cost = governor.commit(reservation, {"input_tokens": 1_000, "output_tokens": 100})
+    stats = governor.stats()
+    assert stats["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
+    assert stats["spent"] == pytest.approx(cost, abs=1e-6)
+    assert stats["tokens"] == 1_100 and stats["requests"] == 1
+
+
+def test_release_frees_the_reservation():
+    governor = BudgetGovernor(max_tokens=10_000)
+    governor.release(governor.reserve("gpt-4o-mini", 5_000))
+    stats = governor.stats()
+    assert stats["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
+    assert stats["spent"] == 0.0 and stats["tokens"] == 0
+
+
+def test_in_flight_reservations_count_against_the_limit():
+    governor = BudgetGovernor(max_tokens=10_000, expected_output_tokens=1_000)
+    governor.reserve("gpt-4o-mini", 5_000)
+    with pytest.raises(BudgetExceeded):
+        governor.reserve("gpt-4o-mini", 5_000)
+    assert governor.stats()["refused"] == 1
+
+
+def test_low_budget_downgrades_to_the_fallback_model():
+    governor = BudgetGovernor(max_cost=0.04, expected_output_tokens=1_000)
+    reservation = governor.reserve("gpt-4o-2024-08-06", 10_000)
+    assert reservation.downgraded and reservation.model == "gpt-4o-mini"
+
+
+def test_pagination_detection_goes_through_the_governor(monkeypatch):
+    monkeypatch.setattr(pagination_detector, "detect_pagination_rules", lambda *args, **kwargs: None)
+    answer = pagination_detector.PaginationData(page_urls=["https://shop.example/?page=2"])
+
+    class FakeProvider:
+        def complete(self, system, user, response_model):
+            return SimpleNamespace(data=answer, text="", token_counts={"input_tokens": 2_000, "output_tokens": 50})
+
+    monkeypatch.setattr(pagination_detector, "get_provider", lambda model: FakeProvider())
+    governor = BudgetGovernor(max_cost=1.0)
+    data, token_counts, price = pagination_detector.detect_pagination_elements(
+        "https://shop.example/", "", "gpt-4o-mini", "Page 1 2 3", governor=governor
+    )
+    stats = governor.stats()
+    assert data.page_urls == answer.page_urls
+    assert stats["tokens"] == 2_050 and price == pytest.approx(stats["spent"], abs=1e-6)
+    assert stats["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_pagination_detection_commits_billed_failures(monkeypatch):
+    monkeypatch.setattr(pagination_detector, "detect_pagination_rules", lambda *args, **kwargs: None)
+
+    class FakeProvider:
+        def complete(self, system, user, response_model):
+            raise LLMOutputError("No JSON found", token_counts={"input_tokens": 2_000, "output_tokens": 50})
+
+    monkeypatch.setattr(pagination_detector, "get_provider", lambda model: FakeProvider())
+    governor = BudgetGovernor(max_cost=1.0)
+    data, _, _ = pagination_detector.detect_pagination_elements(
+        "https://shop.example/", "", "gpt-4o-mini", "Page 1 2 3", governor=governor
+    )
+    stats = governor.stats()
+    assert data.page_urls == []
+    assert stats["tokens"] == 2_050 and stats["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
@@ -0,0 +1,44 @@
+import content_reducer
+from content_reducer import ContentReducer
+
+NAV = "Home | Products | About us | Contact | Careers | Press"
+
+
+def page(item: str) -> str:
+    return f"{NAV}\n\n{item} is a product with a long enough description to matter.\n"
+
+
+def test_first_page_keeps_blocks_later_pages_drop_them():
+    reducer = ContentReducer()
+    first, stats = reducer.reduce(page("Item A"), "https://shop.example/1")
+    second, stats = reducer.reduce(page("Item B"), "https://shop.example/2")
+    assert NAV in first
+    assert NAV not in second
+    assert stats["repeated_blocks"] == 1
+
+
+def test_reducing_a_page_again_is_stable():
+    reducer = ContentReducer()
+    reducer.reduce(page("Item A"), "https://shop.example/1")
+    once, _ = reducer.reduce(page("Item B"), "https://shop.example/2")
+    twice, _ = reducer.reduce(page("Item B"), "https://shop.example/2")
+    assert once == twice
+
+
+def test_same_url_alone_never_drops_its_own_blocks():
+    reducer = ContentReducer()
+    once, _ = reducer.reduce(page("Item A"), "https://shop.example/1")
+    twice, _ = reducer.reduce(page("Item A"), "https://shop.example/1")
+    assert once == twice
+    assert NAV in twice
+
+
+def test_domains_are_independent_and_bounded(monkeypatch):
+    monkeypatch.setattr(content_reducer, "MAX_DOMAINS", 2)
+    reducer = ContentReducer()
+    reducer.reduce(page("Item A"), "https://a.example/1")
+    reducer.reduce(page("Item A"), "https://b.example/1")
+    reducer.reduce(page("Item A"), "https://c.example/1")
+    assert list(reducer._seen) == ["b.example", "c.example"]
+    reducer.reset()
+    assert not reducer._seen
@@ -0,0 +1,64 @@
+from css_schema import SchemaStore, agreement, apply_schema, induce_schema, template_key
+
+FIELDS = ["title", "price", "url"]
+
+
+def page(products):
+    cards = "".join(
+        f'<li class="card"><a class="name" href="/item/{n}">{title}</a><span class="price">${price}</span></li>'
+        for n, (title, price) in enumerate(products, start=1)
+    )
+    return f'<html><body><nav><a href="/">Home</a></nav><ul class="results">{cards}</ul></body></html>'
+
+
+PAGE_1 = page([("Red chair", 40), ("Blue table", 120), ("Green lamp", 25)])
+LISTINGS_1 = [
+    {"title": "Red chair", "price": "$40", "url": "https://shop.example/item/1"},
+    {"title": "Blue table", "price": "$120", "url": "https://shop.example/item/2"},
+    {"title": "Green lamp", "price": "$25", "url": "https://shop.example/item/3"},
+]
+
+
+def test_template_key_ignores_pagination():
+    key = template_key("https://shop.example/list")
+    assert template_key("https://shop.example/list?page=2") == key
+    assert template_key("https://shop.example/list?p=3") == key
+    assert template_key("https://shop.example/list?offset=40") == key
+    assert template_key("https://shop.example/list/page/4") == key
+    assert template_key("https://shop.example/list?page=2&sort=price") == template_key("https://shop.example/list?sort=new")
+
+
+def test_template_key_keeps_the_path_shape():
+    assert template_key("https://shop.example/c/12/list") == template_key("https://shop.example/c/98/list")
+    assert template_key("https://shop.example/list") != template_key("https://shop.example/search")
+    assert template_key("https://shop.example/list?q=tv") != template_key("https://shop.example/list")
+
+
+def test_induced_schema_reproduces_the_listings():
+    schema = induce_schema(PAGE_1, LISTINGS_1, FIELDS, base_url="https://shop.example/list")
+    assert schema is not None
+    extracted = apply_schema(schema, PAGE_1, base_url="https://shop.example/list")
+    assert agreement(extracted, LISTINGS_1, FIELDS) == 1.0
+
+
+def test_induce_schema_rejects_values_not_on_the_page():
+    listings = [dict(listing, title=listing["title"].upper() + " (new)") for listing in LISTINGS_1]
+    assert induce_schema(PAGE_1, listings, FIELDS, base_url="https://shop.example/list") is None
+
+
+def test_apply_schema_fills_defaults_and_attributes():
+    schema = {"baseSelector": "li.card", "fields": [
+        {"name": "title", "selector": "a.name", "type": "text"},
+        {"name": "url", "selector": "a.name", "type": "attribute", "attribute": "href"},
+        {"name": "stock", "selector": ".stock", "type": "text", "default": "unknown"},
+    ]}
+    rows = apply_schema(schema, PAGE_1, base_url="https://shop.example/list")
+    assert rows[0] == {"title": "Red chair", "url": "https://shop.example/item/1", "stock": "unknown"}
+
+
+def test_schema_learned_on_page_one_extracts_page_two(tmp_path):
+    store = SchemaStore(str(tmp_path))
+    assert store.learn("https://shop.example/list", FIELDS, PAGE_1, LISTINGS_1) is not None
+    page_2 = page([("Oak shelf", 80), ("Pine desk", 150)])
+    rows = store.extract("https://shop.example/list?page=2", FIELDS, page_2)
+    assert [row["title"] for row in rows] == ["Oak shelf", "Pine desk"]
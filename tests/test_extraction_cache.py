@@ -0,0 +1,41 @@
+import extraction_cache
+from extraction_cache import ExtractionCache, cache_key, extraction_variant
+
+FIELDS = ["title", "price"]
+PAGE = "# Listings\n\n- Widget $10\n- Gadget $20\n"
+
+
+def test_key_ignores_whitespace_and_field_order():
+    assert cache_key(PAGE, FIELDS, "gpt-4o-mini") == cache_key("  # Listings\n- Widget $10   - Gadget $20", ["price", "title"], "gpt-4o-mini")
+
+
+def test_key_changes_with_page_fields_and_model():
+    key = cache_key(PAGE, FIELDS, "gpt-4o-mini")
+    assert cache_key(PAGE + "- Gizmo $30\n", FIELDS, "gpt-4o-mini") != key
+    assert cache_key(PAGE, FIELDS + ["url"], "gpt-4o-mini") != key
+    assert cache_key(PAGE, FIELDS, "gpt-4o") != key
+
+
+def test_key_changes_with_request_variant():
+    key = cache_key(PAGE, FIELDS, "gpt-4o-mini", extraction_variant())
+    assert cache_key(PAGE, FIELDS, "gpt-4o-mini", extraction_variant(chunked=True)) != key
+    assert cache_key(PAGE, FIELDS, "gpt-4o-mini", extraction_variant(focus_listings=True)) != key
+    assert cache_key(PAGE, FIELDS, "gpt-4o-mini", extraction_variant("Describe the title and price fields.")) != key
+
+
+def test_key_changes_with_reducer_version(monkeypatch):
+    key = cache_key(PAGE, FIELDS, "gpt-4o-mini")
+    monkeypatch.setattr("extraction_cache.REDUCER_VERSION", "reducer-changed")
+    assert cache_key(PAGE, FIELDS, "gpt-4o-mini") != key
+
+
+def test_hits_are_counted(tmp_path):
+    if extraction_cache.CACHE_HITS is None:
+        return
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"))
+    hits = extraction_cache.CACHE_HITS.labels("extraction")
+    before = hits._value.get()
+    assert cache.get(PAGE, FIELDS, "gpt-4o-mini") is None
+    cache.put(PAGE, FIELDS, "gpt-4o-mini", {"listings": []}, {"input_tokens": 10, "output_tokens": 2})
+    assert cache.get(PAGE, FIELDS, "gpt-4o-mini")[1] == {"input_tokens": 10, "output_tokens": 2}
+    assert hits._value.get() == before + 1
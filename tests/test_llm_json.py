@@ -0,0 +1,49 @@
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from llm_json import LLMOutputError, parse_llm_json
+
+
+class Listing(BaseModel):
+    title: str
+
+
+class Listings(BaseModel):
+    listings: List[Listing]
+
+
+def test_fenced_json():
+    text = 'Here you go:\n```json\n{"listings": [{"title": "A"},]}\n```\nAnything else?'
+    assert parse_llm_json(text) == {"listings": [{"title": "A"}]}
+
+
+def test_prose_around_json():
+    assert parse_llm_json('Sure! {"listings": [{"title": "A"}]} Hope that helps.') == {"listings": [{"title": "A"}]}
+
+
+def test_bracketed_prose_before_json_is_skipped():
+    text = 'Here are [2] results: {"listings": [{"title": "A"}, {"title": "B"}]}'
+    assert parse_llm_json(text) == {"listings": [{"title": "A"}, {"title": "B"}]}
+    assert parse_llm_json(text, Listings) == {"listings": [{"title": "A"}, {"title": "B"}]}
+
+
+def test_object_without_model_fields_is_skipped():
+    text = 'Notes {"source": "page"} then {"listings": []}'
+    assert parse_llm_json(text, Listings) == {"listings": []}
+
+
+def test_truncated_output_keeps_complete_listings():
+    text = '{"listings": [{"title": "A"}, {"title": "B"}, {"title": "C'
+    assert parse_llm_json(text) == {"listings": [{"title": "A"}, {"title": "B"}]}
+
+
+def test_truncated_output_after_prose():
+    text = 'Found [3] items:\n```json\n{"listings": [{"title": "A"}, {"tit'
+    assert parse_llm_json(text, Listings) == {"listings": [{"title": "A"}]}
+
+
+def test_no_json_raises():
+    with pytest.raises(LLMOutputError):
+        parse_llm_json("I could not find any listings on this page.")
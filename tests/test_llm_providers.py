@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+from llm_json import LLMOutputError
+from llm_providers import BatchProvider, LLMProvider, OpenAICompatibleProvider
+
+
+def completion(content, finish_reason="stop", usage=None):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+
+@pytest.fixture
+def provider():
+    return OpenAICompatibleProvider("Llama3.1 8B", "http://127.0.0.1:1/v1", "lm-studio", "llama-3.1-8b")
+
+
+def test_base_providers_are_abstract():
+    with pytest.raises(TypeError):
+        LLMProvider("gpt-4o-mini")
+    with pytest.raises(TypeError):
+        BatchProvider("gpt-4o-mini")
+
+
+def test_compatible_provider_parses_content(provider):
+    result = provider._from_completion(completion('  {"listings": []}  '), "system", "user", None)
+    assert result.data == {"listings": []}
+
+
+def test_compatible_provider_rejects_missing_content(provider):
+    with pytest.raises(LLMOutputError):
+        provider._from_completion(completion(None, "content_filter"), "system", "user", None)
+
+
+def test_unusable_output_carries_the_billed_usage(provider):
+    usage = SimpleNamespace(prompt_tokens=1_200, completion_tokens=80)
+    with pytest.raises(LLMOutputError) as error:
+        provider._from_completion(completion("Sorry, no listings here.", usage=usage), "system", "user", None)
+    assert error.value.token_counts == {"input_tokens": 1_200, "output_tokens": 80}
@@ -0,0 +1,50 @@
+from pagination_rules import detect_pagination_rules
+
+URL = "https://shop.example/search?q=tab"
+
+
+def page(*links):
+    anchors = "".join(f'<a href="{href}"{extra}>{text}</a>' for href, text, extra in links)
+    return f"<html><body>{anchors}</body></html>"
+
+
+def test_numbered_page_links():
+    html = page(*[(f"/search?q=tab&page={n}", str(n), "") for n in (1, 2, 3, 4, 5, 12)])
+    result = detect_pagination_rules(URL, html=html)
+    assert result["pattern"] == "https://shop.example/search?q=tab&page={n}"
+    assert result["page_urls"][0] == "https://shop.example/search?q=tab&page=2"
+    assert len(result["page_urls"]) == 11
+
+
+def test_offset_with_next_link():
+    html = page(("/search?q=tab&start=20", "2", ""), ("/search?q=tab&start=40", "3", ""),
+                ("/search?q=tab&start=20", "Next", ' rel="next"'))
+    result = detect_pagination_rules(URL + "&start=0", html=html)
+    assert result["evidence"] == "next link"
+    assert result["page_urls"] == ["https://shop.example/search?q=tab&start=20", "https://shop.example/search?q=tab&start=40"]
+
+
+def test_product_paths_are_not_pagination():
+    html = page(*[(f"/p/{n}", f"Product {n}", "") for n in (10234, 55120, 99871)])
+    assert detect_pagination_rules(URL, html=html) is None
+
+
+def test_generic_name_needs_evidence():
+    html = page(("/search?q=tab&start=2", "Tablets", ""), ("/search?q=tab&start=3", "Phones", ""))
+    assert detect_pagination_rules(URL, html=html) is None
+
+
+def test_year_archive_is_not_pagination():
+    html = page(*[(f"/archive/{year}", str(year), "") for year in range(2018, 2025)])
+    assert detect_pagination_rules(URL, html=html) is None
+
+
+def test_sparse_page_numbers_are_rejected():
+    html = page(("/search?q=tab&page=3", "a", ""), ("/search?q=tab&page=400", "b", ""))
+    assert detect_pagination_rules(URL, html=html) is None
+
+
+def test_lone_next_link_on_first_page():
+    html = page(("/search?q=tab&p=2", "Next ›", ""))
+    result = detect_pagination_rules(URL, html=html)
+    assert result["page_urls"] == ["https://shop.example/search?q=tab&p=2"]
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from schema_registry import SchemaRegistry, crawl_schema, group_by_schema
+
+FIELDS = [{"name": "title", "selector": "h2", "type": "text"}]
+
+
+def write_schema(folder, name, match):
+    schema = {"name": name, "match": match, "baseSelector": ".card", "fields": FIELDS}
+    (folder / f"{name}.json").write_text(json.dumps(schema), encoding="utf-8")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    write_schema(tmp_path, "shop", {"domains": ["shop.example"]})
+    write_schema(tmp_path, "shop_eu", {"domains": ["eu.shop.example"]})
+    write_schema(tmp_path, "shop_search", {"patterns": [r"^https?://(www\.)?shop\.example/search"]})
+    return SchemaRegistry(str(tmp_path))
+
+
+def test_match_prefers_patterns_then_longer_domains(registry):
+    assert registry.match("https://shop.example/search?q=tv")[0] == "shop_search"
+    assert registry.match("https://eu.shop.example/c/tv")[0] == "shop_eu"
+    assert registry.match("https://www.shop.example/c/tv")[0] == "shop"
+    assert registry.match("https://notshop.example/c/tv") is None
+
+
+def test_crawl_schema_drops_registry_metadata(registry):
+    assert "match" not in crawl_schema(registry.get("shop"))
+
+
+def test_group_by_schema_keeps_input_indexes(registry):
+    urls = ["https://shop.example/c/1", "https://other.example/", "https://shop.example/search?q=a",
+            "https://shop.example/c/1", "https://shop.example/c/2"]
+    groups, unmatched = group_by_schema(urls, registry)
+    assert groups == {
+        "shop": [(1, "https://shop.example/c/1"), (4, "https://shop.example/c/2")],
+        "shop_search": [(3, "https://shop.example/search?q=a")],
+    }
+    assert unmatched == ["https://other.example/"]
+
+
+def test_group_by_schema_forced_schema(registry):
+    groups, unmatched = group_by_schema(["https://other.example/"], registry, "shop")
+    assert groups == {"shop": [(1, "https://other.example/")]} and unmatched == []
+
+
+def test_shipped_schemas_load():
+    assert SchemaRegistry().match("https://www.amazon.com/s?k=tablet")[0] == "amazon_search"
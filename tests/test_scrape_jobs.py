@@ -0,0 +1,55 @@
+import scrape_jobs
+from scrape_jobs import ScrapeJob
+
+
+def run(job: ScrapeJob) -> ScrapeJob:
+    job.start()
+    job._thread.join(timeout=10)
+    return job
+
+
+def test_failed_export_still_ends_the_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_jobs, "run_pipeline", lambda *args, **kwargs: iter(()))
+
+    def broken_export(path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(scrape_jobs, "export_csv", broken_export)
+    job = run(ScrapeJob(["https://shop.example/"], ["title"], "gpt-4o-mini", str(tmp_path)))
+    assert job.status == "failed"
+    assert "disk full" in job.error
+    assert job.finished_at is not None
+
+
+def test_failed_scrape_keeps_the_export(tmp_path, monkeypatch):
+    def broken_pipeline(*args, **kwargs):
+        raise RuntimeError("browser crashed")
+        yield
+
+    monkeypatch.setattr(scrape_jobs, "run_pipeline", broken_pipeline)
+    job = run(ScrapeJob(["https://shop.example/"], ["title"], "gpt-4o-mini", str(tmp_path)))
+    assert job.status == "failed"
+    assert "browser crashed" in job.error
+    assert job.results["listing_files"]["jsonl"]
+
+
+def test_job_keeps_only_the_latest_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_jobs, "JOB_LIVE_ROWS", 3)
+    monkeypatch.setattr(scrape_jobs, "JOB_LIVE_PAGES", 2)
+
+    def pipeline(urls, *args, **kwargs):
+        for index, url in enumerate(urls, start=1):
+            listings = [{"title": f"{index}-{n}"} for n in range(2)]
+            yield {"index": index, "url": url, "formatted_data": {"listings": listings},
+                   "input_tokens": 10, "output_tokens": 5, "cost": 0.01}
+
+    monkeypatch.setattr(scrape_jobs, "run_pipeline", pipeline)
+    urls = [f"https://shop.example/{n}" for n in range(1, 5)]
+    job = run(ScrapeJob(urls, ["title"], "gpt-4o-mini", str(tmp_path)))
+    snapshot = job.snapshot()
+    assert job.status == "completed"
+    assert snapshot["totals"]["pages"] == 4 and snapshot["totals"]["listings"] == 8
+    assert [page["index"] for page in snapshot["pages"]] == [3, 4]
+    assert [row["title"] for row in snapshot["rows"]] == ["3-1", "4-0", "4-1"]
+    assert job.results["listings"] == 8
+    assert sum(1 for _ in scrape_jobs.iter_rows(job.results["listing_files"]["jsonl"])) == 8
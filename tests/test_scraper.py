@@ -0,0 +1,113 @@
+import pytest
+
+import scraper
+from budget_governor import BudgetGovernor
+from llm_json import LLMOutputError
+from token_budget import split_to_budget
+
+
+def test_scrape_url_saves_the_full_page_and_extracts_the_reduced_one(tmp_path, monkeypatch):
+    sent = {}
+
+    def fake_extract(markdown, fields, container, model, selected_model, *args, source_markdown=None, **kwargs):
+        sent.update(markdown=markdown, source_markdown=source_markdown)
+        return {"listings": [{"title": "A"}]}, {"input_tokens": 0, "output_tokens": 0}, True
+
+    monkeypatch.setattr(scraper, "extract_listings", fake_extract)
+    scraper.scrape_url("https://shop.example/1", ["title"], "gpt-4o-mini", str(tmp_path), 1,
+                       "Menu\n\nA costs $10", reduced="A costs $10")
+    assert (tmp_path / "rawData_1.md").read_text(encoding="utf-8") == "Menu\n\nA costs $10"
+    assert sent == {"markdown": "A costs $10", "source_markdown": "Menu\n\nA costs $10"}
+
+
+def test_failed_chunk_keeps_the_other_chunks_and_their_cost(monkeypatch):
+    monkeypatch.setattr(scraper, "split_to_budget", lambda data, budget, model, **kwargs: ["chunk A", "chunk B", "chunk C"])
+    monkeypatch.setattr(scraper, "get_provider", lambda model: None)
+
+    def fake_chunk(chunk, container, model, provider):
+        if chunk == "chunk B":
+            raise RuntimeError("model timed out")
+        return {"listings": [{"title": chunk}]}, {"input_tokens": 1_000, "output_tokens": 100}
+
+    monkeypatch.setattr(scraper, "format_chunk", fake_chunk)
+    governor = BudgetGovernor(max_cost=1.0)
+    listing_model = scraper.create_dynamic_listing_model(["title"])
+    formatted, token_counts = scraper.format_data(
+        "page", scraper.create_listings_container_model(listing_model), listing_model, "gpt-4o-mini",
+        chunked=True, governor=governor,
+    )
+    assert [listing["title"] for listing in formatted["listings"]] == ["chunk A", "chunk C"]
+    assert token_counts["partial"] and token_counts["input_tokens"] == 2_000
+    assert token_counts["cost"] == pytest.approx(governor.stats()["spent"], abs=1e-6)
+    assert governor.stats()["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_billed_chunk_failure_is_committed_not_released(monkeypatch):
+    monkeypatch.setattr(scraper, "split_to_budget", lambda data, budget, model, **kwargs: ["chunk A", "chunk B"])
+    monkeypatch.setattr(scraper, "get_provider", lambda model: None)
+
+    def fake_chunk(chunk, container, model, provider):
+        if chunk == "chunk B":
+            raise LLMOutputError("Unrecoverable JSON", token_counts={"input_tokens": 1_000, "output_tokens": 300})
+        return {"listings": [{"title": chunk}]}, {"input_tokens": 1_000, "output_tokens": 100}
+
+    monkeypatch.setattr(scraper, "format_chunk", fake_chunk)
+    governor = BudgetGovernor(max_cost=1.0)
+    listing_model = scraper.create_dynamic_listing_model(["title"])
+    formatted, token_counts = scraper.format_data(
+        "page", scraper.create_listings_container_model(listing_model), listing_model, "gpt-4o-mini",
+        chunked=True, governor=governor,
+    )
+    stats = governor.stats()
+    assert token_counts["partial"] and token_counts["output_tokens"] == 400
+    assert stats["tokens"] == 2_400 and stats["requests"] == 2
+    assert token_counts["cost"] == pytest.approx(stats["spent"], abs=1e-6)
+    assert stats["in_flight_cost"] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_every_chunk_failing_raises(monkeypatch):
+    monkeypatch.setattr(scraper, "split_to_budget", lambda data, budget, model, **kwargs: ["chunk A", "chunk B"])
+    monkeypatch.setattr(scraper, "get_provider", lambda model: None)
+
+    def fake_chunk(chunk, container, model, provider):
+        raise RuntimeError("model timed out")
+
+    monkeypatch.setattr(scraper, "format_chunk", fake_chunk)
+    listing_model = scraper.create_dynamic_listing_model(["title"])
+    with pytest.raises(RuntimeError):
+        scraper.format_data("page", scraper.create_listings_container_model(listing_model), listing_model,
+                            "gpt-4o-mini", chunked=True)
+
+
+def test_merge_listings_merges_border_copies_only():
+    first = [{"title": "A", "price": "1"}, {"title": "B", "price": "2"}, {"title": "C", "price": ""}]
+    second = [{"title": "C", "price": "3"}, {"title": "D", "price": "4"}, {"title": "A", "price": "1"}]
+    merged = scraper.merge_listings([first, second], border=2)
+    assert [(m["title"], m["price"]) for m in merged] == [("A", "1"), ("B", "2"), ("C", "3"), ("D", "4"), ("A", "1")]
+
+
+def test_merge_listings_keeps_repeated_items_within_a_chunk():
+    same = {"title": "Refurbished tablet", "price": "99"}
+    assert len(scraper.merge_listings([[same, dict(same)], [{"title": "X", "price": "1"}]])) == 3
+
+
+def test_merge_listings_drops_exact_border_duplicate():
+    merged = scraper.merge_listings([[{"title": "A"}, {"title": "B"}], [{"title": "B"}, {"title": "C"}]])
+    assert [m["title"] for m in merged] == ["A", "B", "C"]
+
+
+def test_split_chunks_merge_back_to_the_page_listings():
+    # Two list blocks of 20 listings each: carrying a whole block across a border used to extract it twice
+    intro = "Shop intro. " * 30
+    blocks = ["\n".join(f"- Product {block}-{n} costs ${n + 10}, ships in two days from stock" for n in range(20))
+              for block in "AB"]
+    page = "\n\n".join([intro] + blocks)
+    chunks = split_to_budget(page, 700, "gpt-4o-mini", overlap=scraper.CHUNK_BORDER_LISTINGS)
+    assert len(chunks) > 1
+
+    def extracted(chunk):
+        return [{"title": line[2:].split(" costs ")[0], "price": line.split("$")[1]}
+                for line in chunk.splitlines() if line.startswith("- ")]
+
+    merged = scraper.merge_listings([extracted(chunk) for chunk in chunks])
+    assert sorted(m["title"] for m in merged) == sorted(f"Product {b}-{n}" for b in "AB" for n in range(20))